@@ -0,0 +1,66 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+"""
+Benchmark SDK overhead offline by replaying a recorded session.
+
+Record a cassette against an array once (secrets are scrubbed):
+
+    client = Client(hostname, username, password, record='volumes.jsonl.gz')
+    client.volumes.list(detail=True)
+
+then time Collection.list, pagination and object construction from a laptop:
+
+    python benchmarks/bench_replay.py volumes.jsonl.gz --resource volumes --detail
+    python benchmarks/bench_replay.py volumes.jsonl.gz --resource volumes --detail --latency-scale 1.0
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from nimbleclient.v1 import Client
+from nimbleclient.v1.cassette import ReplayTransport
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cassette')
+    parser.add_argument('--resource', default='volumes')
+    parser.add_argument('--detail', action='store_true')
+    parser.add_argument('--fields')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--latency-scale', type=float, help='replay recorded latencies scaled by this factor')
+    parser.add_argument('--profile', action='store_true', help='print the top functions by cumulative time')
+    args = parser.parse_args()
+
+    transport = ReplayTransport(args.cassette, latency_scale=args.latency_scale)
+    # Pages must be requested as recorded
+    client = Client('replay', 'replay', 'replay', coalesce_gets=False, adaptive_paging=False, transport=transport)
+    collection = getattr(client, args.resource)
+    params = {'fields': args.fields} if args.fields else {}
+
+    profiler = cProfile.Profile() if args.profile else None
+    timings = []
+    for _ in range(args.repeat):
+        if profiler:
+            profiler.enable()
+        started = time.perf_counter()
+        objs = collection.list(detail=args.detail, **params)
+        timings.append(time.perf_counter() - started)
+        if profiler:
+            profiler.disable()
+
+    best = min(timings)
+    print(f"{args.resource}: {len(objs)} objects, best {best * 1000:.2f} ms, "
+          f"{best / max(len(objs), 1) * 1e6:.2f} us/object over {args.repeat} runs")
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(20)
+
+if __name__ == '__main__':
+    main()
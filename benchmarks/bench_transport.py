@@ -0,0 +1,63 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+"""
+Compare NimOSAPIClient throughput per transport under many concurrent callers.
+
+Runs against the local stand-in server from tests/mockserver.py:
+
+    python benchmarks/bench_transport.py --callers 64 --calls 20
+
+The stand-in server speaks HTTP/1.1 only, so HTTPXTransport is measured with its connection pool here;
+HTTP/2 multiplexing only takes effect against an array (or any server negotiating h2 over TLS).
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from nimbleclient.v1.restclient import NimOSAPIClient
+from nimbleclient.v1.transport import RequestsTransport, HTTPXTransport
+from tests.mockserver import MockNimOSServer
+
+def bench(server, transport, callers, calls):
+    client = NimOSAPIClient('127.0.0.1', 'admin', 'admin', port=server.port, coalesce_gets=False, transport=transport)
+
+    def caller(index):
+        for call in range(calls):
+            client.list_resources('volumes', detail=True, fields='id,name,size', startRow=(index + call) % 100, endRow=100)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        list(executor.map(caller, range(callers)))
+    elapsed = time.perf_counter() - started
+    transport.close()
+    return callers * calls / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--callers', type=int, default=64)
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.005, help='simulated server latency in seconds')
+    args = parser.parse_args()
+
+    volumes = [{'id': f'{index:042x}', 'name': f'vol{index}', 'size': 1024} for index in range(100)]
+    transports = {'requests': lambda: RequestsTransport(scheme='http', pool_maxsize=args.callers)}
+    try:
+        import httpx # noqa: F401
+        transports['httpx'] = lambda: HTTPXTransport(http2=False, scheme='http', max_connections=args.callers)
+    except ImportError:
+        print("httpx not installed, skipping HTTPXTransport")
+
+    with MockNimOSServer(data={'volumes': volumes}, latency=args.latency) as server:
+        for name, factory in transports.items():
+            rate = bench(server, factory(), args.callers, args.calls)
+            print(f"{name:10s} {rate:10.1f} calls/s ({args.callers} callers x {args.calls} calls)")
+
+if __name__ == '__main__':
+    main()
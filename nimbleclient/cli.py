@@ -0,0 +1,196 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+"""
+nimble: command-line access to NimOS arrays through the SDK.
+
+    nimble [options] COLLECTION list [KEY=VALUE ...]         list objects, KEY=VALUE pairs filter the listing
+    nimble [options] COLLECTION get ID
+    nimble [options] COLLECTION create KEY=VALUE ...
+    nimble [options] COLLECTION update ID KEY=VALUE ...
+    nimble [options] COLLECTION delete ID
+    nimble [options] COLLECTION action ID|- ACTION [KEY=VALUE ...]   '-' performs a bulk action
+
+Values are parsed as JSON when possible (size=100, online=false, vol_ids='["a","b"]'), as strings otherwise.
+Rows are written as NDJSON (or CSV) as soon as they are parsed off the wire. Credentials default to the
+NIMBLE_HOST, NIMBLE_USERNAME and NIMBLE_PASSWORD environment variables. With --inventory, the command fans out
+to every array listed in the file, one 'hostname[:port] [username [password]]' per line, and each row gets an
+'array' attribute.
+
+Session tokens are only kept across invocations with --token-cache (in ~/.nimble/tokens.json) or when the
+NIMBLE_SDK_TOKEN_CACHE environment variable is set.
+"""
+
+# Only lightweight modules are imported upfront, the SDK is imported once arguments are parsed
+import argparse
+import json
+import os
+import sys
+import threading
+
+VERBS = ('list', 'get', 'create', 'update', 'delete', 'action')
+
+class OutputWriter:
+    """Thread-safe NDJSON/CSV row writer, flushing each row as it is written"""
+
+    def __init__(self, stream, output_format='ndjson', columns=None):
+        self.stream = stream
+        self.format = output_format
+        self.columns = columns
+        self._csv = None
+        self._lock = threading.Lock()
+
+    def write(self, row):
+        with self._lock:
+            if self.format == 'csv':
+                self._write_csv(row)
+            else:
+                self.stream.write(json.dumps(row, separators=(',', ':')) + '\n')
+            self.stream.flush()
+
+    def _write_csv(self, row):
+        if self._csv is None:
+            import csv
+            self._csv = csv.DictWriter(self.stream, fieldnames=self.columns or list(row), extrasaction='ignore')
+            self._csv.writeheader()
+        self._csv.writerow({key: json.dumps(value) if isinstance(value, (dict, list)) else value for key, value in row.items()})
+
+def parse_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def parse_pairs(pairs):
+    params = {}
+    for pair in pairs:
+        key, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError(f"Expected KEY=VALUE, got '{pair}'")
+        params[key] = parse_value(value)
+    return params
+
+def read_inventory(path, username, password):
+    """Yield (hostname, port, username, password) for every array of an inventory file"""
+
+    with open(path) as inventory:
+        for line in inventory:
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+            hostname, _, port = fields[0].partition(':')
+            yield (hostname, int(port) if port else 5392,
+                   fields[1] if len(fields) > 1 else username,
+                   fields[2] if len(fields) > 2 else password)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='nimble', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('NIMBLE_HOST'), help='array hostname or IP address')
+    parser.add_argument('--port', type=int, default=5392)
+    parser.add_argument('--username', default=os.environ.get('NIMBLE_USERNAME', 'admin'))
+    parser.add_argument('--password', default=os.environ.get('NIMBLE_PASSWORD'))
+    parser.add_argument('--inventory', help='file listing the arrays to fan out to')
+    parser.add_argument('--workers', type=int, default=16, help='arrays queried concurrently with --inventory')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    parser.add_argument('--detail', action='store_true', help='list all attributes instead of id and name')
+    parser.add_argument('--fields', help='comma separated attributes to fetch')
+    parser.add_argument('--token-cache', action='store_true', help='reuse session tokens across invocations')
+    parser.add_argument('--no-token-cache', action='store_true', help='ignore NIMBLE_SDK_TOKEN_CACHE')
+    parser.add_argument('collection', help='collection name, e.g. volumes or initiator_groups')
+    parser.add_argument('verb', choices=VERBS)
+    parser.add_argument('args', nargs='*', help='ID, ACTION and KEY=VALUE arguments of the verb')
+    return parser
+
+def run(client, args, emit):
+    """Run one command against one array, passing every resulting object to emit"""
+
+    resource = args.collection.replace('-', '_')
+    positional = [arg for arg in args.args if '=' not in arg]
+    params = parse_pairs([arg for arg in args.args if '=' in arg])
+    if args.fields:
+        params['fields'] = args.fields
+
+    if args.verb == 'list':
+        for row in client.iter_resources(resource, detail=args.detail or bool(args.fields), **params):
+            emit(row)
+        return
+
+    if args.verb == 'create':
+        emit(client.create_resource(resource, **params))
+        return
+
+    if not positional:
+        raise ValueError(f"'{args.verb}' requires an object ID")
+    ident = positional[0]
+
+    if args.verb == 'get':
+        emit(client.get_resource(resource, ident, **params))
+    elif args.verb == 'update':
+        emit(client.update_resource(resource, ident, **params))
+    elif args.verb == 'delete':
+        emit(client.delete_resource(resource, ident) or {'id': ident})
+    else:
+        if len(positional) < 2:
+            raise ValueError("'action' requires an object ID (or -) and an action name")
+        if ident == '-':
+            emit(client.perform_bulk_resource_action(resource, positional[1], **params))
+        else:
+            emit(client.perform_resource_action(resource, ident, positional[1], id=ident, **params))
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.inventory:
+        targets = list(read_inventory(args.inventory, args.username, args.password))
+    elif args.host:
+        targets = [(args.host, args.port, args.username, args.password)]
+    else:
+        print("nimble: an array is required (--host, NIMBLE_HOST or --inventory)", file=sys.stderr)
+        return 2
+
+    columns = args.fields.split(',') if args.fields else None
+    if columns and args.inventory:
+        columns = ['array'] + columns
+    writer = OutputWriter(sys.stdout, args.format, columns)
+
+    # nimbleclient.v1 imports the API modules lazily, so this only loads the REST client and its transport
+    from .v1.restclient import NimOSAPIClient
+    from .v1.transport import HTTPClientTransport
+
+    # Session tokens are only written to disk on request, None lets NIMBLE_SDK_TOKEN_CACHE decide
+    token_cache = False if args.no_token_cache else True if args.token_cache else None
+
+    def execute(target):
+        hostname, port, username, password = target
+        if args.inventory:
+            emit = lambda row: writer.write({'array': hostname, **row})
+        else:
+            emit = writer.write
+        try:
+            client = NimOSAPIClient(hostname, username, password, port, coalesce_gets=False, transport=HTTPClientTransport(), token_cache=token_cache)
+            run(client, args, emit)
+            return True
+        except BrokenPipeError:
+            # Not an error of this array, stops the whole command in main()
+            raise
+        except Exception as error:
+            print(f"nimble: {hostname}: {error}", file=sys.stderr)
+            return False
+
+    try:
+        if len(targets) == 1:
+            results = [execute(targets[0])]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                results = list(executor.map(execute, targets))
+    except BrokenPipeError:
+        # Output piped into a command that exited early, e.g. head
+        sys.stderr.close()
+        return 0
+
+    return 0 if all(results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
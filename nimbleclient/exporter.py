@@ -0,0 +1,296 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+"""
+nimble-exporter: Prometheus exporter for array, pool, folder and volume capacity and health.
+
+    nimble-exporter --inventory arrays.txt --listen-port 9717 --interval 60
+
+One background collector per array refreshes a single resource type at a time with projected listings, staggered
+over the refresh interval, and scrapes of /metrics are served from the last rendered page in memory.
+"""
+
+import argparse
+import functools
+import logging
+import os
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _bool(value):
+    return 1 if value else 0
+
+def _mebibytes(value):
+    return value * 2**20
+
+def _reachable(value):
+    return 1 if value == 'reachable' else 0
+
+# resource type: (metric prefix, extra label attributes, [(metric, attribute, help, converter)])
+METRICS = {
+    'arrays': ('nimble_array', (), [
+        ('up', 'status', 'Whether the array is reachable in the group', _reachable),
+        ('usage_bytes', 'usage', 'Used space of the array in bytes', None),
+        ('usable_capacity_bytes', 'usable_capacity_bytes', 'Usable capacity of the array in bytes', None),
+        ('raw_capacity_bytes', 'raw_capacity_bytes', 'Raw capacity of the array in bytes', None),
+    ]),
+    'pools': ('nimble_pool', (), [
+        ('capacity_bytes', 'capacity', 'Total storage space of the pool in bytes', None),
+        ('usage_bytes', 'usage', 'Used space of the pool in bytes', None),
+        ('free_space_bytes', 'free_space', 'Free space of the pool in bytes', None),
+    ]),
+    'folders': ('nimble_folder', ('pool_name',), [
+        ('capacity_bytes', 'capacity_bytes', 'Capacity of the folder in bytes', None),
+        ('usage_bytes', 'usage_bytes', 'Mapped and snapshot usage of the volumes in the folder in bytes', None),
+        ('free_space_bytes', 'free_space_bytes', 'Free space in the folder in bytes', None),
+    ]),
+    'volumes': ('nimble_volume', ('pool_name',), [
+        ('size_bytes', 'size', 'Volume size in bytes', _mebibytes),
+        ('total_usage_bytes', 'total_usage_bytes', 'Volume mapped usage and uncompressed backup data in bytes', None),
+        ('connections', 'num_connections', 'Number of connections to the volume', None),
+        ('online', 'online', 'Whether the volume is online', _bool),
+    ]),
+}
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _fields(resource_type):
+    _, label_attrs, metrics = METRICS[resource_type]
+    attributes = ['id', 'name', *label_attrs, *(attribute for _, attribute, _, _ in metrics)]
+    if resource_type == 'volumes':
+        attributes.append('vol_state')
+    return ','.join(dict.fromkeys(attributes))
+
+def render_samples(array, resource_type, objs):
+    """Render the samples of a listing as {metric: text block}"""
+
+    prefix, label_attrs, metrics = METRICS[resource_type]
+    lines = {f"{prefix}_{metric}": [] for metric, _, _, _ in metrics}
+    states = []
+    for attrs in objs:
+        labels = f'array="{_escape(array)}",name="{_escape(attrs.get("name"))}"'
+        labels += ''.join(f',{attr}="{_escape(attrs.get(attr) or "")}"' for attr in label_attrs)
+        for metric, attribute, _, convert in metrics:
+            value = attrs.get(attribute)
+            if value is None:
+                continue
+            lines[f"{prefix}_{metric}"].append(f"{prefix}_{metric}{{{labels}}} {convert(value) if convert else value}\n")
+        if attrs.get('vol_state'):
+            states.append(f'{prefix}_state{{{labels},state="{_escape(attrs["vol_state"])}"}} 1\n')
+    if resource_type == 'volumes':
+        lines[f"{prefix}_state"] = states
+    return {metric: ''.join(block) for metric, block in lines.items()}
+
+def _headers():
+    headers = {}
+    for prefix, _, metrics in METRICS.values():
+        for metric, _, text, _ in metrics:
+            headers[f"{prefix}_{metric}"] = f"# HELP {prefix}_{metric} {text}\n# TYPE {prefix}_{metric} gauge\n"
+    headers['nimble_volume_state'] = "# HELP nimble_volume_state Status of the volume\n# TYPE nimble_volume_state gauge\n"
+    headers['nimble_exporter_refresh_success'] = ("# HELP nimble_exporter_refresh_success Whether the last refresh of a resource type succeeded\n"
+                                                  "# TYPE nimble_exporter_refresh_success gauge\n")
+    headers['nimble_exporter_refresh_seconds'] = ("# HELP nimble_exporter_refresh_seconds Duration of the last refresh of a resource type\n"
+                                                  "# TYPE nimble_exporter_refresh_seconds gauge\n")
+    headers['nimble_exporter_last_refresh_timestamp'] = ("# HELP nimble_exporter_last_refresh_timestamp Time of the last successful refresh of a resource type\n"
+                                                         "# TYPE nimble_exporter_last_refresh_timestamp gauge\n")
+    return headers
+
+HEADERS = _headers()
+
+class ArrayCollector:
+    """
+    Background collector for one array.
+
+    Resource types are refreshed one at a time, spread evenly over the interval, and the collector start is offset
+    per array so that arrays sharing an exporter are not all queried at once. Every refresh lists the exported
+    attributes (usage and connection counters do not change last_modified, so it cannot be used to skip rows), but
+    only the rows whose values changed are rendered again.
+
+    Parameters:
+    - name     : Array label used in the metrics.
+    - client   : nimbleclient.v1.Client connected to the array, or a callable returning one. The callable is retried on
+                 every refresh until it succeeds, so an array unreachable at startup is picked up once it is back.
+    - interval : Seconds between two refreshes of the same resource type.
+    - on_update: Callable invoked after every refresh.
+    """
+
+    def __init__(self, name, client, interval=60, on_update=None):
+        self.name = name
+        self.client = client
+        self.interval = interval
+        self.on_update = on_update
+        # Keys are fixed upfront so that render() can iterate while refreshes replace values
+        self.samples = {resource_type: {} for resource_type in METRICS}
+        self.status = {resource_type: None for resource_type in METRICS}
+        # {resource type: {id: (attrs, rendered samples)}}
+        self._rows = {resource_type: {} for resource_type in METRICS}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def refresh(self, resource_type):
+        """Fetch one resource type with projected fields and re-render its samples"""
+
+        started = time.time()
+        try:
+            if not hasattr(self.client, '_client'):
+                self.client = self.client()
+            objs = self.client._client.list_resources(resource_type, detail=True, fields=_fields(resource_type))
+            self.samples[resource_type] = self._render(resource_type, objs)
+            self.status[resource_type] = (1, time.time() - started, time.time())
+        except Exception as error:
+            logging.warning(f"Refreshing {resource_type} of {self.name} failed: {error}")
+            _, _, last = self.status[resource_type] or (0, 0, 0)
+            self.status[resource_type] = (0, time.time() - started, last)
+        if self.on_update is not None:
+            self.on_update()
+
+    def _render(self, resource_type, objs):
+        previous = self._rows[resource_type]
+        rows = {}
+        for attrs in objs:
+            key = attrs.get('id') or attrs.get('name')
+            row = previous.get(key)
+            if row is None or row[0] != attrs:
+                row = (attrs, render_samples(self.name, resource_type, [attrs]))
+            rows[key] = row
+        self._rows[resource_type] = rows
+
+        blocks = {}
+        for _, samples in rows.values():
+            for metric, block in samples.items():
+                blocks.setdefault(metric, []).append(block)
+        return {metric: ''.join(parts) for metric, parts in blocks.items()}
+
+    def refresh_all(self):
+        for resource_type in METRICS:
+            self.refresh(resource_type)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"collector-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        step = self.interval / len(METRICS)
+        # Deterministic per-array offset within one step
+        if self._stopped.wait(zlib.crc32(self.name.encode()) % 1000 / 1000 * step):
+            return
+        while not self._stopped.is_set():
+            for resource_type in METRICS:
+                deadline = time.monotonic() + step
+                self.refresh(resource_type)
+                if self._stopped.wait(max(deadline - time.monotonic(), 0)):
+                    return
+
+    def status_samples(self):
+        lines = {'nimble_exporter_refresh_success': [], 'nimble_exporter_refresh_seconds': [], 'nimble_exporter_last_refresh_timestamp': []}
+        for resource_type, status in self.status.items():
+            if status is None:
+                continue
+            success, duration, last = status
+            labels = f'array="{_escape(self.name)}",resource="{resource_type}"'
+            lines['nimble_exporter_refresh_success'].append(f"nimble_exporter_refresh_success{{{labels}}} {success}\n")
+            lines['nimble_exporter_refresh_seconds'].append(f"nimble_exporter_refresh_seconds{{{labels}}} {duration:.3f}\n")
+            lines['nimble_exporter_last_refresh_timestamp'].append(f"nimble_exporter_last_refresh_timestamp{{{labels}}} {last:.0f}\n")
+        return {metric: ''.join(block) for metric, block in lines.items()}
+
+class Exporter:
+    """
+    Serves the metrics of several ArrayCollectors.
+
+    The page is re-rendered once after collectors update and every scrape returns it as is.
+
+    Parameters:
+    - clients  : Mapping of array name to nimbleclient.v1.Client, or to a callable returning one (see ArrayCollector).
+    - interval : Seconds between two refreshes of the same resource type.
+    """
+
+    def __init__(self, clients, interval=60):
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._page = b''
+        self.collectors = [ArrayCollector(name, client, interval, on_update=self._invalidate) for name, client in clients.items()]
+
+    def _invalidate(self):
+        self._dirty = True
+
+    def render(self):
+        """Current metrics page, in the Prometheus text exposition format"""
+
+        if not self._dirty:
+            return self._page
+        with self._lock:
+            if self._dirty:
+                self._dirty = False
+                blocks = {metric: [] for metric in HEADERS}
+                for collector in self.collectors:
+                    for samples in [*list(collector.samples.values()), collector.status_samples()]:
+                        for metric, block in samples.items():
+                            blocks[metric].append(block)
+                self._page = ''.join(HEADERS[metric] + ''.join(parts) for metric, parts in blocks.items() if any(parts)).encode()
+        return self._page
+
+    def start(self):
+        for collector in self.collectors:
+            collector.start()
+
+    def stop(self):
+        for collector in self.collectors:
+            collector.stop()
+
+    def serve(self, port=9717, address=''):
+        """Start the collectors and serve /metrics until interrupted"""
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                page = exporter.render()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(page)))
+                self.end_headers()
+                self.wfile.write(page)
+
+        self.start()
+        httpd = ThreadingHTTPServer((address, port), Handler)
+        try:
+            httpd.serve_forever()
+        finally:
+            self.stop()
+            httpd.server_close()
+
+def main(argv=None):
+    from .cli import read_inventory
+
+    parser = argparse.ArgumentParser(prog='nimble-exporter', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inventory', required=True, help="file listing the arrays, one 'hostname[:port] [username [password]]' per line")
+    parser.add_argument('--username', default=os.environ.get('NIMBLE_USERNAME', 'admin'))
+    parser.add_argument('--password', default=os.environ.get('NIMBLE_PASSWORD'))
+    parser.add_argument('--interval', type=float, default=60, help='seconds between refreshes of the same resource type')
+    parser.add_argument('--listen-address', default='')
+    parser.add_argument('--listen-port', type=int, default=9717)
+    args = parser.parse_args(argv)
+
+    from .v1.client import Client
+
+    # Collectors connect on their first refresh and keep retrying arrays that are unreachable
+    clients = {hostname: functools.partial(Client, hostname, username, password, port, coalesce_gets=False)
+               for hostname, port, username, password in read_inventory(args.inventory, args.username, args.password)}
+
+    Exporter(clients, args.interval).serve(args.listen_port, args.listen_address)
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,17 @@
 #   © Copyright 2020 Hewlett Packard Enterprise Development LP
 #
 
-from .client import Client
-from .restclient import NimOSAPIClient
-from .exceptions import NimOSConnectionError, NimOSAPIError, NimOSCLIError, NimOSAuthenticationError, NimOSAPIOperationUnsupported
+from .exceptions import NimOSConnectionError, NimOSAPIError, NimOSCLIError, NimOSAuthenticationError, NimOSAPIOperationUnsupported, NimOSCircuitOpenError
 
-__all__ = [Client, NimOSAPIClient, NimOSAPIError, NimOSConnectionError, NimOSCLIError, NimOSAuthenticationError, NimOSAPIOperationUnsupported]
\ No newline at end of file
+# Client pulls in every API module, so both clients are imported on first access only: programs such as the CLI
+# that import nimbleclient.v1.restclient directly do not pay for the rest of the SDK
+_LAZY = {'Client': '.client', 'NimOSAPIClient': '.restclient'}
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        value = globals()[name] = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = ['Client', 'NimOSAPIClient', 'NimOSAPIError', 'NimOSConnectionError', 'NimOSCLIError', 'NimOSAuthenticationError', 'NimOSAPIOperationUnsupported', 'NimOSCircuitOpenError']
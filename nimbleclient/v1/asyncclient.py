@@ -0,0 +1,80 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import asyncio
+import contextvars
+import functools
+import types
+
+from .client import Client
+from .deadline import Deadline
+
+class AsyncClient:
+    """
+    asyncio front end of Client: every collection and client method becomes a coroutine run in a worker thread.
+
+    Each call gets its own Deadline, so cancelling the awaiting task (or asyncio.wait_for timing out) cancels the SDK
+    call in its thread too, at its next request or streamed chunk, instead of leaving it running in the background.
+
+        client = AsyncClient(hostname, username, password, call_timeout=60)
+        volumes = await client.volumes.list(detail=True)
+
+    Parameters:
+    - hostname, username, password, port and other keyword arguments: as for Client, except call_timeout.
+    - call_timeout : Seconds each call may take, None for no limit.
+    - executor     : concurrent.futures executor running the calls, the event loop's default one if not specified.
+    """
+
+    def __init__(self, hostname, username, password, port=5392, call_timeout=None, executor=None, **kwargs):
+        self.call_timeout = call_timeout
+        self.executor = executor
+        self._sync = Client(hostname, username, password, port, **kwargs)
+
+    @classmethod
+    async def connect(cls, *args, **kwargs):
+        """Create an AsyncClient without blocking the event loop on authentication"""
+
+        return await asyncio.get_running_loop().run_in_executor(kwargs.get('executor'), functools.partial(cls, *args, **kwargs))
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """Run func(*args, **kwargs) in a worker thread under a deadline of timeout (call_timeout by default)"""
+
+        deadline = Deadline(timeout if timeout is not None else self.call_timeout)
+        context = contextvars.copy_context()
+
+        def call():
+            with deadline:
+                result = func(*args, **kwargs)
+                # Generators such as iter_list() are consumed in the worker thread as well
+                if isinstance(result, types.GeneratorType):
+                    result = list(result)
+                return result
+
+        future = asyncio.get_running_loop().run_in_executor(self.executor, context.run, call)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            deadline.cancel()
+            raise
+
+    def __getattr__(self, name):
+        return _AsyncProxy(self, getattr(self._sync, name))
+
+class _AsyncProxy:
+    """Collection or resource whose methods are turned into coroutines"""
+
+    def __init__(self, client, target):
+        self._client = client
+        self._target = target
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            result = await self._client.run(attr, *args, **kwargs)
+            return result
+        return method
@@ -0,0 +1,150 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .breaker import CircuitBreaker
+from .client import Client
+from .deadline import Deadline, propagated
+from .exceptions import NimOSCircuitOpenError
+from .fleet import fan_out
+
+# REST API version the SDK is generated for
+API_VERSION = 'v1'
+
+def _version_tuple(version):
+    parts = []
+    for part in str(version).split('-')[0].split('.'):
+        if not part.isdigit():
+            break
+        parts.append(int(part))
+    return tuple(parts)
+
+class ArrayStatus:
+    """Outcome of connecting to one array"""
+
+    __slots__ = ['name', 'connected', 'compatible', 'api_versions', 'software_version', 'auth_latency',
+                 'versions_latency', 'warmed', 'latency', 'error']
+
+    def __init__(self, name):
+        self.name = name
+        self.connected = False
+        self.compatible = False
+        self.api_versions = []
+        self.software_version = None
+        self.auth_latency = None
+        self.versions_latency = None
+        self.warmed = 0
+        self.latency = None
+        self.error = None
+
+    @property
+    def ready(self):
+        return self.connected and self.compatible
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'ready': self.ready,
+            'connected': self.connected,
+            'compatible': self.compatible,
+            'api_versions': self.api_versions,
+            'software_version': self.software_version,
+            'auth_latency': self.auth_latency,
+            'versions_latency': self.versions_latency,
+            'warmed': self.warmed,
+            'latency': self.latency,
+            'error': str(self.error) if self.error is not None else None,
+        }
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(name={self.name}, ready={self.ready}, latency={self.latency}, error={self.error})>"
+
+def bootstrap(arrays, max_workers=32, timeout=60, warm_connections=4, min_software_version=None, on_ready=None,
+              **client_kwargs):
+    """
+    Connect to many arrays concurrently.
+
+    Every array is authenticated, its versions endpoint is checked for the API version of the SDK (and
+    min_software_version if given), and warm_connections requests are sent in parallel so the transport pool already
+    holds that many open connections. A slow or unreachable array only holds up its own worker: each array gets its own
+    timeout, arrays with an open circuit breaker are skipped when client_kwargs enables circuit_breaker, and
+    on_ready(name, client) is called as soon as an array is ready, from the worker thread that connected it.
+
+    Returns a (clients, statuses) tuple: the Client of every ready array, and the ArrayStatus of every array with its
+    latencies and error, keyed by array name.
+
+    Parameters:
+    - arrays               : Mapping of array name to connection settings, dicts of hostname, username, password and
+                             optionally port.
+    - max_workers          : Maximum number of arrays connected concurrently.
+    - timeout              : Seconds each array may take to connect, None for no limit.
+    - warm_connections     : Connections to open per array, 0 to only authenticate.
+    - min_software_version : Oldest NimOS version accepted, e.g. '5.1'.
+    - on_ready             : Callable taking the array name and its Client.
+    - client_kwargs        : Extra NimOSAPIClient arguments. A callable transport is called for each array to create its
+                             transport.
+    """
+
+    minimum = _version_tuple(min_software_version) if min_software_version else None
+    statuses = {name: ArrayStatus(name) for name in arrays}
+
+    def connect(name, settings):
+        status = statuses[name]
+        port = settings.get('port', 5392)
+        started = time.perf_counter()
+        try:
+            breaker = CircuitBreaker.for_array(settings['hostname'], port) if client_kwargs.get('circuit_breaker') is True else None
+            if breaker is not None and not breaker.available:
+                raise NimOSCircuitOpenError(f"Circuit to {breaker.name} is open, last error: {breaker.last_error}")
+
+            kwargs = dict(client_kwargs)
+            if callable(kwargs.get('transport')):
+                kwargs['transport'] = kwargs['transport']()
+            with Deadline(timeout):
+                client = Client(settings['hostname'], settings['username'], settings['password'], port, **kwargs)
+                status.connected = True
+                status.auth_latency = time.perf_counter() - started
+
+                api = client._client
+                checked = time.perf_counter()
+                versions = api.list_resources('versions')
+                status.versions_latency = time.perf_counter() - checked
+                status.api_versions = [version.get('name') for version in versions]
+                status.software_version = next((version.get('software_version') for version in versions
+                                                if version.get('software_version')), None)
+                if API_VERSION not in status.api_versions:
+                    status.error = f"API {API_VERSION} not supported, array offers {status.api_versions}"
+                elif minimum is not None and _version_tuple(status.software_version) < minimum:
+                    status.error = f"NimOS {status.software_version} is older than {min_software_version}"
+                else:
+                    status.compatible = True
+
+                if status.compatible and warm_connections > 0:
+                    url = api._url(api._ENDPOINTS['versions'])
+                    # The requests run under the deadline of the array too
+                    warm = propagated(lambda _: api._request('GET', url))
+                    with ThreadPoolExecutor(max_workers=warm_connections) as executor:
+                        # Concurrent requests each need a connection of their own, which the pool then keeps
+                        for response in executor.map(warm, range(warm_connections)):
+                            response.close()
+                            status.warmed += 1
+        except Exception as error:
+            status.error = error
+            raise
+        finally:
+            status.latency = time.perf_counter() - started
+
+        if status.compatible and on_ready is not None:
+            try:
+                on_ready(name, client)
+            except Exception:
+                logging.exception(f"on_ready callback failed for {name}")
+        return client
+
+    results, _ = fan_out(arrays, connect, max_workers)
+    clients = {name: client for name, client in results.items() if statuses[name].ready}
+    return clients, statuses
@@ -0,0 +1,126 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import logging
+import threading
+import time
+
+from .exceptions import NimOSCircuitOpenError, NimOSConnectionError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """
+    Fails calls to an unreachable array fast instead of waiting for connection timeouts.
+
+    The breaker opens after failure_threshold consecutive connection failures. While open, requests raise
+    NimOSCircuitOpenError right away. Once the reset timeout has elapsed, the next request first sends a probe (a GET of
+    the unauthenticated versions endpoint): success closes the breaker, failure opens it again for twice as long, up to
+    max_reset_timeout. Any HTTP response counts as success, only connection failures count as failures.
+
+    Breakers are shared by all clients of the same array in a process, see for_array().
+
+    Parameters:
+    - name              : Array the breaker guards, as hostname:port.
+    - failure_threshold : Consecutive connection failures opening the breaker.
+    - reset_timeout     : Seconds before the first probe of an open breaker.
+    - max_reset_timeout : Longest wait between two probes.
+    """
+
+    _REGISTRY = {}
+    _REGISTRY_LOCK = threading.Lock()
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=10, max_reset_timeout=300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.last_error = None
+        self.retry_at = None
+        self._timeout = reset_timeout
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_array(cls, hostname, port, **kwargs):
+        """Breaker of hostname:port, created with kwargs on first use"""
+
+        name = f"{hostname}:{port}"
+        with cls._REGISTRY_LOCK:
+            breaker = cls._REGISTRY.get(name)
+            if breaker is None:
+                breaker = cls._REGISTRY[name] = cls(name, **kwargs)
+            return breaker
+
+    @classmethod
+    def states(cls):
+        """{hostname:port: state} of every array contacted by this process"""
+
+        with cls._REGISTRY_LOCK:
+            return {name: breaker.state for name, breaker in cls._REGISTRY.items()}
+
+    @property
+    def available(self):
+        """False while requests to the array would fail fast"""
+
+        return self.state == CLOSED or (self.state == OPEN and time.monotonic() >= self.retry_at)
+
+    def check(self, probe):
+        """Raise NimOSCircuitOpenError unless requests may go through, probing the array when it is time to"""
+
+        if self.state == CLOSED:
+            return
+
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN or time.monotonic() < self.retry_at:
+                raise self._open_error()
+            self.state = HALF_OPEN
+
+        try:
+            probe()
+        except NimOSConnectionError as error:
+            self.failure(error)
+            raise self._open_error()
+        except Exception:
+            # Anything but a connection failure means the array answered
+            pass
+        self.success()
+
+    def success(self):
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                logging.warning("%s is reachable again, closing circuit", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self.retry_at = None
+            self._timeout = self.reset_timeout
+
+    def failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self.state == OPEN:
+                # Requests sent before the breaker opened
+                return
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == CLOSED:
+                    logging.warning("Opening circuit to %s after %s connection failures: %s", self.name, self.failures, error)
+                else:
+                    self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+                self.state = OPEN
+                self.retry_at = time.monotonic() + self._timeout
+
+    def _open_error(self):
+        wait = max(self.retry_at - time.monotonic(), 0) if self.retry_at else 0
+        return NimOSCircuitOpenError(f"Circuit to {self.name} is open, last error: {self.last_error} (next probe in {wait:.0f}s)")
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(name={self.name}, state={self.state}, failures={self.failures})>"
@@ -0,0 +1,169 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from .exceptions import NimOSConnectionError
+from .transport import Transport
+
+# Cassettes are gzipped JSON lines, one request/response interaction per line:
+# {"method", "path", "params", "json", "status", "headers", "body", "elapsed"}
+
+REDACTED = '********'
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+_decode = json.loads
+_SECRET_FIELDS = ('password', 'session_token', 'src_password', 'src_passphrase', 'passphrase', 'secret', 'chap_secret')
+
+def scrub(value):
+    """Copy of a decoded JSON value with secrets such as passwords and session tokens redacted"""
+
+    if isinstance(value, dict):
+        return {key: REDACTED if key in _SECRET_FIELDS and item is not None else scrub(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+def _key(method, path, params, payload):
+    params = sorted((str(key), str(value)) for key, value in (params or {}).items())
+    return _encode([method, path, params, payload])
+
+class RecordingTransport(Transport):
+    """
+    Wraps another transport and records every interaction into a cassette file.
+
+    X-Auth-Token headers are never written; with scrub enabled passwords and session tokens are redacted from bodies.
+
+    Parameters:
+    - transport : Transport actually talking to the array.
+    - path      : Cassette file to append to.
+    - scrub     : Redact secrets from request and response bodies.
+    """
+
+    def __init__(self, transport, path, scrub=True):
+        self.transport = transport
+        self.scheme = transport.scheme
+        self.path = path
+        self.scrub_secrets = scrub
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+
+    def request(self, method, url, params=None, json=None, headers=None, stream=False, timeout=None):
+        # Recording needs the whole body, streamed requests are served from the buffered response
+        started = time.perf_counter()
+        extra = {'timeout': timeout} if timeout else {}
+        response = self.transport.request(method, url, params=params, json=json, headers=headers, **extra)
+        elapsed = time.perf_counter() - started
+
+        body = response.content.decode('utf-8') if response.content else ''
+        if self.scrub_secrets:
+            json = scrub(json)
+            try:
+                body = _encode(scrub(response.json()))
+            except ValueError:
+                pass
+
+        record = {
+            'method': method,
+            'path': urlsplit(url).path,
+            'params': {str(key): str(value) for key, value in (params or {}).items()},
+            'json': json,
+            'status': response.status_code,
+            'headers': {'Content-Type': response.headers.get('Content-Type', 'application/json')},
+            'body': body,
+            'elapsed': round(elapsed, 6),
+        }
+        line = _encode(record)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        self.transport.close()
+
+class ReplayResponse:
+    __slots__ = ['status_code', 'headers', 'content']
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return _decode(self.content)
+
+    def iter_content(self, chunk_size=65536):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self):
+        pass
+
+class ReplayTransport(Transport):
+    """
+    Serves recorded responses from a cassette, without any network access.
+
+    Requests are matched on method, path, query parameters and request body (the host is ignored). Identical requests
+    get their recorded responses in order; once exhausted, the last one is served again. When scrubbing was enabled at
+    record time, request bodies carrying secrets (such as v1/tokens) are matched on their redacted form; failing that,
+    the first interaction recorded for the same method, path and parameters is used, so any credentials can be replayed.
+    An endRow added by adaptive paging is ignored when no interaction was recorded with it.
+
+    Parameters:
+    - path          : Cassette file to replay.
+    - latency_scale : None to serve at wire speed, or a factor applied to the recorded latencies (1.0 replays them as recorded).
+    """
+
+    def __init__(self, path, latency_scale=None, scheme='https'):
+        self.scheme = scheme
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._interactions = defaultdict(list)
+        self._fallback = {}
+        self._served = defaultdict(int)
+
+        with gzip.open(path, 'rt', encoding='utf-8') as cassette:
+            for line in cassette:
+                record = _decode(line)
+                response = ReplayResponse(record['status'], record['headers'], record['body'].encode('utf-8'))
+                key = _key(record['method'], record['path'], record['params'], record['json'])
+                self._interactions[key].append((response, record['elapsed']))
+                self._fallback.setdefault(_key(record['method'], record['path'], record['params'], None), key)
+
+    def __len__(self):
+        return sum(len(responses) for responses in self._interactions.values())
+
+    def _lookup(self, method, path, params, json):
+        key = _key(method, path, params, json)
+        if key not in self._interactions:
+            key = _key(method, path, params, scrub(json))
+        if key not in self._interactions:
+            key = self._fallback.get(_key(method, path, params, None))
+        return key
+
+    def request(self, method, url, params=None, json=None, headers=None, stream=False, timeout=None):
+        path = urlsplit(url).path
+        key = self._lookup(method, path, params, json)
+        if key is None and params and 'endRow' in params:
+            # The page window chosen by a PageSizer, the array returns at most its row limit either way
+            key = self._lookup(method, path, {name: value for name, value in params.items() if name != 'endRow'}, json)
+        if key is None:
+            raise NimOSConnectionError(f"No recorded response for {method} {path} {params or ''}")
+
+        responses = self._interactions[key]
+        with self._lock:
+            index = min(self._served[key], len(responses) - 1)
+            self._served[key] += 1
+        response, elapsed = responses[index]
+
+        if self.latency_scale:
+            time.sleep(elapsed * self.latency_scale)
+        return response
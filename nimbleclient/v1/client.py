@@ -52,8 +52,8 @@ from .api.software_versions import SoftwareVersionList
 from .api.network_configs import NetworkConfigList
 
 class Client:
-    def __init__(self, hostname, username, password, port=5392):
-        self._client = NimOSAPIClient(hostname, username, password, port)
+    def __init__(self, hostname, username, password, port=5392, **kwargs):
+        self._client = NimOSAPIClient(hostname, username, password, port, **kwargs)
 
     @property
     def versions(self):
@@ -0,0 +1,155 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import json
+from array import array
+
+INT = 'i'
+FLOAT = 'f'
+BOOL = 'b'
+STRING = 's'
+JSON = 'j'
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+class Column:
+    """
+    One attribute of many objects, stored in flat buffers that pickle as a few memory copies.
+
+    Numbers are stored in int64/float64 arrays and booleans in a byte array, with a null mask. Strings are stored as a
+    single UTF-8 buffer and end offsets, and any other value (lists, dicts, mixed types) as its JSON text.
+    """
+
+    __slots__ = ['kind', 'length', 'data', 'offsets', 'nulls']
+
+    def __init__(self, kind, length, data, offsets=None, nulls=None):
+        self.kind = kind
+        self.length = length
+        self.data = data
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def encode(cls, values):
+        values = list(values)
+        present = [value for value in values if value is not None]
+        nulls = bytes(value is None for value in values) if len(present) < len(values) else None
+
+        types = {type(value) for value in present}
+        if types <= {bool} and present:
+            return cls(BOOL, len(values), array('b', (value is True for value in values)), nulls=nulls)
+        if types <= {int}:
+            return cls(INT, len(values), array('q', (0 if value is None else value for value in values)), nulls=nulls)
+        if types <= {int, float}:
+            return cls(FLOAT, len(values), array('d', (0.0 if value is None else value for value in values)), nulls=nulls)
+
+        kind = STRING if types <= {str} else JSON
+        texts = [b'' if value is None else (value if kind == STRING else _encode(value)).encode('utf-8') for value in values]
+        offsets = array('Q')
+        end = 0
+        for text in texts:
+            end += len(text)
+            offsets.append(end)
+        return cls(kind, len(values), b''.join(texts), offsets, nulls)
+
+    def decode(self):
+        """Values of the column as a list"""
+
+        if self.kind in (INT, FLOAT):
+            values = self.data.tolist()
+        elif self.kind == BOOL:
+            values = [value == 1 for value in self.data]
+        else:
+            data = self.data
+            nulls = self.nulls or bytes(self.length)
+            start = 0
+            values = []
+            for end, null in zip(self.offsets, nulls):
+                text = data[start:end].decode('utf-8')
+                values.append(text if self.kind == STRING or null else json.loads(text))
+                start = end
+        if self.nulls is not None:
+            values = [None if null else value for value, null in zip(values, self.nulls)]
+        return values
+
+    @classmethod
+    def nulls_of(cls, length):
+        return cls(INT, length, array('q', bytes(8 * length)), nulls=b'\x01' * length)
+
+    @classmethod
+    def concat(cls, columns):
+        """Single column holding the values of columns, in order"""
+
+        kinds = {column.kind for column in columns if column.nulls is None or 0 in column.nulls}
+        if len(kinds) > 1:
+            return cls.encode(value for column in columns for value in column.decode())
+
+        kind = kinds.pop() if kinds else INT
+        length = sum(column.length for column in columns)
+        nulls = None
+        if any(column.nulls is not None for column in columns):
+            nulls = b''.join(column.nulls if column.nulls is not None else bytes(column.length) for column in columns)
+
+        if kind in (STRING, JSON):
+            data = []
+            offsets = array('Q')
+            base = 0
+            for column in columns:
+                if column.kind != kind:
+                    # All-null column of another kind
+                    offsets.extend([base] * column.length)
+                    continue
+                data.append(column.data)
+                offsets.extend(offset + base for offset in column.offsets)
+                base += len(column.data)
+            return cls(kind, length, b''.join(data), offsets, nulls)
+
+        typecode = {INT: 'q', FLOAT: 'd', BOOL: 'b'}[kind]
+        data = array(typecode)
+        for column in columns:
+            data.extend(column.data if column.kind == kind else array(typecode, bytes(data.itemsize * column.length)))
+        return cls(kind, length, data, nulls=nulls)
+
+class ColumnTable:
+    """
+    Objects of one resource type from several arrays, stored column by column.
+
+    The array of each row is kept in the 'array' column. Use column() for a single attribute and rows() to get the
+    objects back as dicts.
+    """
+
+    __slots__ = ['length', 'columns']
+
+    def __init__(self, length=0, columns=None):
+        self.length = length
+        self.columns = columns if columns is not None else {}
+
+    @classmethod
+    def from_rows(cls, array_name, rows, fields=None):
+        if fields is None:
+            fields = list(dict.fromkeys(key for row in rows for key in row))
+        columns = {'array': Column.encode([array_name] * len(rows))}
+        for field in fields:
+            columns[field] = Column.encode([row.get(field) for row in rows])
+        return cls(len(rows), columns)
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [table for table in tables if table.length]
+        names = list(dict.fromkeys(name for table in tables for name in table.columns))
+        columns = {}
+        for name in names:
+            columns[name] = Column.concat([table.columns.get(name) or Column.nulls_of(table.length) for table in tables])
+        return cls(sum(table.length for table in tables), columns)
+
+    def __len__(self):
+        return self.length
+
+    def column(self, name):
+        return self.columns[name].decode()
+
+    def rows(self):
+        names = list(self.columns)
+        for values in zip(*(self.columns[name].decode() for name in names)):
+            yield {name: value for name, value in zip(names, values) if value is not None}
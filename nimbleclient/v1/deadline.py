@@ -0,0 +1,91 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import contextvars
+import threading
+import time
+
+from .exceptions import NimOSCallCancelled, NimOSDeadlineExceeded
+
+_current = contextvars.ContextVar('nimble_deadline', default=None)
+
+def current():
+    """Deadline of the calls running in this context, or None"""
+
+    return _current.get()
+
+class Deadline:
+    """
+    Time budget and cancellation token for the SDK calls made while it is active.
+
+    Used as a context manager, it applies to every request of the calls in the block, pagination and authentication
+    refreshes included: requests are sent with timeouts capped to the remaining time, and once it is exhausted or
+    cancel() has been called (from any thread), the next request or streamed chunk raises NimOSDeadlineExceeded or
+    NimOSCallCancelled. Nested deadlines never extend the one they are nested in.
+
+        deadline = Deadline(30)
+        with deadline:
+            client.volumes.list(detail=True)
+
+    Parameters:
+    - seconds : Time budget, None for cancellation only.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.parent = None
+        self._cancelled = threading.Event()
+        self._tokens = []
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self._tokens.append(_current.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._tokens.pop())
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self):
+        """Seconds left (None if unbounded), raises once the deadline has passed or it was cancelled"""
+
+        if self.cancelled:
+            raise NimOSCallCancelled("NimOS call cancelled")
+        remaining = None
+        if self.expires_at is not None:
+            remaining = self.expires_at - time.monotonic()
+            if remaining <= 0:
+                raise NimOSDeadlineExceeded(f"NimOS call exceeded its {self.seconds}s deadline")
+        if self.parent is not None:
+            outer = self.parent.remaining()
+            if outer is not None and (remaining is None or outer < remaining):
+                remaining = outer
+        return remaining
+
+def guarded(chunks, remaining):
+    """Check the budget before reading every chunk of a streamed response body"""
+
+    for chunk in chunks:
+        remaining()
+        yield chunk
+
+def propagated(func):
+    """
+    func wrapped to run in a copy of the calling context, so work handed to executor threads stays under the
+    Deadline (and correlation ID) of the caller. Every call gets its own copy, a context cannot be entered by two
+    threads at once.
+    """
+
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
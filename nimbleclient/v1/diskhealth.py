@@ -0,0 +1,181 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import re
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from .deadline import propagated
+from .fleet import fan_out
+
+DISK_FIELDS = ('id,serial,shelf_serial,slot,bank,model,firmware_version,type,state,raid_state,'
+               'raid_resync_current_speed,raid_resync_average_speed,smart_attribute_list')
+SHELF_FIELDS = 'id,serial,model,psu_overall_status,fan_overall_status,temp_overall_status'
+
+# S.M.A.R.T. attributes whose raw values grow as a drive degrades, normalized names
+SMART_ATTRIBUTES = (
+    'reallocated_sector_ct',
+    'reallocated_event_count',
+    'current_pending_sector',
+    'offline_uncorrectable',
+    'reported_uncorrect',
+    'udma_crc_error_count',
+)
+
+_HEALTHY_STATUS = ('ok', 'n/a', 'na', '')
+
+def _attribute_name(name):
+    return re.sub(r'[^a-z0-9]+', '_', str(name).lower()).strip('_')
+
+class DiskRisk:
+    """Risk score of one drive and the reasons behind it"""
+
+    __slots__ = ['array', 'shelf_serial', 'slot', 'serial', 'model', 'firmware_version', 'raid_state', 'score', 'reasons']
+
+    def __init__(self, array, disk, score, reasons):
+        self.array = array
+        self.shelf_serial = disk.get('shelf_serial')
+        self.slot = disk.get('slot')
+        self.serial = disk.get('serial')
+        self.model = disk.get('model')
+        self.firmware_version = disk.get('firmware_version')
+        self.raid_state = disk.get('raid_state')
+        self.score = score
+        self.reasons = reasons
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(array={self.array}, serial={self.serial}, score={self.score:.1f}, reasons={self.reasons})>"
+
+class DiskHealthScanner:
+    """
+    Ranks drives across arrays by risk of failure.
+
+    Disks and shelves are fetched from all arrays in parallel, then the S.M.A.R.T. counters of every drive are unpacked
+    into a single NumPy matrix and compared with peers of the same model and firmware version using a robust z-score
+    (median and MAD per peer group). Counters growing since the previous scan, resyncs much slower than peers and faulty
+    RAID or shelf states add to the score. Requires numpy.
+
+    Parameters:
+    - clients              : Mapping of array name to nimbleclient.v1.Client.
+    - attributes           : S.M.A.R.T. attribute names to compare, SMART_ATTRIBUTES by default.
+    - z_threshold          : Robust z-score above which a counter counts as an outlier.
+    - slow_resync          : Fraction of the peer median resync speed below which a resync counts as slow.
+    - max_workers          : Maximum number of arrays queried concurrently.
+    - resync_across_models : Also compare resync speeds with every drive resyncing in the scan, whatever its model and
+                             firmware version. Off by default, drive models resync at very different speeds.
+    """
+
+    def __init__(self, clients, attributes=SMART_ATTRIBUTES, z_threshold=3.5, slow_resync=0.5, max_workers=16,
+                 resync_across_models=False):
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("DiskHealthScanner requires numpy, install it with 'pip install numpy'")
+
+        self._np = numpy
+        self.clients = clients
+        self.attributes = tuple(_attribute_name(name) for name in attributes)
+        self.z_threshold = z_threshold
+        self.slow_resync = slow_resync
+        self.resync_across_models = resync_across_models
+        self.max_workers = max_workers
+        self.errors = {}
+        self._previous = {}
+
+    def fetch(self):
+        """Return {array: (disks, shelves)} of every reachable array"""
+
+        def load(name, client):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                disks = executor.submit(propagated(client._client.list_resources), 'disks', detail=True, fields=DISK_FIELDS)
+                shelves = executor.submit(propagated(client._client.list_resources), 'shelves', detail=True, fields=SHELF_FIELDS)
+                return disks.result(), shelves.result()
+
+        views, self.errors = fan_out(self.clients, load, self.max_workers)
+        return views
+
+    def scan(self, views=None):
+        """Return the DiskRisk of every drive with a positive score, riskiest first"""
+
+        np = self._np
+        views = self.fetch() if views is None else views
+
+        arrays = []
+        disks = []
+        shelf_faults = {}
+        for array, (array_disks, shelves) in views.items():
+            for shelf in shelves:
+                faults = [f"{kind} {shelf.get(f'{kind}_overall_status')}" for kind in ('psu', 'fan', 'temp')
+                          if str(shelf.get(f'{kind}_overall_status') or '').lower() not in _HEALTHY_STATUS]
+                if faults:
+                    shelf_faults[(array, shelf.get('serial'))] = faults
+            for disk in array_disks:
+                # Empty slots are listed with an N/A serial
+                if disk.get('serial') not in ('N/A', None, ''):
+                    arrays.append(array)
+                    disks.append(disk)
+        if not disks:
+            return []
+
+        # Disks x attributes matrix of raw S.M.A.R.T. values, NaN where a drive does not report an attribute
+        column = {name: index for index, name in enumerate(self.attributes)}
+        values = np.full((len(disks), len(self.attributes)), np.nan)
+        for row, disk in enumerate(disks):
+            for attr in disk.get('smart_attribute_list') or ():
+                index = column.get(_attribute_name(attr.get('name') or attr.get('attr_name') or ''))
+                raw = attr.get('raw_value', attr.get('value'))
+                if index is not None and isinstance(raw, (int, float)):
+                    values[row, index] = raw
+
+        _, groups = np.unique(np.array([f"{disk.get('model')}\0{disk.get('firmware_version')}" for disk in disks]), return_inverse=True)
+        groups = groups.reshape(-1)
+        zscores = np.zeros_like(values)
+        for group in np.unique(groups):
+            members = groups == group
+            peers = values[members]
+            # Attributes no peer reports give all-NaN columns, which end up as a zero score
+            with np.errstate(all='ignore'), warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                median = np.nanmedian(peers, axis=0) if peers.shape[0] > 1 else np.full(peers.shape[1], np.nan)
+                mad = np.nanmedian(np.abs(peers - median), axis=0) * 1.4826
+                # A zero MAD (all peers equal) still flags any drive above the peers
+                zscores[members] = np.where(mad > 0, (peers - median) / np.where(mad > 0, mad, 1), np.where(peers > median, np.inf, 0))
+        zscores = np.nan_to_num(zscores, nan=0.0, posinf=self.z_threshold * 2, neginf=0.0)
+
+        keys = [(array, disk.get('serial') or disk.get('id')) for array, disk in zip(arrays, disks)]
+        previous = np.array([self._previous.get(key, [np.nan] * len(self.attributes)) for key in keys], dtype=float)
+        with np.errstate(invalid='ignore'):
+            growth = np.nan_to_num(values - previous, nan=0.0).clip(min=0)
+        self._previous = dict(zip(keys, values.tolist()))
+
+        speeds = np.array([disk.get('raid_resync_current_speed') or 0 for disk in disks], dtype=float)
+        resyncing = np.array([disk.get('raid_state') == 'resynchronizing' for disk in disks]) & (speeds > 0)
+        slow = np.zeros(len(disks), dtype=bool)
+        for group in np.unique(groups[resyncing]):
+            members = resyncing & (groups == group)
+            slow |= members & (speeds < np.median(speeds[members]) * self.slow_resync)
+        if self.resync_across_models and resyncing.sum() > 1:
+            slow |= resyncing & (speeds < np.median(speeds[resyncing]) * self.slow_resync)
+
+        outliers = zscores > self.z_threshold
+        faulty = np.array([disk.get('raid_state') == 'faulty' for disk in disks])
+        shelf_fault_count = np.array([len(shelf_faults.get((array, disk.get('shelf_serial')), ())) for array, disk in zip(arrays, disks)])
+        scores = (np.where(outliers, zscores, 0).sum(axis=1) + (growth > 0).sum(axis=1) * self.z_threshold + slow * self.z_threshold
+                  + faulty * 100 + shelf_fault_count)
+
+        risks = []
+        for row in np.flatnonzero(scores > 0):
+            disk = disks[row]
+            reasons = [f"{self.attributes[col]}={values[row, col]:.0f} (z={zscores[row, col]:.1f})" for col in np.flatnonzero(outliers[row])]
+            reasons += [f"{self.attributes[col]} +{growth[row, col]:.0f} since last scan" for col in np.flatnonzero(growth[row])]
+            if slow[row]:
+                reasons.append(f"slow resync at {speeds[row]:.0f} B/s")
+            if faulty[row]:
+                reasons.append("faulty")
+            faults = shelf_faults.get((arrays[row], disk.get('shelf_serial')))
+            if faults:
+                reasons += [f"shelf {fault}" for fault in faults]
+            risks.append(DiskRisk(arrays[row], disk, float(scores[row]), reasons))
+        risks.sort(key=lambda risk: risk.score, reverse=True)
+        return risks
@@ -16,3 +16,12 @@ class NimOSCLIError(Exception):
 
 class NimOSAPIOperationUnsupported(Exception):
     """NimOS API Operation not supported"""
+
+class NimOSCircuitOpenError(ConnectionError):
+    """NimOS array marked unreachable, the call was not attempted"""
+
+class NimOSDeadlineExceeded(TimeoutError):
+    """NimOS call did not complete within its deadline"""
+
+class NimOSCallCancelled(Exception):
+    """NimOS call was cancelled"""
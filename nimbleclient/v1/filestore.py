@@ -0,0 +1,61 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import json
+import logging
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.nimble')
+
+@contextmanager
+def locked(path):
+    """Hold an exclusive, cross-process lock on path (through a companion .lock file)"""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        yield
+    finally:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+def read_json(path, default=None):
+    """Load a private JSON file, ignoring it if it is missing, corrupt or accessible by other users"""
+
+    try:
+        if fcntl is not None and os.stat(path).st_mode & 0o077:
+            logging.warning(f"Ignoring {path}: it is accessible by other users")
+            return default
+        with open(path) as store:
+            return json.load(store)
+    except FileNotFoundError:
+        return default
+    except ValueError:
+        logging.warning(f"Ignoring corrupt file {path}")
+        return default
+
+def write_json(path, data):
+    """Atomically replace path with data, readable by its owner only"""
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as store:
+        json.dump(data, store)
+    os.replace(temp_path, path)
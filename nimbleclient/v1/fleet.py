@@ -0,0 +1,151 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .columnar import ColumnTable
+from .deadline import propagated
+from .exceptions import NimOSCircuitOpenError
+
+def fan_out(clients, func, max_workers=16):
+    """
+    Call func(name, client) for every array concurrently.
+
+    Returns a (results, errors) tuple of dicts keyed by array name, a failing array does not affect the others.
+    Arrays whose circuit breaker is open are skipped right away with a NimOSCircuitOpenError.
+
+    Parameters:
+    - clients     : Mapping of array name to nimbleclient.v1.Client.
+    - func        : Callable taking the array name and its client.
+    - max_workers : Maximum number of arrays queried concurrently.
+    """
+
+    def call(item):
+        name, client = item
+        breaker = getattr(getattr(client, '_client', None), 'breaker', None)
+        if breaker is not None and not breaker.available:
+            # Known to be unreachable, do not wait for it
+            return name, False, NimOSCircuitOpenError(f"Circuit to {breaker.name} is open, last error: {breaker.last_error}")
+        try:
+            return name, True, func(name, client)
+        except Exception as error:
+            logging.warning(f"{name}: {error}")
+            return name, False, error
+
+    results = {}
+    errors = {}
+    items = list(clients.items())
+    if not items:
+        return results, errors
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        for name, ok, value in executor.map(propagated(call), items):
+            (results if ok else errors)[name] = value
+    return results, errors
+
+# Clients of a collector worker process, kept across tasks so sessions are reused
+_worker_clients = {}
+
+def _worker_client(settings, client_kwargs):
+    key = (settings['hostname'], settings.get('port', 5392), settings['username'])
+    client = _worker_clients.get(key)
+    if client is None:
+        from .client import Client
+
+        kwargs = dict(client_kwargs)
+        if callable(kwargs.get('transport')):
+            kwargs['transport'] = kwargs['transport']()
+        client = _worker_clients[key] = Client(settings['hostname'], settings['username'], settings['password'],
+                                               settings.get('port', 5392), **kwargs)
+    return client
+
+def _collect_shard(shard, resource_type, fields, client_kwargs, threads):
+    """Fetch resource_type from the arrays of shard in a worker process, return (ColumnTable, errors)"""
+
+    def load(item):
+        name, settings = item
+        try:
+            rows = _worker_client(settings, client_kwargs)._client.list_resources(resource_type, detail=True, fields=fields)
+            return name, ColumnTable.from_rows(name, rows, fields.split(',') if fields else None), None
+        except Exception as error:
+            logging.warning(f"{name}: {error}")
+            # Exceptions of the SDK do not all survive pickling
+            return name, None, f"{error.__class__.__name__}: {error}"
+
+    tables = []
+    errors = {}
+    with ThreadPoolExecutor(max_workers=min(threads, len(shard))) as executor:
+        for name, table, error in executor.map(load, shard):
+            if error is None:
+                tables.append(table)
+            else:
+                errors[name] = error
+    return ColumnTable.concat(tables), errors
+
+class FleetCollector:
+    """
+    Collects one resource type from many arrays with a pool of worker processes.
+
+    Arrays are split into one shard per process, and a shard always goes to the same process. Every worker keeps its own clients, decodes the listings of its shard
+    and returns them as a ColumnTable, whose flat buffers cross the process boundary as a few memory copies instead of
+    one pickled dict per object. The parent only concatenates the buffers, so JSON decoding, the bulk of the CPU time
+    of large listings, scales with the number of processes.
+
+    Parameters:
+    - arrays        : Mapping of array name to connection settings, dicts of hostname, username, password and
+                      optionally port.
+    - processes     : Number of worker processes, the number of CPUs by default.
+    - threads       : Arrays queried concurrently by each worker.
+    - client_kwargs : Extra NimOSAPIClient arguments of the workers' clients, must be picklable. A callable transport is
+                      called in each worker to create its transport, e.g. functools.partial(HTTPXTransport, http2=True).
+                      token_cache=True lets the workers share session tokens.
+    """
+
+    def __init__(self, arrays, processes=None, threads=8, client_kwargs=None):
+        self.arrays = dict(arrays)
+        self.processes = max(1, min(processes or os.cpu_count() or 1, len(self.arrays) or 1))
+        self.threads = threads
+        self.client_kwargs = client_kwargs or {}
+        self.errors = {}
+        self._executors = []
+
+    def _pool(self):
+        if not self._executors:
+            # Workers are spawned rather than forked, the parent may be running client threads
+            context = multiprocessing.get_context('spawn')
+            self._executors = [ProcessPoolExecutor(max_workers=1, mp_context=context) for _ in range(self.processes)]
+        return self._executors
+
+    def collect(self, resource_type, fields=None):
+        """
+        Return a ColumnTable of resource_type on every reachable array, with an 'array' column naming the array of
+        each row. fields is a comma separated list of attributes to fetch, all by default. Errors of unreachable arrays
+        are kept in errors, as strings.
+        """
+
+        items = list(self.arrays.items())
+        shards = [items[index::self.processes] for index in range(self.processes)]
+        futures = [executor.submit(_collect_shard, shard, resource_type, fields, self.client_kwargs, self.threads)
+                   for executor, shard in zip(self._pool(), shards) if shard]
+
+        tables = []
+        self.errors = {}
+        for future in futures:
+            table, errors = future.result()
+            tables.append(table)
+            self.errors.update(errors)
+        return ColumnTable.concat(tables)
+
+    def close(self):
+        for executor in self._executors:
+            executor.shutdown()
+        self._executors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
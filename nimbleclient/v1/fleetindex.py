@@ -0,0 +1,162 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import threading
+
+from .filestore import locked, read_json, write_json
+from .fleet import fan_out
+
+# resource type: attributes kept per object, besides id and last_modified
+INDEXED_RESOURCES = {
+    'volumes': ('name', 'serial_number', 'target_name'),
+    'initiators': ('access_protocol', 'initiator_group_id', 'initiator_group_name', 'iqn', 'wwpn', 'alias'),
+    'fibre_channel_initiator_aliases': ('alias', 'wwpn'),
+}
+
+SNAPSHOT_VERSION = 1
+
+def normalize(identifier):
+    """
+    Canonical form of a serial number, WWN, WWPN or IQN, as used for index keys.
+
+    Case, 0x/naa./eui. prefixes and colon or dash separators are ignored, and the NAA type digit hosts prepend to a
+    32 digit volume serial number is dropped, so the serial can be looked up as reported by multipath or udev.
+    """
+
+    key = str(identifier).strip().lower()
+    if key.startswith('iqn.'):
+        return key
+    for prefix in ('0x', 'naa.', 'eui.', 'wwn-0x'):
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    key = key.replace(':', '').replace('-', '')
+    if len(key) == 33 and key[0] in '23' and all(char in '0123456789abcdef' for char in key):
+        key = key[1:]
+    return key
+
+class FleetIndex:
+    """
+    Lookup index of volume serial numbers and target names, initiator IQNs and WWPNs across arrays.
+
+    Records are kept per array and resource type. refresh() lists id and last_modified only and fetches the indexed
+    attributes of new or modified objects, except for Fibre Channel aliases which have no last_modified and are small
+    enough to be listed in full. Lookups are dictionary accesses on maps rebuilt after every refresh.
+
+    Parameters:
+    - clients     : Mapping of array name to nimbleclient.v1.Client, may be empty for an index loaded from a snapshot.
+    - max_workers : Maximum number of arrays refreshed concurrently.
+    """
+
+    def __init__(self, clients=None, max_workers=16):
+        self.clients = dict(clients or {})
+        self.max_workers = max_workers
+        self.records = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._maps = {'serial': {}, 'target': {}, 'iqn': {}, 'wwpn': {}, 'alias': {}}
+
+    @classmethod
+    def build(cls, clients, max_workers=16):
+        index = cls(clients, max_workers)
+        index.refresh()
+        return index
+
+    def refresh(self, arrays=None):
+        """Bring the records of the given arrays (all by default) up to date; returns the errors per array"""
+
+        clients = {name: client for name, client in self.clients.items() if arrays is None or name in arrays}
+        updates, self.errors = fan_out(clients, self._refresh_array, self.max_workers)
+        with self._lock:
+            self.records.update(updates)
+            self._rebuild()
+        return self.errors
+
+    def _refresh_array(self, name, client):
+        previous = self.records.get(name, {})
+        records = {}
+        for resource_type, attributes in INDEXED_RESOURCES.items():
+            known = previous.get(resource_type, {})
+            fields = ','.join(('id', 'last_modified') + attributes)
+            if resource_type == 'fibre_channel_initiator_aliases':
+                objs = client._client.list_resources(resource_type, detail=True, fields=fields)
+                records[resource_type] = {obj['id']: obj for obj in objs}
+                continue
+
+            stamps = client._client.list_resources(resource_type, detail=True, fields='id,last_modified')
+            current = {}
+            stale = []
+            for obj in stamps:
+                cached = known.get(obj['id'])
+                if cached is not None and cached.get('last_modified') == obj.get('last_modified'):
+                    current[obj['id']] = cached
+                else:
+                    stale.append(obj['id'])
+            if stale:
+                resources, _ = getattr(client, resource_type).get_many(stale, fields=fields)
+                current.update((resource.id, resource.attrs) for resource in resources if resource is not None)
+            records[resource_type] = current
+        return records
+
+    def _rebuild(self):
+        maps = {key: {} for key in self._maps}
+        for array, records in self.records.items():
+            for obj in records.get('volumes', {}).values():
+                entry = (array, obj['id'], obj.get('name'))
+                if obj.get('serial_number'):
+                    maps['serial'][normalize(obj['serial_number'])] = entry
+                if obj.get('target_name'):
+                    maps['target'].setdefault(normalize(obj['target_name']), []).append(entry)
+            for obj in records.get('initiators', {}).values():
+                entry = (array, obj.get('initiator_group_id'), obj.get('initiator_group_name'))
+                if obj.get('iqn'):
+                    maps['iqn'].setdefault(normalize(obj['iqn']), []).append(entry)
+                if obj.get('wwpn'):
+                    maps['wwpn'].setdefault(normalize(obj['wwpn']), []).append(entry)
+            for obj in records.get('fibre_channel_initiator_aliases', {}).values():
+                if obj.get('alias') and obj.get('wwpn'):
+                    maps['alias'][obj['alias']] = normalize(obj['wwpn'])
+        self._maps = maps
+
+    def volume_by_serial(self, serial):
+        """(array, vol_id, vol_name) of the volume with the given serial number or WWN, or None"""
+
+        return self._maps['serial'].get(normalize(serial))
+
+    def volumes_by_target(self, target_name):
+        """[(array, vol_id, vol_name)] of the volumes behind an iSCSI target IQN or Fibre Channel WWNN"""
+
+        return list(self._maps['target'].get(normalize(target_name), ()))
+
+    def initiator_groups_by_iqn(self, iqn):
+        """[(array, initiator_group_id, initiator_group_name)] of the initiator groups holding an IQN"""
+
+        return list(self._maps['iqn'].get(normalize(iqn), ()))
+
+    def initiator_groups_by_wwpn(self, wwpn):
+        """[(array, initiator_group_id, initiator_group_name)] of the initiator groups holding a WWPN or alias"""
+
+        key = self._maps['alias'].get(wwpn) or normalize(wwpn)
+        return list(self._maps['wwpn'].get(key, ()))
+
+    def save(self, path):
+        """Write the records to a private snapshot file"""
+
+        with self._lock:
+            snapshot = {'version': SNAPSHOT_VERSION, 'records': self.records}
+        with locked(path):
+            write_json(path, snapshot)
+
+    @classmethod
+    def load(cls, path, clients=None, max_workers=16):
+        """
+        Index from a snapshot file written by save(). Refreshing it with clients only fetches what changed since.
+        """
+
+        with locked(path):
+            snapshot = read_json(path, {})
+        index = cls(clients, max_workers)
+        if snapshot.get('version') == SNAPSHOT_VERSION:
+            index.records = snapshot['records']
+        index._rebuild()
+        return index
@@ -0,0 +1,103 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+_DECODER = json.JSONDecoder()
+
+class _Reader:
+    """Character buffer over an iterator of byte chunks, refilled on demand and trimmed as it is consumed"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Append the next chunk to the buffer, returns False at end of input"""
+
+        if self.eof:
+            return False
+        if self.pos > 65536:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.buf += text
+                return True
+        self.buf += self._decoder.decode(b'', final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Next non-whitespace character, without consuming it"""
+
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode one complete JSON value, reading more input until it is complete"""
+
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number ending exactly at the buffer end may continue in the next chunk
+            if end == len(self.buf) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+def iter_page(chunks, meta):
+    """
+    Incrementally parse a NimOS response body, yielding the rows of its 'data' array one at a time.
+
+    All other top-level members (totalRows, startRow, endRow, messages...) are stored into the meta dict, which is
+    complete once the generator is exhausted. A 'data' member that is not an array is stored into meta as well.
+    Peak memory is bounded by the largest row rather than by the page.
+    """
+
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'data' and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            meta[key] = reader.value()
+
+        if reader.expect(',}') == '}':
+            return
@@ -0,0 +1,127 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import os
+import threading
+import time
+
+from .filestore import CACHE_DIR, locked, read_json, write_json
+
+_GROUP = 'group'
+_INVENTORY = 'inventory'
+_LAST_MODIFIED = 'last_modified'
+
+# Resources served by MetadataCache, with what a cached copy is revalidated against besides the group ID and
+# software version: the array inventory (array serials and last_modified), or a projected id,last_modified listing.
+CACHED_RESOURCES = {
+    'versions': _GROUP,
+    'software_versions': _GROUP,
+    'user_policies': _GROUP,
+    'arrays': _INVENTORY,
+    'controllers': _INVENTORY,
+    'application_categories': _LAST_MODIFIED,
+    'performance_policies': _LAST_MODIFIED,
+}
+
+# Resources without a detail listing endpoint
+_NO_DETAIL = ('versions',)
+
+# Shorter max_age, in seconds, of resources that can change without any marker noticing: user policies have no
+# last_modified and are edited by administrators at any time, so a cached copy may be that much out of date
+_MAX_AGE = {'user_policies': 300}
+
+class MetadataCache:
+    """
+    Disk-backed cache for rarely changing metadata.
+
+    Cached data is tied to the group ID and software version (version_current) of the array it was fetched from, so a
+    different array behind the same address or a software update invalidates it. On first use in a process, each
+    resource is revalidated cheaply (see CACHED_RESOURCES) rather than fetched in full.
+
+    Parameters:
+    - client  : nimbleclient.v1.Client connected to the array.
+    - path    : Cache file, ~/.nimble/metadata/<hostname>_<port>.json by default.
+    - max_age : Seconds after which an entry is refetched regardless of validation, user policies are refetched
+                after at most 5 minutes.
+    """
+
+    def __init__(self, client, path=None, max_age=86400):
+        self.client = client
+        self.path = path or os.path.join(CACHE_DIR, 'metadata', f"{client._client.hostname}_{client._client.port}.json")
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._group = None
+        self._inventory = None
+        self._memory = {}
+
+    def list(self, resource_type):
+        """Cached equivalent of client.<resource_type>.list(detail=True)"""
+
+        if resource_type not in CACHED_RESOURCES:
+            raise ValueError(f"{resource_type} is not a cached resource")
+
+        collection = getattr(self.client, resource_type)
+        detail = resource_type not in _NO_DETAIL
+        objs = self._entry(resource_type, lambda: [obj.attrs for obj in collection.list(detail=detail)], self._marker(resource_type))
+        return [collection.resource(obj['id'] if 'id' in obj else index, obj, client=collection._client, collection=collection) for index, obj in enumerate(objs)]
+
+    def get_timezone_list(self):
+        """Cached equivalent of client.groups.get_timezone_list(group_id)"""
+
+        return self._entry('timezones', lambda: self.client.groups.get_timezone_list(self._fingerprint()['id']), None)
+
+    def invalidate(self):
+        with self._lock:
+            self._memory.clear()
+            self._group = self._inventory = None
+        with locked(self.path):
+            write_json(self.path, {})
+
+    def _fingerprint(self):
+        if self._group is None:
+            group = self.client.groups.list(detail=True, fields='id,version_current')[0].attrs
+            self._group = {'id': group.get('id'), 'version': group.get('version_current')}
+        return self._group
+
+    def _marker(self, resource_type):
+        """Return a callable fetching the validation marker of resource_type, or None"""
+
+        kind = CACHED_RESOURCES[resource_type]
+        if kind == _INVENTORY:
+            def inventory():
+                if self._inventory is None:
+                    arrays = self.client.arrays.list(detail=True, fields='id,serial,last_modified')
+                    self._inventory = sorted(f"{obj.attrs.get('serial')}@{obj.attrs.get('last_modified')}" for obj in arrays)
+                return self._inventory
+            return inventory
+        if kind == _LAST_MODIFIED:
+            collection = getattr(self.client, resource_type)
+            return lambda: sorted(f"{obj.attrs.get('id')}@{obj.attrs.get('last_modified')}" for obj in collection.list(detail=True, fields='id,last_modified'))
+        return None
+
+    def _entry(self, name, fetch, marker):
+        with self._lock:
+            if name in self._memory:
+                return self._memory[name]
+
+        group = self._fingerprint()
+        current = marker() if marker is not None else None
+
+        with locked(self.path):
+            store = read_json(self.path, {})
+        entry = store.get('entries', {}).get(name) if store.get('group') == group else None
+
+        max_age = min(self.max_age, _MAX_AGE.get(name, self.max_age))
+        if entry is None or entry['marker'] != current or entry['fetched'] + max_age <= time.time():
+            entry = {'marker': current, 'fetched': time.time(), 'data': fetch()}
+            with locked(self.path):
+                store = read_json(self.path, {})
+                if store.get('group') != group:
+                    store = {'group': group, 'entries': {}}
+                store['entries'][name] = entry
+                write_json(self.path, store)
+
+        with self._lock:
+            self._memory[name] = entry['data']
+        return entry['data']
@@ -0,0 +1,143 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import logging
+import threading
+import time
+
+from .exceptions import NimOSAPIError
+
+MOVE_FIELDS = "id,name,dest_pool_id,move_aborting,move_start_time,move_bytes_migrated,move_bytes_remaining,move_est_compl_time"
+
+class MoveProgress:
+    """Aggregate progress of the monitored volume moves at one poll"""
+
+    __slots__ = ['timestamp', 'volumes', 'completed', 'aborted', 'bytes_migrated', 'bytes_remaining', 'throughput', 'eta',
+                 'pending']
+
+    def __init__(self, timestamp, volumes, completed, aborted, bytes_migrated, bytes_remaining, throughput, eta,
+                 pending=()):
+        self.timestamp = timestamp
+        self.volumes = volumes
+        self.completed = completed
+        self.aborted = aborted
+        self.bytes_migrated = bytes_migrated
+        self.bytes_remaining = bytes_remaining
+        self.throughput = throughput
+        self.eta = eta
+        self.pending = pending
+
+    @property
+    def done(self):
+        return not self.volumes and not self.pending
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__}(moving={len(self.volumes)}, completed={len(self.completed)}, "
+                f"throughput={self.throughput:.1f}MB/s, eta={self.eta})>")
+
+class MoveMonitor:
+    """
+    Streams the progress of volume moves using a single projected list call per interval.
+
+    NimOS list filters only match exact values, so there is no server-side filter for "dest_pool_id is set": every
+    poll lists the move fields of all volumes and keeps the moving ones. A requested volume that is not moving yet is
+    pending, it only counts as completed once it has been seen moving.
+
+    Parameters:
+    - client            : nimbleclient.v1.Client connected to the array.
+    - vol_ids           : IDs of the volumes to monitor. If not specified, every volume moving at the first poll is monitored.
+    - interval          : Seconds between polls.
+    - deadline          : Seconds after which the remaining moves are overdue, and pending ones no longer awaited.
+    - abort_on_deadline : Call abort_move on every volume still moving when the deadline is hit.
+    """
+
+    def __init__(self, client, vol_ids=None, interval=30, deadline=None, abort_on_deadline=False):
+        self.client = client
+        self.vol_ids = set(vol_ids) if vol_ids is not None else None
+        self.interval = interval
+        self.deadline = deadline
+        self.abort_on_deadline = abort_on_deadline
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def poll(self):
+        """Fetch the move fields of all volumes currently moving"""
+
+        vols = self.client.volumes.list(detail=True, fields=MOVE_FIELDS)
+        return {vol.id: vol.attrs for vol in vols if vol.attrs.get('dest_pool_id')}
+
+    def events(self):
+        """Generator of MoveProgress events, one per poll, until every monitored move ends"""
+
+        self._stopped.clear()
+        started = time.monotonic()
+        vol_ids = set(self.vol_ids) if self.vol_ids is not None else None
+        seen = set()
+        aborted = set()
+        last_time = last_migrated = None
+        finished_bytes = 0
+        overdue = False
+        previous = {}
+
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            moving = self.poll()
+            if vol_ids is None:
+                vol_ids = set(moving)
+
+            watched = {vol_id: attrs for vol_id, attrs in moving.items() if vol_id in vol_ids}
+            seen.update(watched)
+            completed = seen - set(watched)
+            pending = vol_ids - seen
+
+            # Moves finishing between polls still count towards the migrated total
+            for vol_id in set(previous) - set(watched):
+                attrs = previous[vol_id]
+                finished_bytes += (attrs.get('move_bytes_migrated') or 0) + (attrs.get('move_bytes_remaining') or 0)
+            migrated = finished_bytes + sum(attrs.get('move_bytes_migrated') or 0 for attrs in watched.values())
+            remaining = sum(attrs.get('move_bytes_remaining') or 0 for attrs in watched.values())
+
+            throughput = 0.0
+            if last_time is not None and now > last_time:
+                throughput = max(migrated - last_migrated, 0) / (now - last_time) / 2**20
+            eta = remaining / (throughput * 2**20) if throughput else None
+
+            if self.deadline is not None and now - started >= self.deadline and (watched or pending) and not overdue:
+                overdue = True
+                if pending:
+                    logging.warning(f"Volume moves not started after {self.deadline}s deadline: {sorted(pending)}")
+                    vol_ids -= pending
+                    pending = set()
+                if watched:
+                    logging.warning(f"Volume moves still running after {self.deadline}s deadline: {sorted(watched)}")
+                if self.abort_on_deadline:
+                    for vol_id in watched:
+                        self._abort(vol_id)
+                    aborted.update(watched)
+                    watched = {}
+
+            yield MoveProgress(now, watched, set(completed), set(aborted), migrated, remaining, throughput, eta, set(pending))
+
+            if not watched and not pending:
+                return
+
+            last_time, last_migrated, previous = now, migrated, watched
+            self._stopped.wait(self.interval)
+
+    def run(self, callback=None):
+        """Monitor until every move ends, passing each MoveProgress to callback; returns the last one"""
+
+        progress = None
+        for progress in self.events():
+            if callback is not None:
+                callback(progress)
+        return progress
+
+    def _abort(self, vol_id):
+        try:
+            self.client.volumes.abort_move(vol_id)
+        except NimOSAPIError as error:
+            logging.warning(f"Unable to abort move of volume {vol_id}: {error}")
@@ -0,0 +1,91 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import threading
+
+class PageSizer:
+    """
+    Learns, per endpoint of an array, the number of rows to request per page so that a page takes about target seconds.
+
+    Every page fetched by NimOSAPIClient.get() reports its rows, latency and bytes. The time per row is smoothed over
+    pages and the next window is sized to hit the target latency, at most doubling from one page to the next, and also
+    capped so a page stays under max_bytes. When the array returns fewer rows than requested while more are pending,
+    its row limit (rest_api_row_limit) has been reached and is remembered as the upper bound of the endpoint.
+
+    Sizers are shared by all clients of the same array in a process, see for_array().
+
+    Parameters:
+    - name      : Array the sizer belongs to, as hostname:port.
+    - target    : Page latency to aim for, in seconds.
+    - min_rows  : Smallest window requested.
+    - max_rows  : Largest window requested, the array may return less.
+    - max_bytes : Largest page body to aim for, in bytes.
+    - smoothing : Weight of the latest page in the time and size per row averages.
+    """
+
+    _REGISTRY = {}
+    _REGISTRY_LOCK = threading.Lock()
+
+    def __init__(self, name, target=1.0, min_rows=64, max_rows=10000, max_bytes=16 * 1024 * 1024, smoothing=0.5):
+        self.name = name
+        self.target = target
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.smoothing = smoothing
+        # {endpoint: [rows, seconds per row, bytes per row, row limit of the array]}
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_array(cls, hostname, port, **kwargs):
+        """Sizer of hostname:port, created with kwargs on first use"""
+
+        name = f"{hostname}:{port}"
+        with cls._REGISTRY_LOCK:
+            sizer = cls._REGISTRY.get(name)
+            if sizer is None:
+                sizer = cls._REGISTRY[name] = cls(name, **kwargs)
+            return sizer
+
+    def rows(self, endpoint):
+        """Window to request for the next page of endpoint, None until a page of it has been measured"""
+
+        learned = self._endpoints.get(endpoint)
+        return learned[0] if learned is not None else None
+
+    def sizes(self):
+        """{endpoint: rows} learned so far"""
+
+        with self._lock:
+            return {endpoint: learned[0] for endpoint, learned in self._endpoints.items()}
+
+    def observe(self, endpoint, requested, rows, seconds, size, more):
+        """
+        Account for a page of rows that took seconds and size bytes, requested is the window asked for (None for the
+        array default) and more tells whether rows were still pending after it.
+        """
+
+        if rows <= 0:
+            return
+        with self._lock:
+            learned = self._endpoints.get(endpoint)
+            if learned is not None and not more:
+                # The last page of a listing is usually short, its fixed overhead would skew the time per row
+                return
+            if learned is None:
+                learned = self._endpoints[endpoint] = [rows, seconds / rows, size / rows, self.max_rows]
+            else:
+                weight = self.smoothing
+                learned[1] += weight * (seconds / rows - learned[1])
+                learned[2] += weight * (size / rows - learned[2])
+
+            if more and requested is not None and rows < requested:
+                # Short page with rows pending: the array row limit
+                learned[3] = min(learned[3], rows)
+
+            ideal = self.target / learned[1] if learned[1] > 0 else learned[3]
+            if learned[2] > 0:
+                ideal = min(ideal, self.max_bytes / learned[2])
+            learned[0] = int(min(max(min(ideal, rows * 2), self.min_rows), learned[3]))
@@ -0,0 +1,323 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+"""
+Profiling of SDK calls, off unless enabled with the profile() context manager or the NIMBLE_SDK_PROFILE environment
+variable ('1' or 'cprofile' for deterministic profiling, 'sample' for a sampling profiler). With the environment
+variable, the summary is written to stderr when the process exits.
+
+    with profiling.profile() as profiler:
+        client.volumes.list(detail=True)
+
+Calls are attributed to the Collection method and the endpoint that caused them. While disabled, the instrumented
+methods only check a module global.
+"""
+
+import atexit
+import functools
+import io
+import logging
+import os
+import sys
+import threading
+import time
+import types
+from contextlib import contextmanager
+
+_active = None
+
+class _Scope:
+    __slots__ = ['key', 'started', 'memory', 'network']
+
+    def __init__(self, key, memory):
+        self.key = key
+        self.started = time.perf_counter()
+        self.memory = memory
+        self.network = 0.0
+
+class ScopeStats:
+    """Totals of one Collection method or endpoint, nested scopes are included in their callers"""
+
+    __slots__ = ['calls', 'wall', 'network', 'allocated', 'rows']
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.network = 0.0
+        self.allocated = 0
+        self.rows = 0
+
+    @property
+    def internal(self):
+        return self.wall - self.network
+
+class Profiler:
+    """
+    Collects timings, cProfile or sampled stacks and tracemalloc allocations of SDK calls while started.
+
+    Network time is the time spent in transport requests, the rest of a call is internal. Allocated bytes are the
+    growth of traced memory over a call, including what it returns, and other threads allocating at the same time are
+    counted too.
+
+    Parameters:
+    - mode            : 'cprofile' or 'sample'.
+    - memory          : Trace allocations with tracemalloc.
+    - sample_interval : Seconds between two samples in sample mode.
+    - top             : Number of functions and allocation sites in the summary.
+    """
+
+    def __init__(self, mode='cprofile', memory=True, sample_interval=0.005, top=15):
+        if mode not in ('cprofile', 'sample'):
+            raise ValueError(f"Unknown profiling mode {mode}")
+        self.mode = mode
+        self.memory = memory
+        self.sample_interval = sample_interval
+        self.top = top
+        self.stats = {}
+        self.samples = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stacks = {}
+        self._profiles = []
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._snapshot = None
+        self._allocations = []
+        self._started_tracemalloc = False
+        # cProfile, pstats and tracemalloc are only imported once needed, to keep the SDK import light
+        self._tracemalloc = None
+
+    def start(self):
+        global _active
+
+        if self.memory:
+            import tracemalloc
+            self._tracemalloc = tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.mode == 'sample':
+            self._stopped.clear()
+            self._sampler = threading.Thread(target=self._sample, name='nimble-profiler', daemon=True)
+            self._sampler.start()
+        _active = self
+
+    def stop(self):
+        global _active
+
+        if _active is self:
+            _active = None
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        for profile in self._profiles:
+            profile.disable()
+        tracemalloc = self._tracemalloc
+        if tracemalloc is not None and tracemalloc.is_tracing():
+            own = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+            self._allocations = tracemalloc.take_snapshot().filter_traces(own).compare_to(self._snapshot.filter_traces(own), 'lineno')
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+
+    @contextmanager
+    def scope(self, key):
+        stack = self._stacks.get(threading.get_ident())
+        if stack is None:
+            stack = self._stacks[threading.get_ident()] = []
+        if not stack and self.mode == 'cprofile':
+            self._enable_thread_profile()
+
+        tracemalloc = self._tracemalloc
+        scope = _Scope(key, tracemalloc.get_traced_memory()[0] if tracemalloc is not None and tracemalloc.is_tracing() else 0)
+        stack.append(scope)
+        result = {'rows': 0}
+        try:
+            yield result
+        finally:
+            stack.pop()
+            wall = time.perf_counter() - scope.started
+            allocated = tracemalloc.get_traced_memory()[0] - scope.memory if tracemalloc is not None and tracemalloc.is_tracing() else 0
+            with self._lock:
+                stats = self.stats.get(key)
+                if stats is None:
+                    stats = self.stats[key] = ScopeStats()
+                stats.calls += 1 if result.get('calls', 1) else 0
+                stats.wall += wall
+                stats.network += scope.network
+                stats.allocated += max(allocated, 0)
+                stats.rows += result['rows']
+            if not stack and self.mode == 'cprofile':
+                self._local.profile.disable()
+
+    def add_network(self, seconds):
+        """Charge time spent waiting on the transport to every scope open in the calling thread"""
+
+        for scope in self._stacks.get(threading.get_ident(), ()):
+            scope.network += seconds
+
+    def timed(self, chunks):
+        """Charge the reads of a streamed response body to the network time of the calling thread"""
+
+        while True:
+            started = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self.add_network(time.perf_counter() - started)
+            yield chunk
+
+    def _enable_thread_profile(self):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            import cProfile
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        try:
+            profile.enable()
+        except ValueError as error:
+            # Only one profiler may be active at a time on some interpreters
+            logging.debug(f"Unable to profile thread: {error}")
+
+    def _sample(self):
+        me = threading.get_ident()
+        while not self._stopped.wait(self.sample_interval):
+            for ident, frame in sys._current_frames().items():
+                stack = self._stacks.get(ident)
+                if ident == me or not stack:
+                    continue
+                key = stack[0].key
+                seen = set()
+                leaf = True
+                while frame is not None:
+                    code = frame.f_code
+                    function = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if function not in seen:
+                        seen.add(function)
+                        with self._lock:
+                            counts = self.samples.setdefault(function, [0, 0, {}])
+                            counts[0] += leaf
+                            counts[1] += 1
+                            counts[2][key] = counts[2].get(key, 0) + 1
+                    leaf = False
+                    frame = frame.f_back
+
+    def summary(self):
+        """Text summary: per call timings, top functions and top allocation sites"""
+
+        out = io.StringIO()
+        out.write(f"{'SDK call':<60} {'calls':>7} {'wall s':>9} {'network s':>10} {'internal s':>11} {'alloc KiB':>10} {'rows':>8} {'B/row':>8}\n")
+        for key, stats in sorted(self.stats.items(), key=lambda item: item[1].wall, reverse=True):
+            per_row = f"{stats.allocated / stats.rows:.0f}" if stats.rows else '-'
+            out.write(f"{key:<60} {stats.calls:>7} {stats.wall:>9.3f} {stats.network:>10.3f} {stats.internal:>11.3f} "
+                      f"{stats.allocated / 1024:>10.1f} {stats.rows:>8} {per_row:>8}\n")
+
+        stats = self._merged_stats(out)
+        if stats is not None:
+            out.write("\n")
+            stats.sort_stats('cumulative').print_stats(self.top)
+        elif self.samples:
+            total = sum(counts[0] for counts in self.samples.values()) or 1
+            out.write(f"\n{'self %':>7} {'total %':>8}  function (top SDK call)\n")
+            for (filename, line, name), (own, cumulative, keys) in sorted(self.samples.items(), key=lambda item: item[1][0], reverse=True)[:self.top]:
+                out.write(f"{100 * own / total:>7.1f} {100 * cumulative / total:>8.1f}  {name} {filename}:{line} ({max(keys, key=keys.get)})\n")
+
+        if self._allocations:
+            out.write(f"\n{'growth':>14} {'blocks':>8}  allocation site\n")
+        for stat in self._allocations[:self.top]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            out.write(f"{stat.size_diff / 1024:>10.1f} KiB {stat.count_diff:>8}  {frame.filename}:{frame.lineno}\n")
+        return out.getvalue()
+
+    def dump(self, stream=None, path=None):
+        """Write the summary to stream (stderr by default), and the raw cProfile stats to path if given"""
+
+        (stream or sys.stderr).write(self.summary())
+        stats = self._merged_stats()
+        if path and stats is not None:
+            stats.dump_stats(path)
+
+    def _merged_stats(self, stream=None):
+        """pstats.Stats merged from the profiles of all threads, or None"""
+
+        import pstats
+
+        stats = None
+        for profile in self._profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile, stream=stream)
+                else:
+                    stats.add(profile)
+            except TypeError: # Profile never enabled
+                continue
+        return stats
+
+@contextmanager
+def profile(mode='cprofile', memory=True, stream=None, path=None, **kwargs):
+    """Profile the SDK calls made in the block and dump the summary on exit (to stream, stderr by default)"""
+
+    profiler = Profiler(mode, memory, **kwargs)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.dump(stream, path)
+
+def _iterate(profiler, key, iterator):
+    """Profile the consumption of a generator, every next() runs in the scope of the call that created it"""
+
+    while True:
+        with profiler.scope(key) as result:
+            result['calls'] = 0
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            result['rows'] = 1
+        yield item
+
+def _profiled(label):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            profiler = _active
+            if profiler is None:
+                return func(self, *args, **kwargs)
+            key = label(self, func, args)
+            with profiler.scope(key) as result:
+                value = func(self, *args, **kwargs)
+                if isinstance(value, types.GeneratorType):
+                    return _iterate(profiler, key, value)
+                if isinstance(value, list):
+                    result['rows'] = len(value)
+                return value
+        return wrapper
+    return decorator
+
+# Collection methods, labelled VolumeList.list
+profiled = _profiled(lambda self, func, args: f"{self.__class__.__name__}.{func.__name__}")
+
+# NimOSAPIClient requests, labelled GET v1/volumes
+profiled_request = _profiled(lambda self, func, args: f"{func.__name__.upper().replace('ITER_', '')} {args[0] if args else ''}")
+
+def _from_environment():
+    mode = os.environ.get('NIMBLE_SDK_PROFILE', '').lower()
+    if mode in ('', '0', 'false'):
+        return
+    profiler = Profiler('sample' if mode == 'sample' else 'cprofile')
+    profiler.start()
+
+    def report():
+        profiler.stop()
+        profiler.dump()
+    atexit.register(report)
+
+_from_environment()
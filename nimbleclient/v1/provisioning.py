@@ -0,0 +1,447 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .deadline import propagated
+from .exceptions import NimOSAPIError, NimOSCallCancelled
+from .fleetindex import normalize
+
+ACR_FIELDS = 'id,vol_id,initiator_group_id,apply_to,lun,access_protocol'
+
+# Highest LUN of a volume exported over Fibre Channel
+MAX_FC_LUN = 2047
+
+# Existing records satisfying a request, by apply_to of the request
+_COVERED_BY = {'volume': ('volume', 'both'), 'snapshot': ('snapshot', 'both')}
+
+class ProvisionResult:
+    """Outcome of a provisioning run"""
+
+    def __init__(self):
+        self.succeeded = {}
+        self.failed = {}
+        self.rolled_back = []
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(succeeded={len(self.succeeded)}, failed={len(self.failed)}, rolled_back={len(self.rolled_back)})>"
+
+class CloneFarm:
+    """
+    Pipelined provisioning of many clones from a single base snapshot.
+
+    Each clone is created and then exported through its access control records in order, while
+    different clones progress concurrently. A clone whose pipeline fails is rolled back (its
+    access control records are removed, then the clone is taken offline and deleted).
+
+    Parameters:
+    - client       : nimbleclient.v1.Client connected to the array.
+    - base_snap_id : ID of the snapshot to clone from.
+    - max_workers  : Maximum number of clones in flight at once.
+    """
+
+    def __init__(self, client, base_snap_id, max_workers=16):
+        self.client = client
+        self.base_snap_id = base_snap_id
+        self.max_workers = max_workers
+
+    def provision(self, names, acrs=None, all_or_nothing=False, **clone_attrs):
+        """
+        Create a clone for every name and the given access control records for each clone.
+
+        Parameters:
+        - names          : Names of the clones to create.
+        - acrs           : List of access control record attributes (e.g. {'initiator_group_id': ...}) created for every clone, in order.
+        - all_or_nothing : Roll back every clone of the run, including successful ones, if any clone fails. Clones not
+                           started yet at that point are skipped and recorded in failed with a NimOSCallCancelled.
+        - clone_attrs    : Extra volume attributes passed to each clone create call.
+        """
+
+        result = ProvisionResult()
+        abort = threading.Event()
+        lock = threading.Lock()
+
+        def pipeline(name):
+            if abort.is_set():
+                with lock:
+                    result.failed[name] = NimOSCallCancelled(f"Clone {name} aborted after another clone failed")
+                return
+
+            vol = None
+            created = []
+            try:
+                vol = self.client.volumes.create(name, clone=True, base_snap_id=self.base_snap_id, **clone_attrs)
+                for attrs in acrs or []:
+                    created.append(self.client.access_control_records.create(vol_id=vol.id, **attrs))
+            except Exception as error:
+                logging.debug(f"Clone pipeline for {name} failed: {error}")
+                if all_or_nothing:
+                    abort.set()
+                self._rollback(vol, created)
+                with lock:
+                    result.failed[name] = error
+                    if vol is not None:
+                        result.rolled_back.append(name)
+                return
+
+            with lock:
+                result.succeeded[name] = (vol, created)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(propagated(pipeline), names))
+
+        if all_or_nothing and result.failed:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(propagated(lambda item: self._rollback(*item)), result.succeeded.values()))
+            result.rolled_back.extend(result.succeeded)
+            result.succeeded = {}
+
+        return result
+
+    def _rollback(self, vol, acrs):
+        """Undo a (partial) clone pipeline, newest object first"""
+
+        for acr in reversed(acrs):
+            try:
+                self.client.access_control_records.delete(acr.id)
+            except (NimOSAPIError, ConnectionError) as error:
+                logging.warning(f"Unable to roll back access control record {acr.id}: {error}")
+
+        if vol is None:
+            return
+
+        try:
+            self.client.volumes.offline(vol.id)
+            self.client.volumes.delete(vol.id)
+        except (NimOSAPIError, ConnectionError) as error:
+            logging.warning(f"Unable to roll back clone {vol.id}: {error}")
+
+class AccessPlan:
+    """Access control records to create, and those already in place, for a set of requests"""
+
+    __slots__ = ['create', 'existing']
+
+    def __init__(self):
+        self.create = []
+        self.existing = []
+
+    def __len__(self):
+        return len(self.create)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(create={len(self.create)}, existing={len(self.existing)})>"
+
+class AccessProvisioner:
+    """
+    Exports many volumes to many initiator groups with as few calls as possible.
+
+    Existing access control records are listed once and indexed by (vol_id, initiator_group_id, apply_to), so planning
+    does not query the array per volume and never attempts a duplicate: a record applying to both covers requests for
+    the volume or its snapshots, and a request for both next to a volume (or snapshot) record only adds the other
+    half. Volumes exported to Fibre Channel groups get the lowest LUN free in the group, from the
+    index as well, and the array is only asked to suggest_lun when a locally chosen LUN is refused. The missing records
+    are then created concurrently.
+
+    Parameters:
+    - client      : nimbleclient.v1.Client of the array.
+    - max_workers : Maximum number of records created concurrently.
+    """
+
+    def __init__(self, client, max_workers=8):
+        self.client = client
+        self.max_workers = max_workers
+        self.records = {}
+        self.protocols = {}
+        self._luns = {}
+        self._volume_luns = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        """Index the access control records and initiator group protocols of the array"""
+
+        api = self.client._client
+        records = api.list_resources('access_control_records', detail=True, fields=ACR_FIELDS)
+        groups = api.list_resources('initiator_groups', detail=True, fields='id,access_protocol')
+        with self._lock:
+            self.records = {}
+            self._luns = {}
+            self._volume_luns = {}
+            self.protocols = {group['id']: group.get('access_protocol') for group in groups}
+            for record in records:
+                self._index(record)
+            self._loaded = True
+        return self
+
+    def _index(self, record):
+        self.records[(record.get('vol_id'), record.get('initiator_group_id'), record.get('apply_to'))] = record
+        if record.get('lun') is not None:
+            self._luns.setdefault(record.get('initiator_group_id'), set()).add(record['lun'])
+            self._volume_luns.setdefault(record.get('vol_id'), record['lun'])
+
+    def find(self, vol_id, initiator_group_id, apply_to='both'):
+        """Existing record granting initiator_group_id access to vol_id, or None"""
+
+        for covering in _COVERED_BY.get(apply_to, (apply_to,)):
+            record = self.records.get((vol_id, initiator_group_id, covering))
+            if record is not None:
+                return record
+        return None
+
+    def _free_lun(self, initiator_group_id, vol_id):
+        used = self._luns.setdefault(initiator_group_id, set())
+        # Keep the LUN the volume already has in other groups when possible, hosts of a cluster then agree on it
+        lun = self._volume_luns.get(vol_id)
+        if lun is not None and lun not in used:
+            return lun
+        return next((lun for lun in range(MAX_FC_LUN + 1) if lun not in used), None)
+
+    def plan(self, requests, apply_to='both'):
+        """
+        Return the AccessPlan of requests, an iterable of (vol_id, initiator_group_id) or
+        (vol_id, initiator_group_id, apply_to) tuples. LUNs chosen for the plan are reserved in the index.
+        """
+
+        if not self._loaded:
+            self.load()
+        plan = AccessPlan()
+        seen = set()
+        with self._lock:
+            for request in requests:
+                vol_id, initiator_group_id = request[:2]
+                target = request[2] if len(request) > 2 else apply_to
+                key = (vol_id, initiator_group_id, target)
+                if key in seen:
+                    continue
+                seen.add(key)
+
+                record = self.find(*key)
+                if record is None and target == 'both':
+                    halves = {half: self.find(vol_id, initiator_group_id, half) for half in ('volume', 'snapshot')}
+                    if all(halves.values()):
+                        plan.existing.extend(halves.values())
+                        continue
+                    # Only the missing half is created next to an existing volume or snapshot record
+                    for half, record in halves.items():
+                        if record is not None:
+                            plan.existing.append(record)
+                            target = 'snapshot' if half == 'volume' else 'volume'
+                    record = None
+                if record is not None:
+                    plan.existing.append(record)
+                    continue
+
+                payload = {'vol_id': vol_id, 'initiator_group_id': initiator_group_id, 'apply_to': target}
+                if self.protocols.get(initiator_group_id) == 'fc' and target in ('volume', 'both'):
+                    lun = self._free_lun(initiator_group_id, vol_id)
+                    if lun is not None:
+                        payload['lun'] = lun
+                        self._luns[initiator_group_id].add(lun)
+                        self._volume_luns.setdefault(vol_id, lun)
+                plan.create.append(payload)
+        return plan
+
+    def _create(self, payload):
+        api = self.client._client
+        try:
+            return api.create_resource('access_control_records', **payload)
+        except NimOSAPIError as error:
+            if 'lun' not in payload:
+                raise
+            # The LUN was taken behind the index, let the array pick one
+            logging.debug(f"LUN {payload['lun']} refused for {payload['vol_id']}: {error}")
+            suggested = self.client.initiator_groups.suggest_lun(payload['initiator_group_id'], vol_id=payload['vol_id'])
+            lun = suggested.get('lun') if isinstance(suggested, dict) else suggested
+            return api.create_resource('access_control_records', **{**payload, 'lun': lun})
+
+    def apply(self, plan):
+        """Create the records of plan concurrently, return a (created, errors) tuple, errors keyed like the index"""
+
+        created = []
+        errors = {}
+        if not plan.create:
+            return created, errors
+
+        def create(payload):
+            try:
+                return payload, self._create(payload), None
+            except Exception as error:
+                return payload, None, error
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(plan.create))) as executor:
+            for payload, record, error in executor.map(propagated(create), plan.create):
+                key = (payload['vol_id'], payload['initiator_group_id'], payload['apply_to'])
+                if error is not None:
+                    logging.warning(f"Unable to create access control record {key}: {error}")
+                    errors[key] = error
+                    continue
+                record = {**payload, **(record or {})}
+                with self._lock:
+                    self._index(record)
+                created.append(record)
+        return created, errors
+
+    def provision(self, requests, apply_to='both'):
+        """Plan and apply requests, see plan() and apply()"""
+
+        return self.apply(self.plan(requests, apply_to))
+
+INITIATOR_FIELDS = 'id,initiator_group_id,access_protocol,label,iqn,ip_address,wwpn,alias'
+
+def _member(member):
+    """Attributes of a desired initiator given as an IQN, a WWPN or a dict of initiator attributes"""
+
+    attrs = dict(member) if isinstance(member, dict) else {('iqn' if str(member).lower().startswith('iqn.') else 'wwpn'): member}
+    if attrs.get('iqn'):
+        attrs['access_protocol'] = 'iscsi'
+        # Labels only need to be unique within the group
+        attrs.setdefault('label', re.sub(r'[^A-Za-z0-9_.-]+', '-', attrs['iqn'].split(':')[-1])[:64])
+    elif attrs.get('wwpn'):
+        attrs['access_protocol'] = 'fc'
+    else:
+        raise ValueError(f"Initiator {member!r} has neither an iqn nor a wwpn")
+    return attrs
+
+class ReconcilePlan:
+    """Initiator groups to create and initiators to add and remove to reach the desired membership"""
+
+    __slots__ = ['create_groups', 'add', 'remove', 'unchanged']
+
+    def __init__(self):
+        self.create_groups = []
+        self.add = []
+        self.remove = []
+        self.unchanged = 0
+
+    def __len__(self):
+        return len(self.create_groups) + len(self.add) + len(self.remove)
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__}(create_groups={len(self.create_groups)}, add={len(self.add)}, "
+                f"remove={len(self.remove)}, unchanged={self.unchanged})>")
+
+class InitiatorGroupReconciler:
+    """
+    Brings the membership of many initiator groups to a desired state with the fewest writes.
+
+    Initiator groups and initiators are each listed once. Members are matched on their normalized IQN or WWPN, so
+    every group only gets the initiators it lacks created and the ones it should not have deleted, instead of a full
+    rewrite of its iscsi_initiators or fc_initiators: reconciling an unchanged state issues no write at all. Removals
+    run first, in parallel, so an initiator moving between groups is free when it is added, then groups missing on
+    the array and additions.
+
+    Parameters:
+    - client         : nimbleclient.v1.Client of the array.
+    - max_workers    : Maximum number of concurrent writes.
+    - create_missing : Create desired groups that do not exist on the array.
+    """
+
+    def __init__(self, client, max_workers=8, create_missing=True):
+        self.client = client
+        self.max_workers = max_workers
+        self.create_missing = create_missing
+        self.groups = {}
+        self.members = {}
+
+    def load(self):
+        """Index the initiator groups by name and their initiators by normalized IQN or WWPN"""
+
+        api = self.client._client
+        groups = api.list_resources('initiator_groups', detail=True, fields='id,name,access_protocol')
+        initiators = api.list_resources('initiators', detail=True, fields=INITIATOR_FIELDS)
+        self.groups = {group['name']: group for group in groups}
+        self.members = {group['id']: {} for group in groups}
+        for initiator in initiators:
+            key = initiator.get('iqn') or initiator.get('wwpn')
+            if key:
+                self.members.setdefault(initiator.get('initiator_group_id'), {})[normalize(key)] = initiator
+        return self
+
+    def plan(self, desired):
+        """
+        Return the ReconcilePlan of desired, a mapping of initiator group name to its members: IQNs, WWPNs or dicts
+        of initiator attributes (iqn with label and ip_address, or wwpn with alias). Raises ValueError for a member
+        with neither an iqn nor a wwpn.
+        """
+
+        self.load()
+        plan = ReconcilePlan()
+        for name, members in desired.items():
+            wanted = {}
+            for member in members:
+                attrs = _member(member)
+                wanted[normalize(attrs.get('iqn') or attrs.get('wwpn'))] = attrs
+
+            group = self.groups.get(name)
+            if group is None:
+                if not self.create_missing:
+                    logging.warning(f"Initiator group {name} does not exist")
+                    continue
+                protocols = {attrs['access_protocol'] for attrs in wanted.values()}
+                plan.create_groups.append({'name': name, 'access_protocol': protocols.pop() if len(protocols) == 1 else 'iscsi'})
+                plan.add.extend({**attrs, 'initiator_group_name': name} for attrs in wanted.values())
+                continue
+
+            current = self.members.get(group['id'], {})
+            plan.remove.extend(initiator for key, initiator in current.items() if key not in wanted)
+            plan.add.extend({**attrs, 'initiator_group_id': group['id']} for key, attrs in wanted.items() if key not in current)
+            plan.unchanged += len(wanted.keys() & current.keys())
+        return plan
+
+    def _run(self, func, items, errors, describe):
+        results = []
+        if not items:
+            return results
+
+        def call(item):
+            try:
+                return item, func(item), None
+            except Exception as error:
+                return item, None, error
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            for item, result, error in executor.map(propagated(call), items):
+                if error is not None:
+                    logging.warning(f"Unable to {describe(item)}: {error}")
+                    errors[describe(item)] = error
+                else:
+                    results.append(result)
+        return results
+
+    def apply(self, plan):
+        """Apply plan, return a (changes, errors) tuple: the number of writes that succeeded and failures by operation"""
+
+        api = self.client._client
+        errors = {}
+        removed = self._run(lambda initiator: api.delete_resource('initiators', initiator['id']), plan.remove, errors,
+                            lambda initiator: f"remove {initiator.get('iqn') or initiator.get('wwpn')}")
+
+        groups = self._run(lambda attrs: api.create_resource('initiator_groups', **attrs), plan.create_groups, errors,
+                           lambda attrs: f"create group {attrs['name']}")
+        group_ids = {group['name']: group['id'] for group in groups}
+
+        additions = []
+        for attrs in plan.add:
+            attrs = dict(attrs)
+            name = attrs.pop('initiator_group_name', None)
+            if name is not None:
+                if name not in group_ids:
+                    continue
+                attrs['initiator_group_id'] = group_ids[name]
+            additions.append(attrs)
+        added = self._run(lambda attrs: api.create_resource('initiators', **attrs), additions, errors,
+                          lambda attrs: f"add {attrs.get('iqn') or attrs.get('wwpn')}")
+        return len(removed) + len(groups) + len(added), errors
+
+    def reconcile(self, desired):
+        """Plan and apply desired, see plan() and apply()"""
+
+        return self.apply(self.plan(desired))
@@ -0,0 +1,169 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .deadline import propagated
+from .fleet import fan_out
+
+_FIELDS = {
+    'groups': 'id,name',
+    'replication_partners': 'id,name,hostname,is_alive,paused,throttled_bandwidth_current_kbps',
+    'volume_collections': 'id,name,total_repl_bytes,repl_bytes_transferred',
+    'protection_schedules': ('id,name,volcoll_or_prottmpl_type,volcoll_or_prottmpl_id,downstream_partner_name,upstream_partner_name,'
+                             'last_replicated_at_time,next_repl_snap_time,repl_alert_thres'),
+    'snapshot_collections': 'id,volcoll_id,sched_id,is_replica,repl_status,repl_start_time,repl_complete_time,repl_bytes_transferred,creation_time',
+}
+
+# Newest snapshot collections fetched per replicated schedule, enough to reach the last completed replication
+SNAPCOLL_PAGE_SIZE = 8
+
+def _replicated(sched):
+    return sched.get('volcoll_or_prottmpl_type') == 'volume_collection' and bool(sched.get('downstream_partner_name'))
+
+class ReplicationLag:
+    """Replication state of one volume collection schedule, joined from its upstream and downstream arrays"""
+
+    __slots__ = ['array', 'volcoll', 'schedule', 'partner', 'downstream_array', 'partner_alive', 'lag', 'alert_threshold',
+                 'next_replication', 'in_progress', 'bandwidth', 'remaining_bytes', 'catch_up', 'downstream_last_replica']
+
+    def __init__(self, **attrs):
+        for name in self.__slots__:
+            setattr(self, name, attrs.get(name))
+
+    @property
+    def overdue(self):
+        return bool(self.alert_threshold) and self.lag is not None and self.lag > self.alert_threshold
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(array={self.array}, volcoll={self.volcoll}, schedule={self.schedule}, lag={self.lag})>"
+
+class ReplicationAnalyzer:
+    """
+    Fleet-wide replication lag, achieved bandwidth and projected catch-up time per volume collection schedule.
+
+    Every array is queried in parallel with one projected listing per resource type, except snapshot collections: only
+    the newest few of each replicated schedule are listed, as an array keeps many of them. Upstream schedules are matched to
+    the schedule of the same volume collection and name on the downstream array, found by group name or partner
+    hostname among the analyzed arrays.
+
+    Parameters:
+    - clients     : Mapping of array name to nimbleclient.v1.Client.
+    - max_workers : Maximum number of arrays queried concurrently.
+    """
+
+    def __init__(self, clients, max_workers=16):
+        self.clients = clients
+        self.max_workers = max_workers
+        self.views = {}
+        self.errors = {}
+
+    def fetch(self):
+        """Load the replication view of every array"""
+
+        def load(name, client):
+            list_resources = propagated(client._client.list_resources)
+            with ThreadPoolExecutor(max_workers=len(_FIELDS)) as executor:
+                futures = {resource_type: executor.submit(list_resources, resource_type, detail=True, fields=fields)
+                           for resource_type, fields in _FIELDS.items() if resource_type != 'snapshot_collections'}
+                view = {resource_type: future.result() for resource_type, future in futures.items()}
+
+                snapcolls = [executor.submit(list_resources, 'snapshot_collections', detail=True, fields=_FIELDS['snapshot_collections'],
+                                             sched_id=sched['id'], sortBy='creation_time', sortOrder='descending',
+                                             pageSize=SNAPCOLL_PAGE_SIZE)
+                             for sched in view['protection_schedules'] if _replicated(sched)]
+                view['snapshot_collections'] = [snapcoll for future in snapcolls for snapcoll in future.result()]
+            return view
+
+        self.views, self.errors = fan_out(self.clients, load, self.max_workers)
+        return self.views
+
+    def report(self, now=None):
+        """Return the ReplicationLag of every replicated schedule, fetching the views first if needed"""
+
+        if not self.views:
+            self.fetch()
+        now = now if now is not None else time.time()
+
+        arrays_by_partner_name = {}
+        for name, view in self.views.items():
+            for group in view['groups']:
+                arrays_by_partner_name[group.get('name')] = name
+        for name, client in self.clients.items():
+            arrays_by_partner_name.setdefault(client._client.hostname, name)
+
+        # Downstream schedules by (volume collection name, schedule name), replicated volume collections keep their name
+        replicas = {}
+        for name, view in self.views.items():
+            names = {volcoll['id']: volcoll.get('name') for volcoll in view['volume_collections']}
+            replicas[name] = {(names.get(sched.get('volcoll_or_prottmpl_id')), sched.get('name')): sched
+                              for sched in view['protection_schedules'] if sched.get('upstream_partner_name')}
+
+        results = []
+        for name, view in self.views.items():
+            volcolls = {volcoll['id']: volcoll for volcoll in view['volume_collections']}
+            partners = {partner.get('name'): partner for partner in view['replication_partners']}
+            latest = self._latest_snapcolls(view['snapshot_collections'])
+
+            for sched in view['protection_schedules']:
+                if not _replicated(sched):
+                    continue
+                volcoll = volcolls.get(sched.get('volcoll_or_prottmpl_id'), {})
+                partner = partners.get(sched['downstream_partner_name'], {})
+                downstream = arrays_by_partner_name.get(sched['downstream_partner_name']) or arrays_by_partner_name.get(partner.get('hostname'))
+                results.append(self._lag(name, sched, volcoll, partner, downstream, replicas.get(downstream, {}), latest, now))
+        return results
+
+    @staticmethod
+    def _latest_snapcolls(snapcolls):
+        """{(volcoll_id, sched_id): (latest snapshot collection, latest completed replication)} of the upstream snapshot collections"""
+
+        latest = {}
+        for snapcoll in snapcolls:
+            if snapcoll.get('is_replica'):
+                continue
+            key = (snapcoll.get('volcoll_id'), snapcoll.get('sched_id'))
+            newest, completed = latest.get(key, (None, None))
+            if newest is None or (snapcoll.get('creation_time') or 0) > (newest.get('creation_time') or 0):
+                newest = snapcoll
+            if snapcoll.get('repl_complete_time') and (completed is None or snapcoll['repl_complete_time'] > completed['repl_complete_time']):
+                completed = snapcoll
+            latest[key] = (newest, completed)
+        return latest
+
+    def _lag(self, name, sched, volcoll, partner, downstream, downstream_scheds, latest, now):
+        newest, completed = latest.get((volcoll.get('id'), sched.get('id')), (None, None))
+        in_progress = newest is not None and newest.get('repl_start_time') and not newest.get('repl_complete_time')
+
+        bandwidth = None
+        # Start time of the last completed replication, arrays may not report it
+        start = completed.get('repl_start_time') if completed is not None else None
+        if in_progress and now > newest['repl_start_time']:
+            bandwidth = (newest.get('repl_bytes_transferred') or 0) / (now - newest['repl_start_time'])
+        elif start and completed['repl_complete_time'] > start:
+            bandwidth = (completed.get('repl_bytes_transferred') or 0) / (completed['repl_complete_time'] - start)
+        # Catch-up is projected at the achieved bandwidth, capped by the partner throttle (kbps, -1 when unthrottled)
+        projected = bandwidth
+        throttle = partner.get('throttled_bandwidth_current_kbps')
+        if throttle is not None and throttle >= 0:
+            projected = min(bandwidth, throttle * 125) if bandwidth else throttle * 125
+
+        remaining = None
+        if volcoll.get('total_repl_bytes') is not None:
+            remaining = max(volcoll['total_repl_bytes'] - (volcoll.get('repl_bytes_transferred') or 0), 0)
+        catch_up = remaining / projected if remaining is not None and projected else None
+
+        replica = downstream_scheds.get((volcoll.get('name'), sched.get('name')), {}).get('last_replicated_at_time')
+        last = sched.get('last_replicated_at_time') or replica
+
+        return ReplicationLag(
+            array=name, volcoll=volcoll.get('name'), schedule=sched.get('name'), partner=sched.get('downstream_partner_name'),
+            downstream_array=downstream, partner_alive=partner.get('is_alive'), lag=now - last if last else None,
+            alert_threshold=sched.get('repl_alert_thres'), next_replication=sched.get('next_repl_snap_time'),
+            in_progress=bool(in_progress), bandwidth=bandwidth, remaining_bytes=remaining, catch_up=catch_up,
+            downstream_last_replica=replica)
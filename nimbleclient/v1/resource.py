@@ -2,6 +2,13 @@
 #   © Copyright 2020 Hewlett Packard Enterprise Development LP
 #
 
+from concurrent.futures import ThreadPoolExecutor
+
+from .deadline import propagated
+from .exceptions import NimOSAPIError
+from .profiling import profiled
+from .watch import Watcher
+
 class Resource:
     __slots__ = ['id', 'attrs', 'collection', '_client']
 
@@ -37,9 +44,13 @@ class Resource:
 class Collection:
     __slots__ = ['resource', 'resource_type', '_client']
 
+    # Up to this many IDs, get_many() issues parallel per-ID GETs instead of a single detail listing
+    GET_MANY_THRESHOLD = 16
+
     def __init__(self, client=None):
         self._client = client
 
+    @profiled
     def get(self, id=None, **kwargs):
         if id is not None:
             obj = self._client.get_resource(self.resource_type, id)
@@ -52,17 +63,86 @@ class Collection:
             else:
                 return self.resource(objs[0]['id'] if 'id' in objs[0] else 0, objs[0], client=self._client, collection=self)
 
+    @profiled
+    def get_many(self, ids, fields=None, max_workers=8):
+        """
+        Batched lookup of several objects by ID.
+
+        Returns a (resources, missing) tuple: resources follows the order of ids, with None for every ID that does not exist,
+        and missing lists those IDs.
+
+        Parameters:
+        - ids         : IDs of the objects to fetch.
+        - fields      : Comma separated list of attributes to fetch (the id is always included).
+        - max_workers : Maximum number of concurrent GETs for small batches.
+        """
+
+        ids = list(ids)
+        params = {}
+        if fields is not None:
+            params['fields'] = fields if 'id' in fields.split(',') else f"id,{fields}"
+
+        unique_ids = list(dict.fromkeys(ids))
+        if len(unique_ids) <= self.GET_MANY_THRESHOLD:
+            def fetch(ident):
+                try:
+                    return self._client.get_resource(self.resource_type, ident, **params)
+                except NimOSAPIError as error:
+                    if 'SM_enoent' in str(error) or 'SM_http_not_found' in str(error):
+                        return None
+                    raise
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                found = dict(zip(unique_ids, executor.map(propagated(fetch), unique_ids)))
+        else:
+            wanted = set(unique_ids)
+            found = {obj['id']: obj for obj in self._client.list_resources(self.resource_type, detail=True, **params) if obj.get('id') in wanted}
+
+        resources = [self.resource(ident, found[ident], client=self._client, collection=self) if found.get(ident) else None for ident in ids]
+        missing = [ident for ident in unique_ids if not found.get(ident)]
+        return resources, missing
+
+    @profiled
     def create(self, name, **kwargs):
         resp = self._client.create_resource(self.resource_type, name=name, **kwargs)
         return self.resource(resp['id'], resp, client=self._client, collection=self)
 
+    @profiled
     def update(self, id, **kwargs):
         resp = self._client.update_resource(self.resource_type, id, **kwargs)
         return self.resource(resp['id'], resp, client=self._client, collection=self)
 
+    @profiled
     def delete(self, id):
         return self._client.delete_resource(self.resource_type, id)
 
+    @profiled
     def list(self, **kwargs):
         objs = self._client.list_resources(self.resource_type, **kwargs)
         return [self.resource(obj['id'] if 'id' in obj else index, obj, client=self._client, collection=self) for index, obj in enumerate(objs)]
+
+    @profiled
+    def iter_list(self, **kwargs):
+        """Generator variant of list(): objects are built as rows are parsed off the wire, one page at a time"""
+
+        for index, obj in enumerate(self._client.iter_resources(self.resource_type, **kwargs)):
+            yield self.resource(obj['id'] if 'id' in obj else index, obj, client=self._client, collection=self)
+
+    def watch(self, fields=None, interval=30, min_interval=None, max_interval=None, callback=None, initial=False):
+        """
+        Subscribe to added, modified and deleted objects of the collection.
+
+        Polls a projected listing of id, last_modified and fields, with one polling loop per collection and fields
+        shared by all subscribers. Returns a Subscription to iterate over (or close) which yields WatchEvents.
+
+        Parameters:
+        - fields       : Comma separated list of attributes whose changes are reported besides last_modified.
+        - interval     : Initial seconds between polls, adapted to how often changes happen.
+        - min_interval : Shortest interval while changes keep coming, interval / 4 by default.
+        - max_interval : Longest interval while nothing changes, interval * 4 by default.
+        - callback     : Callable invoked with each event from the polling thread instead of queueing it.
+        - initial      : Start with an added event for every existing object.
+        """
+
+        fields = fields.split(',') if fields else ['name']
+        return Watcher.shared(self._client, self.resource_type, fields, interval, min_interval, max_interval, callback, initial)
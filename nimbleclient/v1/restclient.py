@@ -3,19 +3,93 @@
 #
 
 import logging
+import os
+import threading
+import time
 import uuid
-import requests
 
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
-from .exceptions import NimOSAuthenticationError, NimOSAPIError
-
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+from .breaker import CircuitBreaker
+from .exceptions import NimOSAuthenticationError, NimOSAPIError, NimOSConnectionError, NimOSDeadlineExceeded
+from .transport import DEFAULT_TIMEOUT, RequestsTransport
+from .cassette import RecordingTransport
+from .jsonstream import iter_page
+from .paging import PageSizer
+from . import deadline, profiling, tracing
+from .tokencache import TokenCache
 
 class SessionManager:
     """Tracks current NimOS REST sessions in order to reuse them"""
 
     _SESSIONS = {}
 
+class _InFlightCall:
+    __slots__ = ['done', 'result', 'error', 'followers']
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+def _copy(value):
+    """Copy of a decoded JSON body, so callers sharing a response never see each other's changes"""
+
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+class RequestCoalescer:
+    """Single-flight de-duplication: concurrent identical calls share one execution and its result"""
+
+    # Seconds between two checks of the deadline of a waiting caller
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, remaining=None):
+        """
+        Run func for the first caller of key; concurrent callers with the same key wait for and share its outcome,
+        each getting its own copy of the result.
+
+        remaining: callable returning the seconds a waiting caller has left (None if unbounded), raising once its
+                   deadline has passed or it was cancelled.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _InFlightCall()
+            else:
+                call.followers += 1
+
+        if not leader:
+            if remaining is None:
+                call.done.wait()
+            else:
+                while not call.done.is_set():
+                    left = remaining()
+                    call.done.wait(self.POLL_INTERVAL if left is None else min(left, self.POLL_INTERVAL))
+            if call.error is not None:
+                raise call.error
+            return _copy(call.result)
+
+        try:
+            call.result = func()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        # Followers copy the result after the leader has returned, it must stay untouched
+        return _copy(call.result) if call.followers else call.result
+
 class NimOSAPIClient:
     """NimOS REST API Client session"""
 
@@ -68,13 +142,49 @@ class NimOSAPIClient:
         'network_configs' : 'v1/network_configs',
     }
 
-    def __init__(self, hostname, username, password, port=5392):
-        """Initialize a session to the NimOS REST API"""
+    # Identical GETs in flight at the same time share a single HTTP request (and decoded result).
+    _COALESCER = RequestCoalescer()
+
+    # Bytes read from the socket at a time by iter_get()
+    STREAM_CHUNK_SIZE = 65536
+
+    def __init__(self, hostname, username, password, port=5392, coalesce_gets=True, transport=None, record=None, token_cache=None,
+                 slow_call_threshold=tracing.DEFAULT_SLOW_CALL_THRESHOLD, circuit_breaker=False, call_timeout=None,
+                 adaptive_paging=False):
+        """Initialize a session to the NimOS REST API
+
+        record: path of a cassette file to record all request/response pairs into (see nimbleclient.v1.cassette)
+        token_cache: TokenCache, cache file path or True for the default path, to reuse session tokens across
+                     processes. Also enabled by the NIMBLE_SDK_TOKEN_CACHE environment variable (a path, or 1).
+        slow_call_threshold: seconds after which a call is logged as a warning with its correlation ID, pages, bytes
+                             and timings (10 by default, or NIMBLE_SDK_SLOW_CALL), None to disable.
+        circuit_breaker: True to share the CircuitBreaker of hostname:port with other clients of the array, or a
+                         CircuitBreaker instance. Off by default, as an open circuit fails calls without contacting
+                         the array and is probed with GETs of the versions endpoint.
+        call_timeout: seconds each call may take, pagination and session refreshes included (see also
+                      nimbleclient.v1.deadline.Deadline for budgets spanning several calls).
+        adaptive_paging: True to size the pages of get() listings with the PageSizer of hostname:port, shared with other
+                         clients of the array, or a PageSizer instance. Off by default, as it adds endRow to the
+                         requests once a window is learned; pages then follow the array default page size.
+        """
 
         connection_hash = str(uuid.uuid3(uuid.NAMESPACE_OID, f'{hostname}{port}{username}{password}'))
 
         self.hostname = hostname
         self.port = port
+        self.coalesce_gets = coalesce_gets
+        self.slow_call_threshold = slow_call_threshold
+        self.call_timeout = call_timeout
+        self.transport = transport if transport is not None else RequestsTransport()
+        if record is not None:
+            self.transport = RecordingTransport(self.transport, record)
+        self._base_url = f"{self.transport.scheme}://{hostname}:{port}"
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker.for_array(hostname, port)
+        self.breaker = circuit_breaker or None
+        if adaptive_paging is True:
+            adaptive_paging = PageSizer.for_array(hostname, port)
+        self.page_sizer = adaptive_paging or None
 
         self.__auth = {
             'data': {
@@ -86,6 +196,21 @@ class NimOSAPIClient:
 
         self.__connection_hash = connection_hash
 
+        if token_cache is None:
+            token_cache = os.environ.get('NIMBLE_SDK_TOKEN_CACHE') or None
+            if token_cache in ('1', 'true'):
+                token_cache = True
+        if token_cache is True:
+            token_cache = TokenCache()
+        elif isinstance(token_cache, str):
+            token_cache = TokenCache(token_cache)
+        self.token_cache = token_cache
+
+        if connection_hash not in SessionManager._SESSIONS and self.token_cache:
+            cached = self.token_cache.get(connection_hash)
+            if cached is not None:
+                SessionManager._SESSIONS[connection_hash] = cached
+
         if connection_hash in SessionManager._SESSIONS:
             self.session_id, self.session_token = SessionManager._SESSIONS[connection_hash]
             self.connected = True
@@ -97,15 +222,87 @@ class NimOSAPIClient:
             self.session_id = None
             self.connected = self._connect()
 
+    def _url(self, endpoint):
+        return f"{self._base_url}/{endpoint}"
+
+    def _remaining(self):
+        """Seconds left for the current call (None if unbounded), raises once its deadline has passed or it was cancelled"""
+
+        active = deadline.current()
+        remaining = active.remaining() if active is not None else None
+
+        trace = tracing.current()
+        if self.call_timeout is not None and trace is not None:
+            left = self.call_timeout - (time.perf_counter() - trace.started)
+            if left <= 0:
+                raise NimOSDeadlineExceeded(f"{trace.method} {trace.endpoint} exceeded its {self.call_timeout}s deadline")
+            remaining = left if remaining is None else min(remaining, left)
+        return remaining
+
+    def _request(self, method, url, **kwargs):
+        """Send a request through the transport, unless the circuit breaker of the array is open or the call is out of time"""
+
+        remaining = self._remaining()
+        if remaining is not None:
+            connect, read = getattr(self.transport, 'timeout', DEFAULT_TIMEOUT)
+            kwargs['timeout'] = (min(connect or remaining, remaining), min(read or remaining, remaining))
+
+        breaker = self.breaker
+        if breaker is not None:
+            probe = {'timeout': kwargs['timeout']} if 'timeout' in kwargs else {}
+            breaker.check(lambda: self.transport.request('GET', self._url(self._ENDPOINTS['versions']), **probe).close())
+        try:
+            response = self.transport.request(method, url, **kwargs)
+        except NimOSConnectionError as error:
+            if remaining is not None:
+                # A request timing out with the call does not count against the array
+                self._remaining()
+            if breaker is not None:
+                breaker.failure(error)
+            raise
+        if breaker is not None:
+            breaker.success()
+        return response
+
+    def _send(self, method, url, params=None, json=None, stream=False):
+        """Send a request through the transport, re-authenticating when the session has expired"""
+
+        trace = tracing.current()
+        while 1:
+            headers = self._headers if trace is None else {**self._headers, tracing.CORRELATION_HEADER: trace.correlation_id}
+            profiler = profiling._active
+            if profiler is None and trace is None:
+                response = self._request(method, url, params=params, json=json, headers=headers, stream=stream)
+            else:
+                started = time.perf_counter()
+                response = self._request(method, url, params=params, json=json, headers=headers, stream=stream)
+                elapsed = time.perf_counter() - started
+                if profiler is not None:
+                    profiler.add_network(elapsed)
+                if trace is not None:
+                    trace.network += elapsed
+                    trace.requests += 1
+                    if not stream:
+                        trace.bytes += len(response.content)
+
+            if response.status_code >= 400:
+                if 'SM_http_unauthorized' in str(response.content):
+                    if trace is not None:
+                        trace.reauth += 1
+                    self._refresh_connection()
+                else:
+                    raise NimOSAPIError(response.json())
+            else:
+                if trace is not None and method == 'GET':
+                    trace.pages += 1
+                return response
+
     def _connect(self):
         """Perform NimOS authentication and session token retrieval"""
 
         try:
-            response = requests.post(
-                f"https://{self.hostname}:{self.port}/{self._ENDPOINTS['tokens']}",
-                json=self.__auth,
-                verify=False
-            )
+            # Logins and session checks carry the correlation ID of the call that needed them
+            response = self._request('POST', self._url(self._ENDPOINTS['tokens']), json=self.__auth, headers=tracing.with_correlation_id({}))
 
             sessiondata = response.json()
 
@@ -124,10 +321,12 @@ class NimOSAPIClient:
             self._headers = {'X-Auth-Token': str(self.session_token)}
 
             SessionManager._SESSIONS[self.__connection_hash] = (self.session_id, self.session_token)
+            if self.token_cache:
+                self.token_cache.put(self.__connection_hash, self.session_id, self.session_token, sessiondata.get('expiry_time'))
 
             return True
 
-        except requests.ConnectionError as error:
+        except NimOSConnectionError as error:
             logging.exception(error)
             raise ConnectionError(f"Error connecting to {self.hostname}")
 
@@ -135,16 +334,16 @@ class NimOSAPIClient:
         """Checks status of NimOS session and reconnects if necessary"""
 
         try:
-            response = requests.get(
-                f"https://{self.hostname}:{self.port}/{self._ENDPOINTS['tokens']}/{self.session_id}",
-                headers=self._headers,
-                verify=False
+            response = self._request(
+                'GET',
+                self._url(f"{self._ENDPOINTS['tokens']}/{self.session_id}"),
+                headers=tracing.with_correlation_id(self._headers)
             ).json()
 
             if 'messages' in response and response['messages'][0]['severity'] == 'error':
                 self._connect()
 
-        except requests.ConnectionError as error:
+        except NimOSConnectionError as error:
             logging.exception(error)
             raise ConnectionError(f"Error reconnecting to {self.hostname}")
 
@@ -152,58 +351,61 @@ class NimOSAPIClient:
         """Closes NimOS session (deletes user token)"""
 
         try:
-            requests.delete(
-                f"https://{self.hostname}:{self.port}/{self._ENDPOINTS['tokens']}/{self.session_id}",
-                headers=self._headers,
-                verify=False
+            self._request(
+                'DELETE',
+                self._url(f"{self._ENDPOINTS['tokens']}/{self.session_id}"),
+                headers=self._headers
             )
 
             del SessionManager._SESSIONS[self.__connection_hash]
+            if self.token_cache:
+                self.token_cache.delete(self.__connection_hash)
 
-        except requests.exceptions.RequestException as error:
+        except NimOSConnectionError as error:
             logging.exception(error)
             raise ConnectionError("Error closing connection")
 
+    @profiling.profiled_request
+    @tracing.traced
     def get(self, endpoint, **params):
         """Wrapper for GET requests"""
 
-        url=f'https://{self.hostname}:{self.port}/{endpoint}'
+        if not self.coalesce_gets:
+            return self._get(endpoint, **params)
+
+        key = (self.__connection_hash, endpoint, repr(sorted(params.items())))
+        remaining = self._remaining if self.call_timeout is not None or deadline.current() is not None else None
+        return self._COALESCER.do(key, lambda: self._get(endpoint, **params), remaining)
+
+    def _get(self, endpoint, **params):
+        url = self._url(endpoint)
+        # Windows are only chosen for listings the caller did not bound to a page
+        sizer = self.page_sizer if 'pageSize' not in params and 'endRow' not in params else None
+        key = f"{endpoint}?fields={params['fields']}" if 'fields' in params else endpoint
         try:
-            while 1:
-                response = requests.get(
-                    url,
-                    params=params,
-                    headers=self._headers,
-                    verify=False
-                )
-
-                if response.status_code >= 400:
-                    if 'SM_http_unauthorized' in str(response.content):
-                        self._refresh_connection()
-                    else:
-                        print("URL: ", url)
-                        raise NimOSAPIError(response.json())
-                else:
-                    break
+            window = sizer.rows(key) if sizer is not None else None
+            first = params if window is None else {**params, 'endRow': params.get('startRow', 0) + window}
+            started = time.perf_counter()
+            response = self._send('GET', url, params=first)
+            body = response.json()
 
             # Check for errors if any in the response (Treat partial response as an error)
-            if 'messages' in response.json():
-                raise NimOSAPIError(response.json()['messages'])
+            if 'messages' in body:
+                raise NimOSAPIError(body['messages'])
 
             # Retrieves as per 'rest_api_row_limit' configuration on array
             if 'pageSize' in params:
-                return response.json()
+                return body
 
-            if 'totalRows' not in response.json():
-                return response.json()
+            if 'totalRows' not in body:
+                return body
 
             # If startRow and/or endRow is specified, then retrieve records accordingly.
             # If unspecified, then retrieves all the available records.
             paginated_data = list()
-            paginated_data.extend(response.json()["data"])
-            total_rows = response.json()['totalRows']
+            paginated_data.extend(body["data"])
+            total_rows = body['totalRows']
             retrieved_rows = len(paginated_data)
-            #current_end_row = response.json()['endRow']
 
             if 'startRow' in params and 'endRow' in params:
                 requested_rows = params['endRow'] - params['startRow']
@@ -214,106 +416,137 @@ class NimOSAPIClient:
                     requested_rows = total_rows - params['startRow']
                 else:
                     requested_rows = params['endRow']
-            #print("Total records requested:", requested_rows, ", Retrieved records:", retrieved_rows)
 
             pending_rows = requested_rows-retrieved_rows
+            if sizer is not None:
+                sizer.observe(key, window, retrieved_rows, time.perf_counter() - started, len(response.content), pending_rows > 0)
             params.clear()
             while pending_rows > 0:
-                params['startRow'] = response.json()['endRow']
-                #print("Retrieved:", retrieved_rows, "Pending:", pending_rows, "Next startRow:", params['startRow'])
-                response = requests.get(
-                    url,
-                    params=params,
-                    headers=self._headers,
-                    verify=False,
-                )
-                records = response.json()["data"][:pending_rows]
+                params['startRow'] = body['endRow']
+                window = sizer.rows(key) if sizer is not None else None
+                if window is not None:
+                    window = min(window, pending_rows)
+                    params['endRow'] = params['startRow'] + window
+                started = time.perf_counter()
+                response = self._send('GET', url, params=params)
+                body = response.json()
+                records = body["data"][:pending_rows]
                 records_count = len(records)
+                if records_count == 0:
+                    # Rows were deleted while paging, do not ask for the same empty page forever
+                    break
                 paginated_data.extend(records)
                 pending_rows -= records_count
                 retrieved_rows += records_count
+                if sizer is not None:
+                    sizer.observe(key, window, records_count, time.perf_counter() - started, len(response.content), pending_rows > 0)
                 # TODO: Handle change in the total no. of rows during this large operation
 
             return paginated_data
 
-        except requests.exceptions.RequestException as error:
+        except NimOSConnectionError as error:
             logging.exception(error)
             raise ConnectionError(f"Error communicating with {self.hostname}")
 
-    def delete(self, endpoint):
-        """Wrapper for DELETE requests"""
+    @profiling.profiled_request
+    @tracing.traced
+    def iter_get(self, endpoint, **params):
+        """Generator variant of get() for listings: each page is parsed incrementally and its rows are yielded one by one
+
+        Memory use is bounded by a single row instead of a page. Errors reported in the body of a page are raised
+        once that page has been consumed.
+        """
 
+        url = self._url(endpoint)
+        pending_rows = None # Unknown until the first page has been parsed
         try:
-            while 1:
-                response = requests.delete(
-                    f'https://{self.hostname}:{self.port}/{endpoint}',
-                    headers=self._headers,
-                    verify=False
-                )
-
-                if response.status_code >= 400:
-                    if 'SM_http_unauthorized' in str(response.content):
-                        self._refresh_connection()
+            while True:
+                response = self._send('GET', url, params=params, stream=True)
+                meta = {}
+                page_rows = 0
+                chunks = response.iter_content(self.STREAM_CHUNK_SIZE)
+                trace = tracing.current()
+                if trace is not None:
+                    chunks = tracing.counted(trace, chunks)
+                if self.call_timeout is not None or deadline.current() is not None:
+                    chunks = deadline.guarded(chunks, self._remaining)
+                if profiling._active is not None:
+                    chunks = profiling._active.timed(iter(chunks))
+                try:
+                    for row in iter_page(chunks, meta):
+                        if pending_rows is not None:
+                            if pending_rows <= 0:
+                                break
+                            pending_rows -= 1
+                        page_rows += 1
+                        yield row
+                finally:
+                    response.close()
+
+                if 'messages' in meta:
+                    raise NimOSAPIError(meta['messages'])
+
+                if 'data' in meta:
+                    yield meta['data']
+                    return
+
+                if pending_rows is None:
+                    if 'pageSize' in params or 'totalRows' not in meta:
+                        return
+
+                    total_rows = meta['totalRows']
+                    if 'startRow' in params and 'endRow' in params:
+                        requested_rows = params['endRow'] - params['startRow']
+                    elif 'startRow' not in params and 'endRow' not in params:
+                        requested_rows = total_rows
+                    elif 'startRow' in params:
+                        requested_rows = total_rows - params['startRow']
                     else:
-                        raise NimOSAPIError(response.json())
-                else:
-                    break
+                        requested_rows = params['endRow']
+                    pending_rows = requested_rows - page_rows
+                    params = {}
+
+                if pending_rows <= 0 or page_rows == 0:
+                    return
+                params['startRow'] = meta['endRow']
+
+        except NimOSConnectionError as error:
+            logging.exception(error)
+            raise ConnectionError(f"Error communicating with {self.hostname}")
+
+    @profiling.profiled_request
+    @tracing.traced
+    def delete(self, endpoint):
+        """Wrapper for DELETE requests"""
 
-            return response.json()
+        try:
+            return self._send('DELETE', self._url(endpoint)).json()
 
-        except requests.exceptions.RequestException as error:
+        except NimOSConnectionError as error:
             logging.exception(error)
             raise ConnectionError(f"Error communicating with {self.hostname}")
 
+    @profiling.profiled_request
+    @tracing.traced
     def put(self, endpoint, **payload):
         """Wrapper for PUT requests"""
 
         try:
-            while 1:
-                response = requests.put(
-                    f'https://{self.hostname}:{self.port}/{endpoint}',
-                    headers=self._headers,
-                    json={'data': payload},
-                    verify=False
-                )
-
-                if response.status_code >= 400:
-                    if 'SM_http_unauthorized' in str(response.content):
-                        self._refresh_connection()
-                    else:
-                        raise NimOSAPIError(response.json())
-                else:
-                    break
+            return self._send('PUT', self._url(endpoint), json={'data': payload}).json()
 
-            return response.json()
-
-        except requests.exceptions.RequestException as error:
+        except NimOSConnectionError as error:
             logging.exception(error)
             raise ConnectionError(f"Error communicating with {self.hostname}")
 
+    @profiling.profiled_request
+    @tracing.traced
     def post(self, endpoint, **payload):
         """Wrapper for POST requests"""
 
         try:
-            while 1:
-                response = requests.post(
-                    f'https://{self.hostname}:{self.port}/{endpoint}',
-                    headers=self._headers,
-                    json={'data': payload},
-                    verify=False
-                )
-
-                if response.status_code >= 400:
-                    if 'SM_http_unauthorized' in str(response.content):
-                        self._refresh_connection()
-                    else:
-                        raise NimOSAPIError(response.json())
-                else:
-                    break
+            return self._send('POST', self._url(endpoint), json={'data': payload}).json()
 
-            return response.json()
-
-        except requests.exceptions.RequestException as error:
+        except NimOSConnectionError as error:
             logging.exception(error)
             raise ConnectionError(f"Error communicating with {self.hostname}")
 
@@ -331,6 +564,12 @@ class NimOSAPIClient:
         resp = self.get(f"{self._ENDPOINTS[resource]}{'/detail' if detail else ''}", **params)
         return resp['data'] if 'data' in resp else resp
 
+    def iter_resources(self, resource, detail=False, **params):
+        if resource not in self._ENDPOINTS:
+            raise ValueError(f"Unknown resource {resource}")
+
+        return self.iter_get(f"{self._ENDPOINTS[resource]}{'/detail' if detail else ''}", **params)
+
     def create_resource(self, resource, **params):
         if resource not in self._ENDPOINTS:
             raise ValueError(f"Unknown resource {resource}")
@@ -0,0 +1,174 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .deadline import propagated
+from .exceptions import NimOSAPIError
+
+VOLUME = 'volumes'
+SNAPSHOT = 'snapshots'
+ACCESS_CONTROL_RECORD = 'access_control_records'
+INITIATOR_GROUP = 'initiator_groups'
+
+_FIELDS = {
+    VOLUME: 'id,name,parent_vol_id,base_snap_id,clone,online',
+    SNAPSHOT: 'id,name,vol_id',
+    ACCESS_CONTROL_RECORD: 'id,vol_id,snap_id,initiator_group_id,apply_to',
+    INITIATOR_GROUP: 'id,name',
+}
+
+class DependencyGraph:
+    """
+    In-memory graph of volumes, snapshots, access control records and initiator groups, loaded with a few bulk list calls.
+
+    Nodes are (resource_type, id) tuples. An edge from A to B means A depends on B, so A has to be deleted before B.
+
+    Parameters:
+    - client : nimbleclient.v1.Client connected to the array.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.nodes = {}
+        self.depends_on = {}
+        self.dependents = {}
+
+    @classmethod
+    def load(cls, client, max_workers=4):
+        """Build the graph from one projected listing per resource type"""
+
+        graph = cls(client)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            listings = dict(zip(_FIELDS, executor.map(propagated(graph._list), _FIELDS)))
+
+        if listings[SNAPSHOT] is None:
+            # Arrays that require a volume filter for snapshot listings
+            vol_ids = [attrs['id'] for attrs in listings[VOLUME]]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                per_volume = executor.map(propagated(lambda vol_id: graph._list(SNAPSHOT, vol_id=vol_id, strict=True)), vol_ids)
+                listings[SNAPSHOT] = [attrs for snaps in per_volume for attrs in snaps]
+
+        for resource_type, rows in listings.items():
+            for attrs in rows:
+                graph.add(resource_type, attrs)
+
+        for attrs in listings[VOLUME]:
+            graph.link((VOLUME, attrs['id']), (SNAPSHOT, attrs.get('base_snap_id')))
+            graph.link((VOLUME, attrs['id']), (VOLUME, attrs.get('parent_vol_id')))
+        for attrs in listings[SNAPSHOT]:
+            graph.link((SNAPSHOT, attrs['id']), (VOLUME, attrs.get('vol_id')))
+        for attrs in listings[ACCESS_CONTROL_RECORD]:
+            node = (ACCESS_CONTROL_RECORD, attrs['id'])
+            graph.link(node, (VOLUME, attrs.get('vol_id')))
+            graph.link(node, (SNAPSHOT, attrs.get('snap_id')))
+            graph.link(node, (INITIATOR_GROUP, attrs.get('initiator_group_id')))
+
+        return graph
+
+    def _list(self, resource_type, strict=False, **params):
+        try:
+            return [obj.attrs for obj in getattr(self.client, resource_type).list(detail=True, fields=_FIELDS[resource_type], **params)]
+        except NimOSAPIError:
+            if strict or resource_type != SNAPSHOT:
+                raise
+            return None
+
+    def add(self, resource_type, attrs):
+        node = (resource_type, attrs['id'])
+        self.nodes[node] = attrs
+        self.depends_on.setdefault(node, set())
+        self.dependents.setdefault(node, set())
+
+    def link(self, node, target):
+        """Record that node depends on target, ignoring references to unknown objects"""
+
+        if not target[1] or target not in self.nodes:
+            return
+        self.depends_on[node].add(target)
+        self.dependents[target].add(node)
+
+    def teardown_plan(self, vol_ids, include_initiator_groups=False):
+        """
+        Compute the ordered plan to delete volumes together with everything depending on them.
+
+        Parameters:
+        - vol_ids                  : IDs of the volumes to tear down.
+        - include_initiator_groups : Also delete initiator groups left without any access control record.
+        """
+
+        doomed = set()
+        pending = [(VOLUME, vol_id) for vol_id in vol_ids]
+        while pending:
+            node = pending.pop()
+            if node in doomed:
+                continue
+            if node not in self.nodes:
+                raise ValueError(f"Unknown {node[0]} {node[1]}")
+            doomed.add(node)
+            pending.extend(self.dependents[node])
+
+        if include_initiator_groups:
+            for node in list(doomed):
+                for target in self.depends_on[node]:
+                    if target[0] == INITIATOR_GROUP and self.dependents[target] <= doomed:
+                        doomed.add(target)
+
+        # Kahn's algorithm: a level holds the nodes whose dependents are all in earlier levels
+        remaining = {node: len(self.dependents[node] & doomed) for node in doomed}
+        level = [node for node, count in remaining.items() if count == 0]
+        levels = []
+        while level:
+            levels.append(sorted(level))
+            following = []
+            for node in level:
+                for target in self.depends_on[node] & doomed:
+                    remaining[target] -= 1
+                    if remaining[target] == 0:
+                        following.append(target)
+            level = following
+
+        if sum(len(level) for level in levels) != len(doomed):
+            raise ValueError("Dependency cycle detected")
+
+        return TeardownPlan(self.client, levels)
+
+class TeardownPlan:
+    """Levels of objects to delete; each level is deleted in parallel once the previous level is gone"""
+
+    def __init__(self, client, levels):
+        self.client = client
+        self.levels = levels
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
+
+    def __iter__(self):
+        return iter(self.levels)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(levels={len(self.levels)}, objects={len(self)})>"
+
+    def execute(self, max_workers=16):
+        """Delete level by level; stops at the first level with failures and returns {node: error}"""
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for level in self.levels:
+                errors = {node: error for node, error in zip(level, executor.map(propagated(self._delete), level)) if error is not None}
+                if errors:
+                    return errors
+        return {}
+
+    def _delete(self, node):
+        resource_type, ident = node
+        collection = getattr(self.client, resource_type)
+        try:
+            if resource_type == VOLUME:
+                collection.offline(ident)
+            collection.delete(ident)
+        except (NimOSAPIError, ConnectionError) as error:
+            logging.warning(f"Unable to delete {resource_type} {ident}: {error}")
+            return error
+        return None
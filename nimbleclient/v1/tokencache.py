@@ -0,0 +1,51 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import os
+import time
+
+from .filestore import CACHE_DIR, locked, read_json, write_json
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, 'tokens.json')
+
+class TokenCache:
+    """
+    On-disk cache of NimOS session tokens shared by all processes of the same user.
+
+    Entries are keyed by the client connection hash (hostname, port and credentials), so short-lived processes reuse
+    the session of a previous run until its expiry_time instead of authenticating again. The cache file is only
+    readable by its owner and every access holds an exclusive lock on a companion .lock file. Cached tokens are not
+    checked upfront: a token the array has already dropped is replaced on its first unauthorized response.
+
+    Parameters:
+    - path : Cache file location, ~/.nimble/tokens.json by default.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEFAULT_PATH
+
+    def get(self, key):
+        """Return (session_id, session_token) cached for key, or None if absent or expired"""
+
+        with locked(self.path):
+            entry = read_json(self.path, {}).get(key)
+
+        if entry is None:
+            return None
+        if entry.get('expiry_time') and entry['expiry_time'] <= time.time():
+            return None
+        return entry['id'], entry['session_token']
+
+    def put(self, key, session_id, session_token, expiry_time=None):
+        with locked(self.path):
+            now = time.time()
+            entries = {name: entry for name, entry in read_json(self.path, {}).items() if not entry.get('expiry_time') or entry['expiry_time'] > now}
+            entries[key] = {'id': session_id, 'session_token': session_token, 'expiry_time': expiry_time}
+            write_json(self.path, entries)
+
+    def delete(self, key):
+        with locked(self.path):
+            entries = read_json(self.path, {})
+            if entries.pop(key, None) is not None:
+                write_json(self.path, entries)
@@ -0,0 +1,139 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+import types
+import uuid
+from contextlib import contextmanager
+
+# Header carrying the correlation ID of the SDK call a request belongs to
+CORRELATION_HEADER = 'X-Correlation-ID'
+
+# Seconds after which a call is logged as slow, None disables slow call logging
+DEFAULT_SLOW_CALL_THRESHOLD = float(os.environ['NIMBLE_SDK_SLOW_CALL']) if os.environ.get('NIMBLE_SDK_SLOW_CALL') else 10.0
+
+_correlation_id = contextvars.ContextVar('nimble_correlation_id', default=None)
+_current = contextvars.ContextVar('nimble_call', default=None)
+
+@contextmanager
+def correlation_id(value=None):
+    """Make the SDK calls of the block use one correlation ID (generated if not given), yields the ID"""
+
+    value = value or uuid.uuid4().hex
+    token = _correlation_id.set(value)
+    try:
+        yield value
+    finally:
+        _correlation_id.reset(token)
+
+def current():
+    """CallTrace of the SDK call running in this context, or None"""
+
+    return _current.get()
+
+def with_correlation_id(headers):
+    """headers plus the correlation ID of the current SDK call, or of the enclosing correlation_id() block, if any"""
+
+    trace = _current.get()
+    value = trace.correlation_id if trace is not None else _correlation_id.get()
+    return headers if value is None else {**headers, CORRELATION_HEADER: value}
+
+class CallTrace:
+    """Requests, pages, bytes and timings of one SDK call"""
+
+    __slots__ = ['correlation_id', 'method', 'endpoint', 'params', 'started', 'elapsed', 'requests', 'pages', 'bytes', 'network', 'reauth', 'error']
+
+    def __init__(self, method, endpoint, params):
+        self.correlation_id = _correlation_id.get() or uuid.uuid4().hex[:16]
+        self.method = method
+        self.endpoint = endpoint
+        self.params = params
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.requests = 0
+        self.pages = 0
+        self.bytes = 0
+        self.network = 0.0
+        self.reauth = 0
+        self.error = None
+
+    def as_dict(self):
+        return {
+            'correlation_id': self.correlation_id,
+            'method': self.method,
+            'endpoint': self.endpoint,
+            'params': self.params,
+            'requests': self.requests,
+            'pages': self.pages,
+            'bytes': self.bytes,
+            'elapsed': round(self.elapsed, 6),
+            'network': round(self.network, 6),
+            'internal': round(self.elapsed - self.network, 6),
+            'reauth': self.reauth,
+            'error': str(self.error) if self.error is not None else None,
+        }
+
+    def __str__(self):
+        return json.dumps(self.as_dict(), default=str)
+
+def counted(trace, chunks):
+    """Add the size of the chunks of a streamed response body to trace"""
+
+    for chunk in chunks:
+        trace.bytes += len(chunk)
+        yield chunk
+
+def _finish(client, trace):
+    trace.elapsed = time.perf_counter() - trace.started
+    threshold = client.slow_call_threshold
+    if threshold is not None and trace.elapsed >= threshold:
+        # The trace is only formatted if a handler emits the record
+        logging.warning("Slow NimOS call: %s", trace, extra={'nimble_call': trace})
+    elif trace.error is not None and logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("NimOS call failed: %s", trace, extra={'nimble_call': trace})
+
+def _iterate(client, trace, iterator):
+    while True:
+        token = _current.set(trace)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            _finish(client, trace)
+            return
+        except Exception as error:
+            trace.error = error
+            _finish(client, trace)
+            raise
+        finally:
+            _current.reset(token)
+        yield item
+
+def traced(func):
+    """Run a NimOSAPIClient request method as one traced call, unless it is part of a call already"""
+
+    @functools.wraps(func)
+    def wrapper(self, endpoint, *args, **params):
+        if _current.get() is not None:
+            return func(self, endpoint, *args, **params)
+
+        trace = CallTrace(func.__name__.replace('iter_', '').upper(), endpoint, dict(params))
+        token = _current.set(trace)
+        try:
+            result = func(self, endpoint, *args, **params)
+        except Exception as error:
+            trace.error = error
+            _finish(self, trace)
+            raise
+        finally:
+            _current.reset(token)
+        if isinstance(result, types.GeneratorType):
+            return _iterate(self, trace, result)
+        _finish(self, trace)
+        return result
+    return wrapper
@@ -0,0 +1,267 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import http.client
+import json
+import ssl
+import threading
+from urllib.parse import urlencode, urlsplit
+
+from .exceptions import NimOSConnectionError
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+_decode = json.loads
+
+# (connect, read) timeouts in seconds, None waits forever
+DEFAULT_TIMEOUT = (10, 300)
+
+class Transport:
+    """
+    HTTP layer underneath NimOSAPIClient.
+
+    A transport sends one request and returns a response object exposing status_code, headers, content, json(),
+    iter_content(chunk_size) and close(). With stream=True the body is not read upfront, so iter_content() can consume
+    it chunk by chunk; the caller then has to close() the response. Network failures are raised as NimOSConnectionError.
+    A (connect, read) timeout is only passed for calls with a deadline and overrides the transport's own.
+    """
+
+    scheme = 'https'
+    timeout = DEFAULT_TIMEOUT
+
+    def request(self, method, url, params=None, json=None, headers=None, stream=False, timeout=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class RequestsTransport(Transport):
+    """
+    Default transport based on the requests module, with pooled keep-alive connections.
+
+    Parameters:
+    - verify        : Verify the array's TLS certificate.
+    - scheme        : URL scheme, 'https' for an array.
+    - pool_maxsize  : Maximum number of pooled connections to the array.
+    - timeout       : (connect, read) timeouts in seconds.
+    """
+
+    def __init__(self, verify=False, scheme='https', pool_maxsize=32, timeout=DEFAULT_TIMEOUT):
+        # Imported here so that programs using another transport do not pay for importing requests
+        import requests
+        from requests.packages.urllib3.exceptions import InsecureRequestWarning
+
+        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+        self._requests = requests
+        self.verify = verify
+        self.scheme = scheme
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self._session.mount(f"{scheme}://", adapter)
+
+    def request(self, method, url, params=None, json=None, headers=None, stream=False, timeout=None):
+        try:
+            return self._session.request(method, url, params=params, json=json, headers=headers, verify=self.verify, stream=stream,
+                                         timeout=timeout or self.timeout)
+        except self._requests.exceptions.RequestException as error:
+            raise NimOSConnectionError(str(error)) from error
+
+    def close(self):
+        self._session.close()
+
+class HTTPClientTransport(Transport):
+    """
+    Lightweight transport built on the standard library http.client, with one keep-alive connection per thread.
+
+    It avoids importing requests, which makes it the transport of choice for short-lived programs such as the CLI.
+
+    Parameters:
+    - verify  : Verify the array's TLS certificate.
+    - scheme  : URL scheme, 'https' for an array.
+    - timeout : (connect, read) timeouts in seconds.
+    """
+
+    def __init__(self, verify=False, scheme='https', timeout=DEFAULT_TIMEOUT):
+        self.scheme = scheme
+        self.timeout = timeout
+        self._context = ssl.create_default_context() if verify else ssl._create_unverified_context()
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self, netloc):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if netloc not in connections:
+            if self.scheme == 'https':
+                connection = http.client.HTTPSConnection(netloc, context=self._context, timeout=self.timeout[0])
+            else:
+                connection = http.client.HTTPConnection(netloc, timeout=self.timeout[0])
+            connections[netloc] = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connections[netloc]
+
+    def _discard(self, netloc):
+        connection = self._local.connections.pop(netloc, None)
+        if connection is not None:
+            connection.close()
+
+    def request(self, method, url, params=None, json=None, headers=None, stream=False, timeout=None):
+        connect_timeout, read_timeout = timeout or self.timeout
+        parts = urlsplit(url)
+        target = parts.path
+        if params:
+            target = f"{target}?{urlencode(params, doseq=True)}"
+        headers = dict(headers or {})
+        body = None
+        if json is not None:
+            body = _encode(json).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+
+        for attempt in (1, 2):
+            connection = self._connection(parts.netloc)
+            try:
+                if connection.sock is None:
+                    # Connect with the connect timeout, then wait for responses with the read timeout
+                    connection.timeout = connect_timeout
+                    connection.connect()
+                connection.sock.settimeout(read_timeout)
+                connection.request(method, target, body=body, headers=headers)
+                response = connection.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as error:
+                # The array closed an idle keep-alive connection, retry once on a fresh one
+                self._discard(parts.netloc)
+                if attempt == 2:
+                    raise NimOSConnectionError(str(error)) from error
+            except (OSError, http.client.HTTPException) as error:
+                self._discard(parts.netloc)
+                raise NimOSConnectionError(str(error)) from error
+
+        result = _HTTPClientResponse(response, lambda: self._discard(parts.netloc))
+        if not stream:
+            result.content
+        return result
+
+    def close(self):
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+class _HTTPClientResponse:
+    __slots__ = ['status_code', 'headers', '_response', '_content', '_discard']
+
+    def __init__(self, response, discard):
+        self.status_code = response.status
+        self.headers = response.headers
+        self._response = response
+        self._content = None
+        self._discard = discard
+
+    @property
+    def content(self):
+        if self._content is None:
+            try:
+                self._content = self._response.read()
+            except (OSError, http.client.HTTPException) as error:
+                self._discard()
+                raise NimOSConnectionError(str(error)) from error
+        return self._content
+
+    def json(self):
+        return _decode(self.content)
+
+    def iter_content(self, chunk_size=65536):
+        if self._content is not None:
+            for offset in range(0, len(self._content), chunk_size):
+                yield self._content[offset:offset + chunk_size]
+            return
+        try:
+            while True:
+                chunk = self._response.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        except (OSError, http.client.HTTPException) as error:
+            self._discard()
+            raise NimOSConnectionError(str(error)) from error
+
+    def close(self):
+        # A partially read body leaves the connection unusable
+        if not self._response.isclosed():
+            self._discard()
+
+class HTTPXTransport(Transport):
+    """
+    Optional HTTP/2-capable transport based on httpx (pip install httpx[http2]).
+
+    With HTTP/2, concurrent calls from many threads are multiplexed over a single connection to the array.
+
+    Parameters:
+    - http2           : Negotiate HTTP/2 (requires the h2 package).
+    - verify          : Verify the array's TLS certificate.
+    - scheme          : URL scheme, 'https' for an array.
+    - max_connections : Maximum number of connections to the array.
+    - timeout         : (connect, read) timeouts in seconds.
+    """
+
+    def __init__(self, http2=True, verify=False, scheme='https', max_connections=8, timeout=DEFAULT_TIMEOUT):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError("HTTPXTransport requires httpx, install it with 'pip install httpx[http2]'")
+
+        self.scheme = scheme
+        self.timeout = timeout
+        self._httpx = httpx
+        self._client = httpx.Client(http2=http2, verify=verify, timeout=httpx.Timeout(timeout[1], connect=timeout[0]),
+                                    limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections))
+
+    def request(self, method, url, params=None, json=None, headers=None, stream=False, timeout=None):
+        try:
+            extra = {'timeout': self._httpx.Timeout(timeout[1], connect=timeout[0])} if timeout else {}
+            request = self._client.build_request(method, url, params=params, json=json, headers=headers, **extra)
+            return _HTTPXResponse(self._client.send(request, stream=stream), self._httpx)
+        except self._httpx.HTTPError as error:
+            raise NimOSConnectionError(str(error)) from error
+
+    def close(self):
+        self._client.close()
+
+class _HTTPXResponse:
+    """Adapts an httpx response to the requests-style interface expected from transports"""
+
+    __slots__ = ['_response', '_httpx']
+
+    def __init__(self, response, httpx):
+        self._response = response
+        self._httpx = httpx
+
+    @property
+    def status_code(self):
+        return self._response.status_code
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    @property
+    def content(self):
+        return self._response.read()
+
+    def json(self):
+        self._response.read()
+        return self._response.json()
+
+    def iter_content(self, chunk_size=None):
+        try:
+            yield from self._response.iter_bytes(chunk_size)
+        except self._httpx.HTTPError as error:
+            raise NimOSConnectionError(str(error)) from error
+
+    def close(self):
+        self._response.close()
@@ -0,0 +1,227 @@
+#
+#   © Copyright 2020 Hewlett Packard Enterprise Development LP
+#
+
+import logging
+import queue
+import threading
+
+ADDED = 'added'
+MODIFIED = 'modified'
+DELETED = 'deleted'
+
+class WatchEvent:
+    """A change of one object between two polls"""
+
+    __slots__ = ['type', 'id', 'attrs', 'changed']
+
+    def __init__(self, type, id, attrs, changed=None):
+        self.type = type
+        self.id = id
+        self.attrs = attrs
+        self.changed = changed or {}
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(type={self.type}, id={self.id}, changed={sorted(self.changed)})>"
+
+class Subscription:
+    """
+    Events of a Watcher for one subscriber.
+
+    Iterating blocks until the next event and ends once the subscription is closed. Subscriptions are context managers
+    and also work with a callback, invoked from the polling thread.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, watcher, callback=None, initial=False):
+        self.watcher = watcher
+        self.callback = callback
+        self.initial = initial
+        self._queue = queue.Queue()
+        self.closed = False
+
+    def _deliver(self, event):
+        if self.callback is not None:
+            try:
+                self.callback(event)
+            except Exception:
+                logging.exception(f"Watch callback failed on {event}")
+        else:
+            self._queue.put(event)
+
+    def get(self, timeout=None):
+        """Return the next event, or None if none arrived within timeout or the subscription is closed"""
+
+        try:
+            event = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return None if event is self._CLOSED else event
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.watcher.unsubscribe(self)
+            self._queue.put(self._CLOSED)
+
+    def __iter__(self):
+        while not self.closed:
+            event = self._queue.get()
+            if event is self._CLOSED:
+                return
+            yield event
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Watcher:
+    """
+    Single polling loop over a collection, shared by all subscribers watching the same fields.
+
+    Only a projected listing of id, last_modified and the watched fields is fetched per poll, and only the values of
+    those fields are kept per object. The poll interval halves when a poll sees changes and grows by half when it
+    does not, within [min_interval, max_interval].
+
+    Parameters:
+    - client       : NimOSAPIClient the collection belongs to.
+    - resource_type: Collection resource type, e.g. volumes.
+    - fields       : Attributes to compare besides last_modified.
+    - interval     : Initial seconds between polls.
+    - min_interval : Shortest interval while changes keep coming, interval / 4 by default.
+    - max_interval : Longest interval while nothing changes, interval * 4 by default.
+    """
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, client, resource_type, fields, interval=30, min_interval=None, max_interval=None):
+        self.client = client
+        self.resource_type = resource_type
+        self.fields = tuple(field for field in fields if field not in ('id', 'last_modified'))
+        self.interval = interval
+        self.min_interval = min_interval if min_interval is not None else interval / 4
+        self.max_interval = max_interval if max_interval is not None else interval * 4
+        self.snapshot = None
+        self._key = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def shared(cls, client, resource_type, fields, interval=30, min_interval=None, max_interval=None, callback=None, initial=False):
+        """Subscribe to the running watcher of this collection and fields, starting one if needed"""
+
+        key = (id(client), resource_type, tuple(sorted(set(fields) - {'id', 'last_modified'})))
+        # Held until the subscriber is added, unsubscribe() stops and unregisters a watcher under the same lock
+        with cls._registry_lock:
+            watcher = cls._registry.get(key)
+            if watcher is None:
+                watcher = cls._registry[key] = cls(client, resource_type, key[2], interval, min_interval, max_interval)
+                watcher._key = key
+            subscription, events = watcher._add(callback, initial)
+        watcher._deliver_initial(subscription, events)
+        return subscription
+
+    def subscribe(self, callback=None, initial=False):
+        """Add a subscriber; with initial, it first gets an added event for every object already known"""
+
+        subscription, events = self._add(callback, initial)
+        self._deliver_initial(subscription, events)
+        return subscription
+
+    def _add(self, callback, initial):
+        subscription = Subscription(self, callback, initial)
+        events = []
+        with self._lock:
+            self._subscribers.append(subscription)
+            if initial and self.snapshot is not None:
+                events = [WatchEvent(ADDED, ident, self._attrs(ident, last_modified, values))
+                          for ident, (last_modified, values) in self.snapshot.items()]
+            if self._thread is None:
+                self._stopped = threading.Event()
+                self._thread = threading.Thread(target=self._run, name=f"watch-{self.resource_type}", daemon=True)
+                self._thread.start()
+        return subscription, events
+
+    @staticmethod
+    def _deliver_initial(subscription, events):
+        # Callbacks run without the locks held, they may close their subscription
+        for event in events:
+            if subscription.closed:
+                break
+            subscription._deliver(event)
+
+    def unsubscribe(self, subscription):
+        with self._registry_lock, self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+            if self._subscribers:
+                return
+            self._stopped.set()
+            self._thread = None
+            if self._registry.get(self._key) is self:
+                del self._registry[self._key]
+
+    def _attrs(self, ident, last_modified, values):
+        return {'id': ident, 'last_modified': last_modified, **dict(zip(self.fields, values))}
+
+    def poll(self):
+        """Fetch the projected listing once and return the resulting events"""
+
+        events, first, _ = self._poll()
+        return events, first
+
+    def _poll(self):
+        objs = self.client.list_resources(self.resource_type, detail=True, fields=','.join(('id', 'last_modified') + self.fields))
+        current = {obj['id']: (obj.get('last_modified'), tuple(obj.get(field) for field in self.fields)) for obj in objs}
+
+        # The events of this poll go to the subscribers that were added before the new snapshot, so one subscribing
+        # with initial gets the state either from subscribe() or from this poll, never from both
+        with self._lock:
+            previous, self.snapshot = self.snapshot, current
+            subscribers = list(self._subscribers)
+        if previous is None:
+            return [WatchEvent(ADDED, ident, self._attrs(ident, *entry)) for ident, entry in current.items()], True, subscribers
+
+        events = []
+        for ident, entry in current.items():
+            old = previous.get(ident)
+            if old is None:
+                events.append(WatchEvent(ADDED, ident, self._attrs(ident, *entry)))
+            elif old != entry:
+                changed = {field: (before, after) for field, before, after in zip(self.fields, old[1], entry[1]) if before != after}
+                if old[0] != entry[0]:
+                    changed['last_modified'] = (old[0], entry[0])
+                events.append(WatchEvent(MODIFIED, ident, self._attrs(ident, *entry), changed))
+        for ident, entry in previous.items():
+            if ident not in current:
+                events.append(WatchEvent(DELETED, ident, self._attrs(ident, *entry)))
+        return events, False, subscribers
+
+    def _run(self):
+        interval = self.interval
+        stopped = self._stopped
+        while not stopped.is_set():
+            try:
+                events, first, subscribers = self._poll()
+            except Exception as error:
+                logging.warning(f"Watching {self.resource_type} failed: {error}")
+                interval = min(interval * 2, self.max_interval)
+            else:
+                if not first:
+                    interval = max(interval / 2, self.min_interval) if events else min(interval * 1.5, self.max_interval)
+                # Callbacks run without the lock held, they may close their subscription
+                for subscription in subscribers:
+                    # The first listing only reaches subscribers that asked for the initial state
+                    if first and not subscription.initial:
+                        continue
+                    for event in events:
+                        if subscription.closed:
+                            break
+                        subscription._deliver(event)
+            stopped.wait(interval)
@@ -27,6 +27,16 @@ setuptools.setup(
     url="https://github.com/hpe-storage/nimble-python-sdk",
     packages=setuptools.find_packages(),
     install_requires=install_requires,
+    entry_points={
+        'console_scripts': [
+            'nimble=nimbleclient.cli:main',
+            'nimble-exporter=nimbleclient.exporter:main',
+        ],
+    },
+    extras_require={
+        'http2': ['httpx[http2]'],
+        'health': ['numpy'],
+    },
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Environment :: Console',
@@ -0,0 +1,49 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from nimbleclient.v1 import client
+from nimbleclient.v1.transport import RequestsTransport
+from tests.mockserver import ROW_LIMIT, MockNimOSServer
+
+'''Fixtures shared by the offline tests: a stand-in array and clients of it.
+
+Modules serve other objects by overriding the mock_data fixture, and a
+smaller page limit by overriding row_limit.'''
+
+
+@pytest.fixture
+def mock_data():
+    return {"volumes": [{"id": f"{index:042x}", "name": f"vol{index}",
+                         "size": 10} for index in range(25)]}
+
+
+@pytest.fixture
+def row_limit():
+    return ROW_LIMIT
+
+
+@pytest.fixture
+def server(mock_data, row_limit):
+    with MockNimOSServer(data=mock_data, row_limit=row_limit) as srv:
+        yield srv
+
+
+@pytest.fixture
+def get_client():
+    """Factory of Clients connected to a stand-in server"""
+
+    def connect(server, **kwargs):
+        return client.Client("127.0.0.1", "admin", "admin", port=server.port,
+                             transport=RequestsTransport(scheme="http"),
+                             **kwargs)
+    return connect
+
+
+@pytest.fixture
+def get_clients(get_client):
+    """Factory of {name: Client} for a {name: stand-in server} mapping"""
+
+    def connect(servers, **kwargs):
+        return {name: get_client(server, **kwargs)
+                for name, server in servers.items()}
+    return connect
@@ -0,0 +1,206 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+"""In-memory stand-in for the NimOS REST API, for offline tests and benchmarks."""
+
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+ROW_LIMIT = 1024
+
+
+def _error(code, status):
+    return status, {"messages": [{"code": code, "severity": "error",
+                                  "text": code}]}
+
+
+class MockNimOSServer:
+    """Serves the objects in `data` ({resource_type: [attrs, ...]}) over
+    plain HTTP on 127.0.0.1. Use as a context manager."""
+
+    def __init__(self, data=None, username="admin", password="admin",
+                 row_limit=ROW_LIMIT, latency=0.0):
+        self.data = data if data is not None else {}
+        self.username = username
+        self.password = password
+        self.row_limit = row_limit
+        self.latency = latency
+        self.tokens = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def count(self, method=None, path=None):
+        """Number of requests served, optionally filtered."""
+        return len([r for r in self.requests
+                    if (method is None or r[0] == method)
+                    and (path is None or r[1] == path)])
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method):
+                url = urlsplit(self.path)
+                query = dict(parse_qsl(url.query))
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+                with server.lock:
+                    server.requests.append(
+                        (method, url.path, query, dict(self.headers)))
+                if server.latency:
+                    time.sleep(server.latency)
+                status, payload = server.handle(
+                    method, url.path.strip("/").split("/"), query, body,
+                    self.headers.get("X-Auth-Token"))
+                raw = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(raw)))
+                    self.end_headers()
+                    self.wfile.write(raw)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up waiting, e.g. on a deadline
+                    self.close_connection = True
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+        return Handler
+
+    def handle(self, method, parts, query, body, token):
+        if parts == ["versions"]:
+            return 200, {"data": [{"name": "v1",
+                                   "software_version": "5.2.1.0"}]}
+
+        if parts[:2] == ["v1", "tokens"]:
+            return self._handle_tokens(method, parts, body, token)
+
+        if token not in self.tokens.values():
+            return _error("SM_http_unauthorized", 401)
+
+        resource = parts[1] if len(parts) > 1 else None
+        if resource not in self.data and method != "POST":
+            return _error("SM_http_not_found", 404)
+        rows = self.data.setdefault(resource, [])
+        rest = parts[2:]
+
+        if method == "GET" and rest in ([], ["detail"]):
+            return self._list(rows, query, detail=rest == ["detail"])
+        if method == "GET" and len(rest) == 1:
+            obj = self._find(rows, rest[0])
+            if obj is None:
+                return _error("SM_enoent", 404)
+            return 200, {"data": self._project(obj, query.get("fields"))}
+        if method == "POST" and "actions" in rest:
+            return 200, {"data": {}}
+        if method == "POST" and not rest:
+            obj = dict(body.get("data", {}))
+            obj.setdefault("id", uuid.uuid4().hex)
+            with self.lock:
+                rows.append(obj)
+            return 201, {"data": obj}
+        if method == "PUT" and len(rest) == 1:
+            obj = self._find(rows, rest[0])
+            if obj is None:
+                return _error("SM_enoent", 404)
+            obj.update(body.get("data", {}))
+            return 200, {"data": obj}
+        if method == "DELETE" and len(rest) == 1:
+            obj = self._find(rows, rest[0])
+            if obj is None:
+                return _error("SM_enoent", 404)
+            with self.lock:
+                rows.remove(obj)
+            return 200, {}
+        return _error("SM_http_bad_request", 400)
+
+    def _handle_tokens(self, method, parts, body, token):
+        if method == "POST":
+            creds = body.get("data", {})
+            if (creds.get("username"), creds.get("password")) != \
+                    (self.username, self.password):
+                return _error("SM_http_unauthorized", 401)
+            session_id, session_token = uuid.uuid4().hex, uuid.uuid4().hex
+            self.tokens[session_id] = session_token
+            return 201, {"data": {"id": session_id,
+                                  "session_token": session_token,
+                                  "username": self.username}}
+        session_id = parts[2] if len(parts) > 2 else None
+        if self.tokens.get(session_id) != token:
+            return _error("SM_http_unauthorized", 401)
+        if method == "DELETE":
+            del self.tokens[session_id]
+            return 200, {}
+        return 200, {"data": {"id": session_id}}
+
+    @staticmethod
+    def _find(rows, ident):
+        for obj in rows:
+            if obj.get("id") == ident:
+                return obj
+        return None
+
+    @staticmethod
+    def _project(obj, fields):
+        if not fields:
+            return obj
+        wanted = fields.split(",")
+        return {key: value for key, value in obj.items() if key in wanted}
+
+    def _list(self, rows, query, detail):
+        filters = {key: value for key, value in query.items()
+                   if key not in ("fields", "startRow", "endRow", "pageSize",
+                                  "sortBy", "sortOrder")}
+        matched = [obj for obj in rows
+                   if all(str(obj.get(key)) == value
+                          for key, value in filters.items())]
+        if "sortBy" in query:
+            field = query["sortBy"]
+            matched.sort(key=lambda obj: (obj.get(field) is not None,
+                                          obj.get(field)),
+                         reverse=query.get("sortOrder") == "descending")
+        total = len(matched)
+        start = int(query.get("startRow", 0))
+        page = int(query.get("pageSize", self.row_limit))
+        if page > self.row_limit:
+            return _error("SM_too_large_page_size", 400)
+        end = min(int(query.get("endRow", total)), start + page, total)
+        fields = query.get("fields") if detail else "id,name"
+        data = [self._project(obj, fields) for obj in matched[start:end]]
+        return 200, {"startRow": start, "endRow": end, "totalRows": total,
+                     "data": data}
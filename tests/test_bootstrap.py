@@ -0,0 +1,58 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import functools
+import threading
+from nimbleclient.v1.bootstrap import bootstrap
+from nimbleclient.v1.transport import RequestsTransport
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the concurrent fleet bootstrap'''
+
+
+def settings(server, password="admin"):
+    return {"hostname": "127.0.0.1", "username": "admin",
+            "password": password, "port": server.port}
+
+
+def test_bootstrap_reports_each_array():
+    with MockNimOSServer() as dead:
+        pass
+    with MockNimOSServer(data={"volumes": []}) as fast, \
+            MockNimOSServer(latency=0.3) as slow:
+        arrays = {"fast": settings(fast), "slow": settings(slow),
+                  "dead": settings(dead), "denied": settings(fast, "bad")}
+        ready = []
+        lock = threading.Lock()
+
+        def on_ready(name, nimos_client):
+            with lock:
+                ready.append(name)
+
+        clients, statuses = bootstrap(
+            arrays, warm_connections=2, on_ready=on_ready,
+            transport=functools.partial(RequestsTransport, scheme="http"))
+
+        assert sorted(clients) == ["fast", "slow"]
+        # The fast array does not wait for the slow one
+        assert ready == ["fast", "slow"]
+        assert fast.count("GET", "/versions") >= 3
+        assert len(clients["fast"].volumes.list()) == 0
+
+    assert statuses["fast"].ready
+    assert statuses["fast"].api_versions == ["v1"]
+    assert statuses["fast"].software_version == "5.2.1.0"
+    assert statuses["fast"].warmed == 2
+    assert statuses["slow"].latency > statuses["fast"].latency
+    assert not statuses["dead"].connected
+    assert "Error connecting" in statuses["dead"].as_dict()["error"]
+    assert not statuses["denied"].ready and statuses["denied"].error
+
+
+def test_bootstrap_checks_software_version():
+    with MockNimOSServer() as server:
+        clients, statuses = bootstrap(
+            {"old": settings(server)}, min_software_version="6.0",
+            transport=functools.partial(RequestsTransport, scheme="http"))
+    assert clients == {}
+    assert statuses["old"].connected and not statuses["old"].compatible
+    assert "older than 6.0" in statuses["old"].error
@@ -0,0 +1,129 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import csv
+import functools
+import io
+import json
+import os
+import pytest
+import subprocess
+import sys
+from nimbleclient import cli
+from nimbleclient.v1 import restclient, tokencache, transport
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the nimble command line against the stand-in server'''
+
+VOLUMES = [{"id": f"vol{index}", "name": f"data{index}", "size": index,
+            "online": True} for index in range(3)]
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch, tmp_path):
+    # The CLI talks HTTPS to arrays, the stand-in server plain HTTP
+    monkeypatch.setattr(transport, "HTTPClientTransport",
+                        functools.partial(transport.HTTPClientTransport,
+                                          scheme="http"))
+    monkeypatch.setattr(tokencache, "DEFAULT_PATH",
+                        str(tmp_path / "tokens.json"))
+    monkeypatch.setattr(restclient.SessionManager, "_SESSIONS", {})
+    for name in ("NIMBLE_HOST", "NIMBLE_SDK_TOKEN_CACHE"):
+        monkeypatch.delenv(name, raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def server():
+    with MockNimOSServer(data={"volumes": [dict(vol) for vol in VOLUMES]}) \
+            as srv:
+        yield srv
+
+
+def nimble(server, *args):
+    return cli.main(["--host", "127.0.0.1", "--port", str(server.port),
+                     "--password", "admin", *args])
+
+
+def test_list_ndjson(server, capsys, environment):
+    assert nimble(server, "volumes", "list", "--detail") == 0
+    rows = [json.loads(line) for line in
+            capsys.readouterr().out.splitlines()]
+    assert rows == VOLUMES
+    # The token cache is opt-in
+    assert not os.path.exists(environment / "tokens.json")
+
+    restclient.SessionManager._SESSIONS.clear()
+    assert nimble(server, "--token-cache", "volumes", "list") == 0
+    assert os.path.exists(environment / "tokens.json")
+
+
+def test_list_csv(server, capsys):
+    assert nimble(server, "--format", "csv", "--fields", "id,size",
+                  "volumes", "list", "online=true") == 0
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+    assert rows == [{"id": vol["id"], "size": str(vol["size"])}
+                    for vol in VOLUMES]
+    _, _, query, _ = server.requests[-1]
+    assert query["online"] == "True"
+
+
+def test_get_and_bulk_action(server, capsys):
+    assert nimble(server, "volumes", "get", "vol1") == 0
+    assert json.loads(capsys.readouterr().out)["name"] == "data1"
+
+    assert nimble(server, "volumes", "action", "-",
+                  "bulk_set_online_and_offline", 'vol_ids=["vol0","vol1"]',
+                  "online=false") == 0
+    assert server.count("POST",
+                        "/v1/volumes/actions/bulk_set_online_and_offline") == 1
+
+    assert nimble(server, "volumes", "get") == 1
+    assert "requires an object ID" in capsys.readouterr().err
+
+
+def test_inventory_fan_out(server, capsys, tmp_path):
+    with MockNimOSServer() as dead:
+        pass
+    with MockNimOSServer(data={"volumes": VOLUMES[:1]}) as other:
+        inventory = tmp_path / "arrays.txt"
+        inventory.write_text(f"# lab arrays\n127.0.0.1:{server.port}\n"
+                             f"127.0.0.1:{other.port} admin admin\n"
+                             f"127.0.0.1:{dead.port}\n")
+        status = cli.main(["--inventory", str(inventory), "--password",
+                           "admin", "volumes", "list"])
+    out, err = capsys.readouterr()
+    assert status == 1
+    rows = [json.loads(line) for line in out.splitlines()]
+    assert len(rows) == 4
+    assert {row["array"] for row in rows} == {"127.0.0.1"}
+    assert err.count("nimble: 127.0.0.1: Error connecting") == 1
+
+
+class ClosedStderr(io.StringIO):
+    def close(self):
+        self.closed_by_cli = True
+
+
+def test_broken_pipe(server, monkeypatch):
+    def write(self, row):
+        raise BrokenPipeError(32, "Broken pipe")
+    monkeypatch.setattr(cli.OutputWriter, "write", write)
+    stderr = ClosedStderr()
+    monkeypatch.setattr(sys, "stderr", stderr)
+
+    # Output piped into head: the command stops quietly instead of
+    # reporting the array as failed
+    assert nimble(server, "volumes", "list") == 0
+    assert stderr.closed_by_cli
+    assert stderr.getvalue() == ""
+
+
+def test_rest_client_imports_alone():
+    script = ("import sys\n"
+              "import nimbleclient.v1.restclient\n"
+              "print(sorted(name for name in ('nimbleclient.v1.client',"
+              " 'nimbleclient.v1.volumes', 'cProfile', 'pstats')"
+              " if name in sys.modules))\n")
+    result = subprocess.run([sys.executable, "-c", script],
+                            capture_output=True, text=True, timeout=60)
+    assert result.stdout.strip() == "[]"
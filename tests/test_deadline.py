@@ -0,0 +1,88 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import asyncio
+import threading
+import time
+import pytest
+from nimbleclient.v1 import breaker, exceptions
+from nimbleclient.v1.asyncclient import AsyncClient
+from nimbleclient.v1.deadline import Deadline
+from nimbleclient.v1.fleet import fan_out
+from nimbleclient.v1.transport import RequestsTransport
+
+'''Offline tests of call deadlines and cancellation against a slow
+stand-in server'''
+
+
+@pytest.fixture
+def row_limit():
+    return 10
+
+
+def test_call_timeout_covers_pagination(server, get_client):
+    nimos_client = get_client(server, call_timeout=0.5, circuit_breaker=True)
+    server.latency = 0.2
+    started = time.monotonic()
+    with pytest.raises(exceptions.NimOSDeadlineExceeded):
+        nimos_client.volumes.list(detail=True)
+    # the last page was requested with the 0.1s left as its timeout
+    assert time.monotonic() - started < 0.6
+    assert nimos_client._client.breaker.state == breaker.CLOSED
+
+
+def test_deadline_cancelled_from_another_thread(server, get_client):
+    nimos_client = get_client(server)
+    server.latency = 0.2
+    deadline = Deadline()
+    threading.Timer(0.3, deadline.cancel).start()
+    with pytest.raises(exceptions.NimOSCallCancelled):
+        with deadline:
+            nimos_client.volumes.list(detail=True)
+
+
+def test_nested_deadline_does_not_extend_outer(server, get_client):
+    nimos_client = get_client(server)
+    server.latency = 0.2
+    with pytest.raises(exceptions.NimOSDeadlineExceeded):
+        with Deadline(0.3):
+            with Deadline(60):
+                nimos_client.volumes.list(detail=True)
+
+
+def test_async_client_cancellation(server):
+    async def scenario():
+        async_client = await AsyncClient.connect(
+            "127.0.0.1", "admin", "admin", port=server.port,
+            transport=RequestsTransport(scheme="http"))
+        assert len(await async_client.volumes.list(detail=True)) == 25
+        assert len(await async_client.volumes.iter_list()) == 25
+
+        server.latency = 0.2
+        served = server.count()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(async_client.volumes.list(detail=True),
+                                   0.1)
+        await asyncio.sleep(0.6)
+        # the worker thread gave up after the request in flight
+        assert server.count() - served == 1
+
+    asyncio.run(scenario())
+
+
+def test_deadline_covers_executor_threads(server, get_client):
+    nimos_client = get_client(server)
+    ids = [vol["id"] for vol in server.data["volumes"][:6]]
+    server.latency = 0.3
+    started = time.monotonic()
+    with pytest.raises(exceptions.NimOSDeadlineExceeded):
+        with Deadline(0.2):
+            nimos_client.volumes.get_many(ids, max_workers=2)
+    assert time.monotonic() - started < 0.6
+
+    _, errors = fan_out({"array": nimos_client},
+                        lambda name, array: array.volumes.list(detail=True))
+    assert not errors
+    with Deadline(0.2):
+        _, errors = fan_out({"array": nimos_client},
+                            lambda name, array: array.volumes.list(detail=True))
+    assert isinstance(errors["array"], exceptions.NimOSDeadlineExceeded)
@@ -0,0 +1,75 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the disk health scanner against a stand-in array'''
+
+pytest.importorskip("numpy")
+
+from nimbleclient.v1.diskhealth import DiskHealthScanner  # noqa: E402
+
+
+def disk(slot, reallocated=0, **attrs):
+    return {"id": f"d{slot}", "serial": f"SN{slot}", "shelf_serial": "SH1",
+            "slot": slot, "model": "HDD-4T", "firmware_version": "A1",
+            "type": "hdd", "state": "in use", "raid_state": "okay",
+            "smart_attribute_list": [
+                {"name": "Reallocated_Sector_Ct", "raw_value": reallocated},
+                {"name": "Current_Pending_Sector", "raw_value": 0}],
+            **attrs}
+
+
+@pytest.fixture
+def mock_data():
+    disks = [disk(slot) for slot in range(10)]
+    disks[3] = disk(3, reallocated=120)
+    disks[5] = disk(5, raid_state="resynchronizing",
+                    raid_resync_current_speed=10)
+    disks[6] = disk(6, raid_state="resynchronizing",
+                    raid_resync_current_speed=100)
+    disks[7] = disk(7, raid_state="resynchronizing",
+                    raid_resync_current_speed=110)
+    disks.append({"id": "empty", "serial": "N/A", "slot": 11})
+    shelves = [{"id": "s1", "serial": "SH1", "psu_overall_status": "ok",
+                "fan_overall_status": "ok", "temp_overall_status": "ok"}]
+    return {"disks": disks, "shelves": shelves}
+
+
+@pytest.fixture
+def scanner(server, get_client):
+    return DiskHealthScanner({"array1": get_client(server)})
+
+
+def test_ranks_outliers_and_slow_resyncs(scanner):
+    risks = scanner.scan()
+    assert [risk.serial for risk in risks] == ["SN3", "SN5"]
+    assert risks[0].reasons[0].startswith("reallocated_sector_ct=120")
+    assert risks[1].reasons == ["slow resync at 10 B/s"]
+
+
+def test_counter_growth_between_scans(server, scanner):
+    scanner.scan()
+    smart = server.data["disks"][8]["smart_attribute_list"]
+    smart[1]["raw_value"] = 1
+    risks = {risk.serial: risk for risk in scanner.scan()}
+    assert "current_pending_sector +1 since last scan" in \
+        risks["SN8"].reasons
+
+
+def test_resync_compared_across_models_only_on_request(get_client):
+    disks = [disk(0, raid_state="resynchronizing",
+                  raid_resync_current_speed=100),
+             disk(1, raid_state="resynchronizing",
+                  raid_resync_current_speed=110),
+             disk(2, model="SSD-1T", raid_state="resynchronizing",
+                  raid_resync_current_speed=20),
+             disk(3, model="SSD-1T", raid_state="resynchronizing",
+                  raid_resync_current_speed=22)]
+    with MockNimOSServer(data={"disks": disks, "shelves": []}) as srv:
+        nimos_client = get_client(srv)
+        assert DiskHealthScanner({"array1": nimos_client}).scan() == []
+        scanner = DiskHealthScanner({"array1": nimos_client},
+                                    resync_across_models=True)
+        assert sorted(risk.serial for risk in scanner.scan()) == \
+            ["SN2", "SN3"]
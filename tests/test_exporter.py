@@ -0,0 +1,112 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from nimbleclient.v1 import client
+from nimbleclient.v1.transport import RequestsTransport
+from nimbleclient import exporter as exporter_module
+from nimbleclient.exporter import Exporter
+from tests.mockserver import MockNimOSServer
+
+'''Tests of the Prometheus exporter against the stand-in server'''
+
+DATA = {
+    "arrays": [{"id": "a1", "name": "array1", "status": "reachable",
+                "usage": 100, "usable_capacity_bytes": 1000,
+                "raw_capacity_bytes": 2000}],
+    "pools": [{"id": "p1", "name": "default", "capacity": 1000,
+               "usage": 100, "free_space": 900}],
+    "folders": [],
+    "volumes": [{"id": "v1", "name": "vol\"1", "pool_name": "default",
+                 "size": 2, "total_usage_bytes": 42, "num_connections": 3,
+                 "online": True, "vol_state": "online",
+                 "description": "not fetched"}],
+}
+
+
+@pytest.fixture
+def exporter():
+    with MockNimOSServer(data=DATA) as server:
+        nimos_client = client.Client(
+            "127.0.0.1", "admin", "admin", port=server.port,
+            transport=RequestsTransport(scheme="http"))
+        exp = Exporter({"array1": nimos_client})
+        exp.server = server
+        yield exp
+
+
+def test_render_after_refresh(exporter):
+    exporter.collectors[0].refresh_all()
+    page = exporter.render().decode()
+    assert 'nimble_pool_free_space_bytes{array="array1",name="default"} 900' \
+        in page
+    assert ('nimble_volume_size_bytes{array="array1",name="vol\\"1",'
+            'pool_name="default"} 2097152') in page
+    assert 'nimble_volume_online{' in page
+    assert 'state="online"} 1' in page
+    assert 'nimble_array_up{array="array1",name="array1"} 1' in page
+    assert 'nimble_exporter_refresh_success{array="array1",' \
+        'resource="folders"} 1' in page
+    # each metric family is announced exactly once
+    assert page.count("# TYPE nimble_volume_size_bytes gauge") == 1
+
+
+def test_refresh_uses_projected_listings(exporter):
+    exporter.collectors[0].refresh("volumes")
+    _, path, query, _ = exporter.server.requests[-1]
+    assert path == "/v1/volumes/detail"
+    assert "description" not in query["fields"].split(",")
+
+
+def test_scrapes_are_served_from_memory(exporter):
+    exporter.collectors[0].refresh_all()
+    served = len(exporter.server.requests)
+    first = exporter.render()
+    assert exporter.render() is first
+    assert len(exporter.server.requests) == served
+    exporter.collectors[0].refresh("pools")
+    assert exporter.render() is not first
+
+
+def test_only_changed_rows_are_rendered(exporter, monkeypatch):
+    collector = exporter.collectors[0]
+    collector.refresh("volumes")
+    rendered = []
+    original = exporter_module.render_samples
+
+    def counting(array, resource_type, objs):
+        rendered.extend(obj["id"] for obj in objs)
+        return original(array, resource_type, objs)
+
+    monkeypatch.setattr(exporter_module, "render_samples", counting)
+    volumes = exporter.server.data["volumes"]
+    volumes.append(dict(volumes[0], id="v2", name="vol2"))
+    collector.refresh("volumes")
+    volumes[0]["total_usage_bytes"] = 43
+    collector.refresh("volumes")
+    assert rendered == ["v2", "v1"]
+    page = exporter.render().decode()
+    assert 'name="vol2",pool_name="default"} 42' in page
+    assert 'name="vol\\"1",pool_name="default"} 43' in page
+
+
+def test_unreachable_array_is_retried():
+    with MockNimOSServer(data=DATA) as server:
+        attempts = []
+
+        def connect():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ConnectionError("array down")
+            return client.Client("127.0.0.1", "admin", "admin",
+                                 port=server.port,
+                                 transport=RequestsTransport(scheme="http"))
+
+        exp = Exporter({"array1": connect})
+        collector = exp.collectors[0]
+        collector.refresh("pools")
+        assert collector.status["pools"][0] == 0
+        collector.refresh("pools")
+        assert collector.status["pools"][0] == 1
+        assert 'nimble_pool_usage_bytes{array="array1"' in \
+            exp.render().decode()
+        assert len(attempts) == 2
@@ -0,0 +1,56 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import functools
+import pickle
+from nimbleclient.v1.columnar import Column, ColumnTable
+from nimbleclient.v1.fleet import FleetCollector
+from nimbleclient.v1.transport import RequestsTransport
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the process pool fleet collector and its columns'''
+
+
+def test_columns_round_trip():
+    first = ColumnTable.from_rows("array0", [
+        {"id": "a", "size": 10, "online": True, "tags": ["x"]},
+        {"id": "b", "size": None, "online": False, "tags": None}])
+    second = ColumnTable.from_rows("array1", [
+        {"id": "c", "size": 1.5, "online": True, "name": "vol"}])
+    table = pickle.loads(pickle.dumps(ColumnTable.concat([first, second])))
+    assert len(table) == 3
+    assert table.column("array") == ["array0", "array0", "array1"]
+    assert table.column("size") == [10, None, 1.5]
+    assert table.column("online") == [True, False, True]
+    assert table.column("name") == [None, None, "vol"]
+    assert list(table.rows())[0] == {"array": "array0", "id": "a",
+                                     "size": 10, "online": True,
+                                     "tags": ["x"]}
+    assert Column.encode(["é", None]).decode() == ["é", None]
+
+
+def test_collect():
+    volumes = [{"id": f"vol{index}", "name": f"data{index}",
+                "size": 1024 * index, "online": bool(index % 2)}
+               for index in range(50)]
+    with MockNimOSServer(data={"volumes": volumes}) as first, \
+            MockNimOSServer(data={"volumes": volumes[:5]}) as second:
+        arrays = {name: {"hostname": "127.0.0.1", "username": "admin",
+                         "password": "admin", "port": server.port}
+                  for name, server in (("array0", first),
+                                       ("array1", second))}
+        arrays["down"] = {"hostname": "127.0.0.1", "username": "admin",
+                          "password": "admin", "port": 1}
+        transport = functools.partial(RequestsTransport, scheme="http")
+        with FleetCollector(arrays, processes=2,
+                            client_kwargs={"transport": transport}) \
+                as collector:
+            table = collector.collect("volumes", fields="id,size,online")
+            again = collector.collect("volumes", fields="id,size,online")
+            assert collector.errors.keys() == {"down"}
+        # Workers keep their clients and sessions between collections
+        assert first.count("POST", "/v1/tokens") == 1
+    assert len(table) == len(again) == 55
+    assert sorted(table.column("array"))[-1] == "array1"
+    rows = [row for row in table.rows() if row["array"] == "array0"]
+    assert rows[7] == {"array": "array0", "id": "vol7", "size": 7168,
+                       "online": True}
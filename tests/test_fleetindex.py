@@ -0,0 +1,81 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from nimbleclient.v1.fleetindex import FleetIndex, normalize
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the fleet lookup index against two stand-in arrays'''
+
+SERIAL = "5e3b0a6f1c2d4e7f6c9ce900d8b1a2f3"
+
+
+def array_data(index):
+    return {
+        "volumes": [{"id": f"vol{index}", "name": f"data{index}",
+                     "serial_number": SERIAL if index else "ab" * 16,
+                     "target_name": f"iqn.2007-11.com.nimblestorage:a{index}",
+                     "last_modified": 1}],
+        "initiators": [{"id": f"init{index}", "access_protocol": "iscsi",
+                        "initiator_group_id": f"ig{index}",
+                        "initiator_group_name": "hosts",
+                        "iqn": "iqn.1994-05.com.redhat:host1",
+                        "last_modified": 1},
+                       {"id": f"fc{index}", "access_protocol": "fc",
+                        "initiator_group_id": f"igfc{index}",
+                        "initiator_group_name": "fchosts",
+                        "wwpn": "10:00:00:90:FA:00:00:0" + str(index),
+                        "last_modified": 1}],
+        "fibre_channel_initiator_aliases": [
+            {"id": f"alias{index}", "alias": f"host{index}-hba",
+             "wwpn": "10:00:00:90:fa:00:00:0" + str(index)}],
+    }
+
+
+@pytest.fixture
+def servers():
+    with MockNimOSServer(data=array_data(0)) as first, \
+            MockNimOSServer(data=array_data(1)) as second:
+        yield {"array0": first, "array1": second}
+
+
+def test_normalize():
+    assert normalize("0x2" + SERIAL.upper()) == SERIAL
+    assert normalize("10:00:00:90:FA:00:00:01") == "10000090fa000001"
+    assert normalize("IQN.1994-05.com.redhat:host1") == \
+        "iqn.1994-05.com.redhat:host1"
+
+
+def test_lookups(servers, get_clients):
+    index = FleetIndex.build(get_clients(servers))
+    assert index.volume_by_serial("3" + SERIAL) == ("array1", "vol1", "data1")
+    assert sorted(index.initiator_groups_by_iqn(
+        "iqn.1994-05.com.redhat:host1")) == [("array0", "ig0", "hosts"),
+                                             ("array1", "ig1", "hosts")]
+    assert index.initiator_groups_by_wwpn("host1-hba") == \
+        [("array1", "igfc1", "fchosts")]
+    assert index.volumes_by_target("iqn.2007-11.com.nimblestorage:a0") == \
+        [("array0", "vol0", "data0")]
+
+
+def test_refresh_is_incremental(servers, get_clients):
+    index = FleetIndex.build(get_clients(servers))
+    server = servers["array0"]
+    server.data["volumes"].append({"id": "vol9", "name": "new",
+                                   "serial_number": "cd" * 16,
+                                   "last_modified": 2})
+    del server.data["initiators"][0]
+    served = len(server.requests)
+    assert index.refresh() == {}
+    fetched = [path for _, path, _, _ in server.requests[served:]]
+    assert fetched.count("/v1/volumes/vol9") == 1
+    assert "/v1/volumes/vol0" not in fetched
+    assert index.volume_by_serial("cd" * 16) == ("array0", "vol9", "new")
+    assert index.initiator_groups_by_iqn("iqn.1994-05.com.redhat:host1") == \
+        [("array1", "ig1", "hosts")]
+
+
+def test_snapshot_roundtrip(servers, tmp_path, get_clients):
+    path = str(tmp_path / "index.json")
+    FleetIndex.build(get_clients(servers)).save(path)
+    loaded = FleetIndex.load(path)
+    assert loaded.volume_by_serial(SERIAL) == ("array1", "vol1", "data1")
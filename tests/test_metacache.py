@@ -0,0 +1,114 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import os
+import time
+import pytest
+from nimbleclient.v1 import client, filestore, metacache
+from nimbleclient.v1.metacache import MetadataCache
+from nimbleclient.v1.transport import RequestsTransport
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the disk-backed metadata cache'''
+
+
+@pytest.fixture
+def server():
+    data = {
+        "groups": [{"id": "g1", "version_current": "5.2.1.0"}],
+        "arrays": [{"id": "a1", "serial": "AF-1", "last_modified": 1}],
+        "performance_policies": [{"id": "p1", "name": "default",
+                                  "last_modified": 1}],
+        "user_policies": [{"id": "u1", "min_length": 8}],
+    }
+    with MockNimOSServer(data=data) as srv:
+        yield srv
+
+
+def get_cache(server, path, **kwargs):
+    nimos_client = client.Client("127.0.0.1", "admin", "admin",
+                                 port=server.port,
+                                 transport=RequestsTransport(scheme="http"))
+    return MetadataCache(nimos_client, path=str(path), **kwargs)
+
+
+def full_fetches(server, endpoint):
+    """GETs of endpoint that were not a projected validation listing"""
+    return len([request for request in server.requests
+                if request[:2] == ("GET", endpoint)
+                and request[2].get("fields") != "id,last_modified"
+                and "serial" not in request[2].get("fields", "")])
+
+
+def test_cold_fetch_then_warm_revalidation(server, tmp_path):
+    path = tmp_path / "metadata.json"
+    cold = get_cache(server, path)
+    assert [obj.attrs["name"] for obj in cold.list("versions")] == ["v1"]
+    assert cold.list("arrays")[0].attrs["serial"] == "AF-1"
+    assert cold.list("performance_policies")[0].id == "p1"
+    assert server.count("GET", "/versions") == 1
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+
+    # Served from memory within the process
+    served = len(server.requests)
+    cold.list("arrays")
+    assert len(server.requests) == served
+
+    # Another process only revalidates
+    warm = get_cache(server, path)
+    assert warm.list("versions")[0].attrs["software_version"] == "5.2.1.0"
+    assert warm.list("arrays")[0].id == "a1"
+    assert warm.list("performance_policies")[0].id == "p1"
+    assert server.count("GET", "/versions") == 1
+    assert full_fetches(server, "/v1/arrays/detail") == 1
+    assert full_fetches(server, "/v1/performance_policies/detail") == 1
+
+    # A changed policy is refetched
+    server.data["performance_policies"][0].update(name="fast",
+                                                  last_modified=2)
+    fresh = get_cache(server, path)
+    assert fresh.list("performance_policies")[0].attrs["name"] == "fast"
+
+
+def test_group_version_change_invalidates(server, tmp_path):
+    path = tmp_path / "metadata.json"
+    get_cache(server, path).list("versions")
+    server.data["groups"][0]["version_current"] = "6.0.0.0"
+    get_cache(server, path).list("versions")
+    assert server.count("GET", "/versions") == 2
+
+
+def test_max_age(server, tmp_path):
+    path = tmp_path / "metadata.json"
+    get_cache(server, path, max_age=0).list("versions")
+    get_cache(server, path, max_age=0).list("versions")
+    assert server.count("GET", "/versions") == 2
+    get_cache(server, path).list("versions")
+    assert server.count("GET", "/versions") == 2
+
+
+def test_user_policies_expire_sooner(server, tmp_path, monkeypatch):
+    path = tmp_path / "metadata.json"
+    assert get_cache(server, path).list("user_policies")[0].attrs[
+        "min_length"] == 8
+    # Nothing reveals the change, the cached copy is served for 5 minutes
+    server.data["user_policies"][0]["min_length"] = 12
+    assert get_cache(server, path).list("user_policies")[0].attrs[
+        "min_length"] == 8
+
+    now = time.time()
+    monkeypatch.setattr(metacache.time, "time", lambda: now + 301)
+    assert get_cache(server, path).list("user_policies")[0].attrs[
+        "min_length"] == 12
+
+
+def test_filestore_ignores_unsafe_files(tmp_path):
+    path = str(tmp_path / "store.json")
+    with filestore.locked(path):
+        filestore.write_json(path, {"key": 1})
+    assert filestore.read_json(path) == {"key": 1}
+    os.chmod(path, 0o644)
+    assert filestore.read_json(path, {}) == {}
+    os.chmod(path, 0o600)
+    with open(path, "w") as store:
+        store.write("{")
+    assert filestore.read_json(path, {}) == {}
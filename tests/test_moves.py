@@ -0,0 +1,91 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from nimbleclient.v1.moves import MoveMonitor
+
+'''Offline tests of the volume move monitor against the stand-in server'''
+
+MIB = 2**20
+
+
+@pytest.fixture
+def mock_data():
+    return {"volumes": [
+        {"id": "v1", "name": "vol1", "dest_pool_id": "p2",
+         "move_bytes_migrated": 0, "move_bytes_remaining": 100 * MIB},
+        {"id": "v2", "name": "vol2", "dest_pool_id": "p2",
+         "move_bytes_migrated": 0, "move_bytes_remaining": 10 * MIB},
+        {"id": "v3", "name": "vol3", "dest_pool_id": ""}]}
+
+
+def test_progress_throughput_and_completion(server, get_client):
+    v1, v2, _ = server.data["volumes"]
+    monitor = MoveMonitor(get_client(server), interval=0.05)
+    events = monitor.events()
+
+    first = next(events)
+    assert sorted(first.volumes) == ["v1", "v2"]
+    assert (first.throughput, first.eta) == (0.0, None)
+    assert server.count("GET", "/v1/volumes/detail") == 1
+
+    v1.update(move_bytes_migrated=50 * MIB, move_bytes_remaining=50 * MIB)
+    v2.update(dest_pool_id="", move_bytes_migrated=10 * MIB,
+              move_bytes_remaining=0)
+    second = next(events)
+    assert list(second.volumes) == ["v1"]
+    assert second.completed == {"v2"}
+    assert second.bytes_migrated == 60 * MIB
+    assert second.bytes_remaining == 50 * MIB
+    assert second.throughput > 0
+    assert second.eta == pytest.approx(50 / second.throughput)
+    # one projected listing per poll
+    assert server.count("GET", "/v1/volumes/detail") == 2
+    assert server.count("GET") == 2
+
+    v1.update(dest_pool_id="", move_bytes_migrated=100 * MIB,
+              move_bytes_remaining=0)
+    last = next(events)
+    assert last.done
+    assert last.completed == {"v1", "v2"}
+    assert last.bytes_migrated == 110 * MIB
+    assert next(events, None) is None
+    assert server.count("GET", "/v1/volumes/detail") == 3
+
+
+def test_abort_on_deadline(server, get_client):
+    monitor = MoveMonitor(get_client(server), vol_ids=["v1"], interval=0.05,
+                          deadline=0, abort_on_deadline=True)
+    progress = monitor.run()
+    assert progress.done
+    assert progress.aborted == {"v1"}
+    assert server.count("POST", "/v1/volumes/v1/actions/abort_move") == 1
+    assert server.count("POST", "/v1/volumes/v2/actions/abort_move") == 0
+    assert server.count("GET", "/v1/volumes/detail") == 1
+
+
+def test_requested_move_not_started_yet(server, get_client):
+    v3 = server.data["volumes"][2]
+    monitor = MoveMonitor(get_client(server), vol_ids=["v3"], interval=0.05)
+    events = monitor.events()
+    first = next(events)
+    assert not first.done
+    assert (first.pending, first.completed) == ({"v3"}, set())
+
+    v3.update(dest_pool_id="p2", move_bytes_remaining=MIB)
+    assert list(next(events).volumes) == ["v3"]
+    v3.update(dest_pool_id="")
+    last = next(events)
+    assert last.done and last.completed == {"v3"}
+    assert next(events, None) is None
+
+    # a later run starts over from the requested volumes
+    assert monitor.vol_ids == {"v3"}
+    assert next(monitor.events()).pending == {"v3"}
+
+
+def test_pending_move_given_up_at_deadline(server, get_client):
+    monitor = MoveMonitor(get_client(server), vol_ids=["v3"], interval=0.05,
+                          deadline=0)
+    progress = monitor.run()
+    assert progress.done
+    assert progress.completed == set() and progress.pending == set()
@@ -0,0 +1,55 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import io
+import os
+import subprocess
+import sys
+import pytest
+from nimbleclient.v1 import profiling
+
+'''Offline tests of the SDK profiling switch'''
+
+
+@pytest.fixture
+def mock_data():
+    return {"volumes": [{"id": f"{index:042x}", "name": f"vol{index}",
+                         "size": 10} for index in range(30)]}
+
+
+@pytest.fixture
+def row_limit():
+    return 10
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "sample"])
+def test_calls_are_attributed(server, mode, get_client):
+    nimos_client = get_client(server)
+    out = io.StringIO()
+    with profiling.profile(mode, stream=out) as profiler:
+        nimos_client.volumes.list(detail=True)
+        assert len(list(nimos_client.volumes.iter_list())) == 30
+    assert profiling._active is None
+
+    listed = profiler.stats["VolumeList.list"]
+    assert (listed.calls, listed.rows) == (1, 30)
+    assert 0 < listed.network <= listed.wall
+    assert listed.allocated > 0
+    assert profiler.stats["VolumeList.iter_list"].rows == 30
+    assert profiler.stats["GET v1/volumes/detail"].calls == 1
+    assert "VolumeList.list" in out.getvalue()
+
+
+def test_disabled_by_default(server, get_client):
+    get_client(server).volumes.list()
+    assert profiling._active is None
+
+
+def test_environment_variable(server):
+    script = ("from nimbleclient.v1 import client, transport\n"
+              f"client.Client('127.0.0.1', 'admin', 'admin', port={server.port},"
+              " transport=transport.RequestsTransport(scheme='http'))"
+              ".volumes.list()\n")
+    env = dict(os.environ, NIMBLE_SDK_PROFILE="1")
+    result = subprocess.run([sys.executable, "-c", script], env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert "VolumeList.list" in result.stderr
@@ -0,0 +1,212 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from nimbleclient.v1.exceptions import NimOSCallCancelled
+from nimbleclient.v1.provisioning import AccessProvisioner, CloneFarm, \
+    InitiatorGroupReconciler
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of access control provisioning against the stand-in server'''
+
+
+@pytest.fixture
+def mock_data():
+    return {
+        "initiator_groups": [
+            {"id": "ig-iscsi", "name": "hosts", "access_protocol": "iscsi"},
+            {"id": "ig-fc", "name": "fchosts", "access_protocol": "fc"}],
+        "access_control_records": [
+            {"id": "acr0", "vol_id": "vol0", "initiator_group_id": "ig-iscsi",
+             "apply_to": "both", "lun": 0},
+            {"id": "acr1", "vol_id": "vol0", "initiator_group_id": "ig-fc",
+             "apply_to": "volume", "lun": 0},
+            {"id": "acr2", "vol_id": "vol1", "initiator_group_id": "ig-fc",
+             "apply_to": "volume", "lun": 1}],
+    }
+
+
+def test_plan_skips_existing_and_picks_free_luns(server, get_client):
+    provisioner = AccessProvisioner(get_client(server))
+    requests = [(f"vol{index}", group) for index in range(4)
+                for group in ("ig-iscsi", "ig-fc")]
+    plan = provisioner.plan(requests + [("vol0", "ig-iscsi", "snapshot")])
+    # vol0 is exported to both groups already, its 'both' record covers
+    # the snapshot request too
+    assert sorted(record["id"] for record in plan.existing) == \
+        ["acr0", "acr0", "acr1", "acr2"]
+    fc = {payload["vol_id"]: (payload["apply_to"], payload.get("lun"))
+          for payload in plan.create
+          if payload["initiator_group_id"] == "ig-fc"}
+    # Volume records only get the snapshot half added
+    assert fc == {"vol0": ("snapshot", None), "vol1": ("snapshot", None),
+                  "vol2": ("both", 2), "vol3": ("both", 3)}
+    assert all("lun" not in payload for payload in plan.create
+               if payload["initiator_group_id"] == "ig-iscsi")
+    assert len(plan) == 7
+
+
+def test_provision_is_idempotent(server, get_client):
+    provisioner = AccessProvisioner(get_client(server), max_workers=4)
+    requests = [(f"vol{index}", "ig-fc") for index in range(10)]
+    created, errors = provisioner.provision(requests)
+    assert errors == {}
+    assert len(created) == 10
+    assert server.count("GET", "/v1/access_control_records/detail") == 1
+
+    luns = sorted(record["lun"] for record in
+                  server.data["access_control_records"]
+                  if record["initiator_group_id"] == "ig-fc"
+                  and record["apply_to"] != "snapshot")
+    assert luns == list(range(10))
+
+    # A fresh provisioner finds everything in place
+    posts = server.count("POST", "/v1/access_control_records")
+    again = AccessProvisioner(get_client(server))
+    assert again.provision(requests) == ([], {})
+    assert server.count("POST", "/v1/access_control_records") == posts
+
+
+class TakenLunServer(MockNimOSServer):
+    """Refuses LUN 2, taken by a volume the provisioner did not index, and
+    suggests LUN 9 instead"""
+
+    def handle(self, method, parts, query, body, token):
+        if method == "POST" and parts[1:] == ["access_control_records"] \
+                and body.get("data", {}).get("lun") == 2:
+            return 400, {"messages": [{"code": "SM_lun_in_use",
+                                       "severity": "error",
+                                       "text": "LUN in use"}]}
+        if method == "POST" and parts[-2:] == ["actions", "suggest_lun"]:
+            return 200, {"data": {"lun": 9}}
+        return super().handle(method, parts, query, body, token)
+
+
+def test_refused_lun_falls_back_to_suggestion(mock_data, get_client):
+    with TakenLunServer(data=mock_data) as srv:
+        provisioner = AccessProvisioner(get_client(srv))
+        created, errors = provisioner.provision([("vol5", "ig-fc")])
+        assert errors == {}
+        assert [record["lun"] for record in created] == [9]
+        assert srv.count(
+            "POST", "/v1/initiator_groups/ig-fc/actions/suggest_lun") == 1
+        assert srv.data["access_control_records"][-1]["lun"] == 9
+
+
+def test_reconcile_initiator_groups(get_client):
+    data = {
+        "initiator_groups": [
+            {"id": "ig1", "name": "db", "access_protocol": "iscsi"},
+            {"id": "ig2", "name": "fchosts", "access_protocol": "fc"}],
+        "initiators": [
+            {"id": "i1", "initiator_group_id": "ig1",
+             "access_protocol": "iscsi", "label": "db1",
+             "iqn": "iqn.1994-05.com.redhat:db1"},
+            {"id": "i2", "initiator_group_id": "ig1",
+             "access_protocol": "iscsi", "label": "old",
+             "iqn": "iqn.1994-05.com.redhat:old"},
+            {"id": "i3", "initiator_group_id": "ig2",
+             "access_protocol": "fc", "wwpn": "10:00:00:90:fa:00:00:01"}],
+    }
+    desired = {
+        "db": ["IQN.1994-05.com.redhat:db1", "iqn.1994-05.com.redhat:db2"],
+        "fchosts": ["10:00:00:90:FA:00:00:01"],
+        "web": [{"wwpn": "10:00:00:90:fa:00:00:02", "alias": "web1"}],
+    }
+    with MockNimOSServer(data=data) as server:
+        reconciler = InitiatorGroupReconciler(get_client(server))
+        plan = reconciler.plan(desired)
+        assert [initiator["id"] for initiator in plan.remove] == ["i2"]
+        assert plan.create_groups == [{"name": "web",
+                                       "access_protocol": "fc"}]
+        assert plan.unchanged == 2
+        assert len(plan) == 4
+
+        changes, errors = reconciler.apply(plan)
+        assert (changes, errors) == (4, {})
+        members = {(initiator["initiator_group_id"],
+                    initiator.get("iqn") or initiator.get("wwpn"))
+                   for initiator in server.data["initiators"]}
+        web = server.data["initiator_groups"][-1]["id"]
+        assert members == {("ig1", "iqn.1994-05.com.redhat:db1"),
+                           ("ig1", "iqn.1994-05.com.redhat:db2"),
+                           ("ig2", "10:00:00:90:fa:00:00:01"),
+                           (web, "10:00:00:90:fa:00:00:02")}
+
+        # Unchanged state: no writes at all
+        writes = server.count("POST") + server.count("DELETE")
+        assert reconciler.reconcile(desired) == (0, {})
+        assert server.count("POST") + server.count("DELETE") == writes
+
+
+def test_reconcile_refuses_member_without_address(get_client):
+    data = {"initiator_groups": [{"id": "ig1", "name": "db",
+                                  "access_protocol": "iscsi"}],
+            "initiators": []}
+    with MockNimOSServer(data=data) as server:
+        reconciler = InitiatorGroupReconciler(get_client(server))
+        with pytest.raises(ValueError, match="neither an iqn nor a wwpn"):
+            reconciler.plan({"db": ["iqn.1994-05.com.redhat:db1",
+                                    {"label": "db2"}]})
+        # nothing but the login was sent
+        assert server.count("POST") == 1
+
+
+class FailingACRServer(MockNimOSServer):
+    """Refuses the snapshot access control record of the clone named bad"""
+
+    def handle(self, method, parts, query, body, token):
+        if method == "POST" and parts[1:] == ["access_control_records"]:
+            attrs = body.get("data", {})
+            vol = self._find(self.data.get("volumes", []), attrs["vol_id"])
+            if vol["name"] == "bad" and attrs["apply_to"] == "snapshot":
+                return 400, {"messages": [{"code": "SM_eparam",
+                                           "severity": "error",
+                                           "text": "refused"}]}
+        return super().handle(method, parts, query, body, token)
+
+
+CLONE_ACRS = [{"initiator_group_id": "ig1", "apply_to": "volume"},
+              {"initiator_group_id": "ig1", "apply_to": "snapshot"}]
+
+
+def test_clone_farm_provisions_every_clone(get_client):
+    with MockNimOSServer(data={"volumes": []}) as srv:
+        farm = CloneFarm(get_client(srv), "snap1", max_workers=4)
+        result = farm.provision(["c0", "c1", "c2"], acrs=CLONE_ACRS)
+        assert result.ok
+        assert sorted(result.succeeded) == ["c0", "c1", "c2"]
+        assert all(vol["clone"] and vol["base_snap_id"] == "snap1"
+                   for vol in srv.data["volumes"])
+        assert len(srv.data["access_control_records"]) == 6
+
+
+def test_clone_farm_rolls_back_failed_clone(get_client):
+    with FailingACRServer(data={"volumes": []}) as srv:
+        farm = CloneFarm(get_client(srv), "snap1", max_workers=2)
+        result = farm.provision(["c0", "bad", "c1"], acrs=CLONE_ACRS)
+        assert sorted(result.succeeded) == ["c0", "c1"]
+        assert list(result.failed) == ["bad"]
+        assert result.rolled_back == ["bad"]
+        assert sorted(vol["name"] for vol in srv.data["volumes"]) == \
+            ["c0", "c1"]
+        # the volume record of the failed clone was removed again
+        ids = {vol["id"] for vol in srv.data["volumes"]}
+        assert len(srv.data["access_control_records"]) == 4
+        assert all(acr["vol_id"] in ids
+                   for acr in srv.data["access_control_records"])
+
+
+def test_clone_farm_all_or_nothing(get_client):
+    with FailingACRServer(data={"volumes": []}) as srv:
+        farm = CloneFarm(get_client(srv), "snap1", max_workers=1)
+        result = farm.provision(["c0", "bad", "c1", "c2"], acrs=CLONE_ACRS,
+                                all_or_nothing=True)
+        assert not result.ok
+        assert result.succeeded == {}
+        assert sorted(result.failed) == ["bad", "c1", "c2"]
+        assert isinstance(result.failed["c1"], NimOSCallCancelled)
+        assert isinstance(result.failed["c2"], NimOSCallCancelled)
+        assert sorted(result.rolled_back) == ["bad", "c0"]
+        assert srv.data["volumes"] == []
+        assert srv.data["access_control_records"] == []
+        assert srv.count("POST", "/v1/volumes") == 2
@@ -0,0 +1,117 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from nimbleclient.v1.replication import ReplicationAnalyzer
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the replication lag analyzer against two stand-in
+arrays replicating to each other'''
+
+NOW = 100000
+
+UPSTREAM = {
+    "groups": [{"id": "g1", "name": "prod"}],
+    "replication_partners": [{"id": "p1", "name": "dr", "hostname": "dr-mgmt",
+                              "is_alive": True,
+                              "throttled_bandwidth_current_kbps": 800}],
+    "volume_collections": [{"id": "vc1", "name": "db",
+                            "total_repl_bytes": 1000000,
+                            "repl_bytes_transferred": 400000}],
+    "protection_schedules": [{"id": "s1", "name": "hourly",
+                              "volcoll_or_prottmpl_type": "volume_collection",
+                              "volcoll_or_prottmpl_id": "vc1",
+                              "downstream_partner_name": "dr",
+                              "last_replicated_at_time": NOW - 7200,
+                              "next_repl_snap_time": NOW + 60,
+                              "repl_alert_thres": 3600}],
+    "snapshot_collections": [
+        {"id": "sc1", "volcoll_id": "vc1", "sched_id": "s1",
+         "is_replica": False, "creation_time": NOW - 7300,
+         "repl_start_time": NOW - 7300, "repl_complete_time": NOW - 7200,
+         "repl_bytes_transferred": 5000000},
+        {"id": "sc2", "volcoll_id": "vc1", "sched_id": "s1",
+         "is_replica": False, "creation_time": NOW - 100,
+         "repl_start_time": NOW - 100, "repl_bytes_transferred": 400000}] + [
+        {"id": f"old{index}", "volcoll_id": "vc1", "sched_id": "s1",
+         "is_replica": False, "creation_time": NOW - 10000 - index * 3600,
+         "repl_start_time": NOW - 10000 - index * 3600,
+         "repl_complete_time": NOW - 9000 - index * 3600,
+         "repl_bytes_transferred": 1000} for index in range(20)],
+}
+
+DOWNSTREAM = {
+    "groups": [{"id": "g2", "name": "dr"}],
+    "replication_partners": [{"id": "p2", "name": "prod", "is_alive": True}],
+    "volume_collections": [{"id": "vc2", "name": "db"}],
+    "protection_schedules": [{"id": "s2", "name": "hourly",
+                              "volcoll_or_prottmpl_type": "volume_collection",
+                              "volcoll_or_prottmpl_id": "vc2",
+                              "upstream_partner_name": "prod",
+                              "last_replicated_at_time": NOW - 7190}],
+    "snapshot_collections": [],
+}
+
+
+@pytest.fixture
+def servers():
+    with MockNimOSServer(data=UPSTREAM) as upstream, \
+            MockNimOSServer(data=DOWNSTREAM) as downstream:
+        yield {"prod-array": upstream, "dr-array": downstream}
+
+
+@pytest.fixture
+def clients(servers, get_clients):
+    return get_clients(servers)
+
+
+def test_report_joins_upstream_and_downstream(clients):
+    analyzer = ReplicationAnalyzer(clients)
+    [lag] = analyzer.report(now=NOW)
+    assert analyzer.errors == {}
+    assert (lag.array, lag.volcoll, lag.schedule) == \
+        ("prod-array", "db", "hourly")
+    assert lag.downstream_array == "dr-array"
+    assert lag.downstream_last_replica == NOW - 7190
+    assert lag.lag == 7200 and lag.overdue
+    assert lag.in_progress
+    assert lag.bandwidth == 4000
+    # 600000 bytes left at the achieved 4000 B/s, under the 100000 B/s cap
+    assert lag.catch_up == 150
+
+
+def test_unreachable_array_is_reported(clients, get_client):
+    with MockNimOSServer(data=DOWNSTREAM) as gone:
+        clients["gone"] = get_client(gone)
+        clients["gone"]._client.transport.close()
+    analyzer = ReplicationAnalyzer(clients)
+    assert len(analyzer.report(now=NOW)) == 1
+    assert set(analyzer.errors) == {"gone"}
+
+
+def test_snapshot_collections_listed_per_schedule(servers, clients):
+    analyzer = ReplicationAnalyzer(clients)
+    analyzer.fetch()
+    assert len(analyzer.views["prod-array"]["snapshot_collections"]) == 8
+    queries = [query for _, path, query, _ in servers["prod-array"].requests
+               if path == "/v1/snapshot_collections/detail"]
+    assert len(queries) == 1
+    assert queries[0]["sched_id"] == "s1"
+    assert queries[0]["sortBy"] == "creation_time"
+    assert queries[0]["sortOrder"] == "descending"
+    assert int(queries[0]["pageSize"]) == 8
+    # the downstream array has no replicated schedule to look up
+    assert servers["dr-array"].count(
+        "GET", "/v1/snapshot_collections/detail") == 0
+
+
+def test_completed_replication_without_start_time(get_client):
+    data = dict(UPSTREAM, snapshot_collections=[
+        dict(UPSTREAM["snapshot_collections"][0], repl_start_time=None)])
+    with MockNimOSServer(data=data) as upstream:
+        analyzer = ReplicationAnalyzer({"prod-array": get_client(upstream)})
+        [lag] = analyzer.report(now=NOW)
+    assert analyzer.errors == {}
+    assert not lag.in_progress
+    assert lag.bandwidth is None
+    # catch-up is then projected at the partner throttle
+    assert lag.catch_up == 6
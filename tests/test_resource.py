@@ -0,0 +1,36 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+'''Offline tests of Collection lookups against the stand-in server'''
+
+
+def vol_id(index):
+    return f"{index:042x}"
+
+
+def test_get_many_fetches_few_ids_one_by_one(server, get_client):
+    volumes = get_client(server).volumes
+    ids = [vol_id(2), "missing", vol_id(1), vol_id(2)]
+    found, missing = volumes.get_many(ids, fields="name")
+    assert [vol.attrs["name"] if vol else None for vol in found] == \
+        ["vol2", None, "vol1", "vol2"]
+    assert found[0].attrs == {"id": vol_id(2), "name": "vol2"}
+    assert missing == ["missing"]
+    # one GET per distinct ID, no listing
+    assert server.count("GET", f"/v1/volumes/{vol_id(2)}") == 1
+    assert server.count("GET", "/v1/volumes/missing") == 1
+    assert server.count("GET", "/v1/volumes/detail") == 0
+
+
+def test_get_many_lists_many_ids_at_once(server, get_client):
+    volumes = get_client(server).volumes
+    ids = [vol_id(index) for index in range(20, 2, -1)] + ["missing"]
+    assert len(ids) > volumes.GET_MANY_THRESHOLD
+    found, missing = volumes.get_many(ids, fields="name")
+    assert [vol.attrs["name"] for vol in found[:-1]] == \
+        [f"vol{index}" for index in range(20, 2, -1)]
+    assert found[-1] is None
+    assert missing == ["missing"]
+    [(_, _, query, _)] = [request for request in server.requests
+                          if request[1].startswith("/v1/volumes")]
+    assert query["fields"] == "id,name"
+    assert server.count("GET", "/v1/volumes/detail") == 1
@@ -0,0 +1,107 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import pytest
+from nimbleclient.v1.teardown import DependencyGraph
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of dependency-ordered teardown against the stand-in server'''
+
+
+def teardown_data():
+    return {
+        "volumes": [
+            {"id": "vb", "name": "base", "online": True},
+            {"id": "vc", "name": "clone", "clone": True, "online": True,
+             "parent_vol_id": "vb", "base_snap_id": "s1"},
+            {"id": "vo", "name": "other", "online": True}],
+        "snapshots": [{"id": "s1", "name": "snap", "vol_id": "vb"}],
+        "access_control_records": [
+            {"id": "a1", "snap_id": "s1", "vol_id": "vb",
+             "initiator_group_id": "ig-orphan", "apply_to": "snapshot"},
+            {"id": "a2", "vol_id": "vc", "initiator_group_id": "ig-shared",
+             "apply_to": "volume"},
+            {"id": "a3", "vol_id": "vo", "initiator_group_id": "ig-shared",
+             "apply_to": "volume"}],
+        "initiator_groups": [{"id": "ig-orphan", "name": "orphan"},
+                             {"id": "ig-shared", "name": "shared"}],
+    }
+
+
+class SnapshotFilterServer(MockNimOSServer):
+    """Refuses snapshot listings without a vol_id filter"""
+
+    def handle(self, method, parts, query, body, token):
+        if method == "GET" and parts[1:2] == ["snapshots"] \
+                and "vol_id" not in query:
+            return 400, {"messages": [{"code": "SM_missing_arg",
+                                       "severity": "error",
+                                       "text": "vol_id"}]}
+        return super().handle(method, parts, query, body, token)
+
+
+def test_plan_levels_and_delete_order(get_client):
+    with MockNimOSServer(data=teardown_data()) as server:
+        graph = DependencyGraph.load(get_client(server))
+        plan = graph.teardown_plan(["vb"], include_initiator_groups=True)
+        assert plan.levels == [
+            [("access_control_records", "a1"),
+             ("access_control_records", "a2")],
+            [("initiator_groups", "ig-orphan"), ("volumes", "vc")],
+            [("snapshots", "s1")],
+            [("volumes", "vb")]]
+        assert len(plan) == 6
+
+        served = len(server.requests)
+        assert plan.execute(max_workers=4) == {}
+        deletes = [path for method, path, _, _ in server.requests[served:]
+                   if method == "DELETE"]
+        levels = [{f"/v1/{kind}/{ident}" for kind, ident in level}
+                  for level in plan.levels]
+        position = 0
+        for level in levels:
+            assert set(deletes[position:position + len(level)]) == level
+            position += len(level)
+        assert position == len(deletes)
+
+        # volumes are taken offline before they are deleted
+        calls = [(method, path) for method, path, _, _
+                 in server.requests[served:]]
+        for vol in ("vb", "vc"):
+            assert calls.index(("PUT", f"/v1/volumes/{vol}")) < \
+                calls.index(("DELETE", f"/v1/volumes/{vol}"))
+
+        assert [vol["id"] for vol in server.data["volumes"]] == ["vo"]
+        assert server.data["snapshots"] == []
+        assert [acr["id"] for acr in
+                server.data["access_control_records"]] == ["a3"]
+        assert [group["id"] for group in
+                server.data["initiator_groups"]] == ["ig-shared"]
+
+
+def test_shared_initiator_group_is_kept_by_default(get_client):
+    with MockNimOSServer(data=teardown_data()) as server:
+        plan = DependencyGraph.load(get_client(server)).teardown_plan(["vc"])
+        assert plan.levels == [[("access_control_records", "a2")],
+                               [("volumes", "vc")]]
+
+
+def test_snapshots_listed_per_volume_when_filter_required(get_client):
+    with SnapshotFilterServer(data=teardown_data()) as server:
+        graph = DependencyGraph.load(get_client(server), max_workers=1)
+        assert ("snapshots", "s1") in graph.nodes
+        assert graph.depends_on[("volumes", "vc")] == \
+            {("snapshots", "s1"), ("volumes", "vb")}
+        filtered = sorted(query["vol_id"] for method, path, query, _
+                          in server.requests
+                          if path == "/v1/snapshots/detail"
+                          and "vol_id" in query)
+        assert filtered == ["vb", "vc", "vo"]
+        plan = graph.teardown_plan(["vb"])
+        assert ("snapshots", "s1") in plan.levels[-2]
+
+
+def test_unknown_volume_is_refused(get_client):
+    with MockNimOSServer(data=teardown_data()) as server:
+        graph = DependencyGraph.load(get_client(server))
+        with pytest.raises(ValueError):
+            graph.teardown_plan(["missing"])
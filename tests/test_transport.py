@@ -0,0 +1,303 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import gzip
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+from nimbleclient.v1 import (breaker, client, deadline, exceptions, restclient,
+                             tracing)
+from nimbleclient.v1.paging import PageSizer
+from nimbleclient.v1.cassette import ReplayTransport
+from nimbleclient.v1.transport import RequestsTransport
+from tests.mockserver import MockNimOSServer
+
+'''Offline tests of the transport layer against the stand-in server'''
+
+
+@pytest.fixture
+def row_limit():
+    return 10
+
+
+def test_list_follows_pagination(server, get_client):
+    vols = get_client(server).volumes.list(detail=True)
+    assert len(vols) == 25
+    assert server.count("GET", "/v1/volumes/detail") == 3
+
+
+def test_get_missing_raises_api_error(server, get_client):
+    with pytest.raises(exceptions.NimOSAPIError):
+        get_client(server).volumes.get("nonexistent")
+
+
+def test_expired_session_is_refreshed(server, get_client):
+    nimos_client = get_client(server)
+    server.tokens.clear()
+    assert nimos_client.volumes.get(f"{0:042x}").attrs["name"] == "vol0"
+
+
+def test_connection_error(get_client):
+    with MockNimOSServer() as srv:
+        pass
+    with pytest.raises(ConnectionError):
+        get_client(srv)
+
+
+def test_record_and_replay(server, tmp_path):
+    cassette = str(tmp_path / "session.jsonl.gz")
+    recording = client.Client("127.0.0.1", "admin", "admin",
+                              port=server.port, coalesce_gets=False,
+                              transport=RequestsTransport(scheme="http"),
+                              record=cassette)
+    names = [vol.attrs["name"] for vol in recording.volumes.list(detail=True)]
+    recording._client.transport.close()
+
+    with gzip.open(cassette, "rt") as recorded:
+        content = recorded.read()
+    assert '"password":"admin"' not in content
+    assert next(iter(server.tokens.values())) not in content
+
+    # replay on another port so that no cached session is reused
+    replaying = client.Client("127.0.0.1", "admin", "admin",
+                              port=server.port + 1,
+                              transport=ReplayTransport(cassette,
+                                                        scheme="http"))
+    replayed = replaying.volumes.list(detail=True)
+    assert [vol.attrs["name"] for vol in replayed] == names
+
+
+def test_replay_repeats_listings(server, tmp_path):
+    cassette = str(tmp_path / "session.jsonl.gz")
+    recording = client.Client("127.0.0.1", "admin", "admin",
+                              port=server.port, coalesce_gets=False,
+                              transport=RequestsTransport(scheme="http"),
+                              record=cassette)
+    assert recording._client.page_sizer is None
+    recording.volumes.list(detail=True)
+    recording._client.transport.close()
+
+    # a learned page window adds endRow to the requests of later listings
+    replaying = client.Client("127.0.0.1", "admin", "admin",
+                              port=server.port + 1, coalesce_gets=False,
+                              transport=ReplayTransport(cassette,
+                                                        scheme="http"),
+                              adaptive_paging=PageSizer("replay"))
+    for _ in range(2):
+        assert len(replaying.volumes.list(detail=True)) == 25
+    assert replaying._client.page_sizer.rows("v1/volumes/detail")
+
+
+def test_iter_list_streams_all_pages(server, get_client):
+    nimos_client = get_client(server)
+    streamed = list(nimos_client.volumes.iter_list(detail=True))
+    assert streamed == nimos_client.volumes.list(detail=True)
+    assert len(streamed) == 25
+    assert len(list(nimos_client.volumes.iter_list(startRow=5,
+                                                   endRow=17))) == 12
+
+
+def list_with_token_cache(port, cache, results):
+    nimos_client = client.Client("127.0.0.1", "admin", "admin", port=port,
+                                 transport=RequestsTransport(scheme="http"),
+                                 token_cache=cache)
+    results.put(len(nimos_client.volumes.list()))
+
+
+def test_token_cache_reused_across_processes(server, tmp_path):
+    cache = str(tmp_path / "tokens.json")
+    context = multiprocessing.get_context("spawn")
+    for _ in range(2):
+        results = context.Queue()
+        process = context.Process(target=list_with_token_cache,
+                                  args=(server.port, cache, results))
+        process.start()
+        assert results.get(timeout=60) == 25
+        process.join(60)
+        assert process.exitcode == 0
+    # the second process logged in with the token of the first one
+    assert server.count("POST", "/v1/tokens") == 1
+    assert os.stat(cache).st_mode & 0o077 == 0
+
+
+def correlation_ids(server, path):
+    return [headers.get(tracing.CORRELATION_HEADER)
+            for _, req_path, _, headers in server.requests
+            if req_path == path]
+
+
+def test_correlation_id_spans_pagination(server, get_client):
+    volumes = get_client(server).volumes
+    volumes.list(detail=True)
+    with tracing.correlation_id("job-42"):
+        volumes.list(detail=True)
+    ids = correlation_ids(server, "/v1/volumes/detail")
+    assert len(ids) == 6
+    assert len(set(ids[:3])) == 1 and ids[0]
+    assert ids[3:] == ["job-42"] * 3
+
+
+def test_correlation_id_reaches_authentication(server, get_client,
+                                               monkeypatch):
+    monkeypatch.setattr(restclient.SessionManager, "_SESSIONS", {})
+    with tracing.correlation_id("login-1"):
+        volumes = get_client(server).volumes
+    assert correlation_ids(server, "/v1/tokens") == ["login-1"]
+
+    # An expired session is checked and renewed within the call
+    server.tokens.clear()
+    with tracing.correlation_id("job-7"):
+        volumes.list()
+    session_checks = [req_path for _, req_path, _, _ in server.requests
+                      if req_path.startswith("/v1/tokens/")]
+    assert correlation_ids(server, session_checks[0]) == ["job-7"]
+    assert correlation_ids(server, "/v1/tokens") == ["login-1", "job-7"]
+
+
+def test_slow_call_is_logged(server, caplog):
+    nimos_client = client.Client("127.0.0.1", "admin", "admin",
+                                 port=server.port,
+                                 transport=RequestsTransport(scheme="http"),
+                                 slow_call_threshold=0)
+    with caplog.at_level(logging.WARNING):
+        nimos_client.volumes.list(detail=True, fields="id,name")
+    [record] = [record for record in caplog.records
+                if hasattr(record, "nimble_call")]
+    trace = record.nimble_call.as_dict()
+    assert trace["endpoint"] == "v1/volumes/detail"
+    assert trace["params"] == {"fields": "id,name"}
+    assert (trace["requests"], trace["pages"]) == (3, 3)
+    assert trace["bytes"] > 0
+    assert trace["network"] <= trace["elapsed"]
+    assert trace["correlation_id"] in record.getMessage()
+
+
+def test_circuit_breaker_fails_fast_and_probes(server, get_client):
+    # Breakers are opt-in
+    assert get_client(server)._client.breaker is None
+    nimos_client = get_client(server, circuit_breaker=True)
+    array_breaker = nimos_client._client.breaker
+    assert array_breaker is breaker.CircuitBreaker.for_array(
+        "127.0.0.1", server.port)
+
+    # Point the client at a closed port until the breaker opens
+    with MockNimOSServer() as dead:
+        pass
+    base_url = nimos_client._client._base_url
+    nimos_client._client._base_url = f"http://127.0.0.1:{dead.port}"
+    for _ in range(array_breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            nimos_client.volumes.list()
+    assert array_breaker.state == breaker.OPEN
+    assert not array_breaker.available
+
+    started = time.monotonic()
+    with pytest.raises(exceptions.NimOSCircuitOpenError):
+        nimos_client.volumes.list()
+    assert time.monotonic() - started < 0.1
+
+    # Once due, a probe of the versions endpoint closes the circuit again
+    nimos_client._client._base_url = base_url
+    array_breaker.retry_at = time.monotonic()
+    assert len(nimos_client.volumes.list()) == 25
+    assert array_breaker.state == breaker.CLOSED
+    assert server.count("GET", "/versions") == 1
+
+
+def test_page_sizer_targets_latency_and_limits():
+    sizer = PageSizer("array:5392", target=1.0, min_rows=10)
+    sizer.observe("v1/volumes", None, 100, 0.5, 10000, True)
+    # Grows at most twice per page
+    assert sizer.rows("v1/volumes") == 200
+    sizer.observe("v1/volumes", 200, 200, 4.0, 20000, True)
+    assert sizer.rows("v1/volumes") == 80
+    # A short page with rows pending is the array row limit
+    sizer.observe("v1/volumes", 80, 50, 0.1, 5000, True)
+    assert sizer.rows("v1/volumes") == 50
+
+    large = PageSizer("array:5392", target=1.0, max_bytes=64 * 1024)
+    large.observe("v1/disks", None, 100, 0.01, 100 * 1024, True)
+    assert large.rows("v1/disks") == 64
+    assert large.sizes() == {"v1/disks": 64}
+
+
+def test_adaptive_paging_learns_window_per_endpoint(server):
+    nimos_client = client.Client("127.0.0.1", "admin", "admin",
+                                 port=server.port,
+                                 transport=RequestsTransport(scheme="http"),
+                                 adaptive_paging=PageSizer("mock"))
+    assert len(nimos_client.volumes.list(detail=True)) == 25
+    sizer = nimos_client._client.page_sizer
+    assert sizer.sizes() == {"v1/volumes/detail": 10}
+
+    served = len(server.requests)
+    assert len(nimos_client.volumes.list(detail=True)) == 25
+    windows = [(query.get("startRow"), query.get("endRow"))
+               for _, _, query, _ in server.requests[served:]]
+    assert windows == [(None, "10"), ("10", "20"), ("20", "25")]
+
+
+def test_identical_gets_are_coalesced(server, get_client):
+    nimos_client = get_client(server)
+    server.latency = 0.3
+    barrier = threading.Barrier(4)
+    results = [None] * 4
+
+    def list_volumes(index):
+        barrier.wait()
+        results[index] = nimos_client._client.list_resources(
+            "volumes", detail=True, fields="id,size", pageSize=10)
+
+    threads = [threading.Thread(target=list_volumes, args=(index,))
+               for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert server.count("GET", "/v1/volumes/detail") == 1
+    assert all(result == results[0] for result in results)
+    # Every caller owns its result
+    assert len({id(result) for result in results}) == 4
+    assert len({id(result[0]) for result in results}) == 4
+    results[1][0]["size"] = 0
+    assert results[0][0]["size"] == 10
+
+
+def test_coalesced_caller_keeps_its_deadline(server, get_client):
+    nimos_client = get_client(server)
+    server.latency = 1.0
+    leader = threading.Thread(
+        target=nimos_client._client.get, args=("v1/volumes",),
+        kwargs={"pageSize": 10})
+    leader.start()
+    time.sleep(0.2)
+
+    started = time.monotonic()
+    with pytest.raises(exceptions.NimOSDeadlineExceeded):
+        with deadline.Deadline(0.3):
+            nimos_client._client.get("v1/volumes", pageSize=10)
+    assert time.monotonic() - started < 0.6
+    leader.join()
+    assert server.count("GET", "/v1/volumes") == 1
+
+
+def test_httpx_transport_timeouts(server):
+    pytest.importorskip("httpx")
+    from nimbleclient.v1.transport import HTTPXTransport
+
+    httpx_transport = HTTPXTransport(scheme="http", timeout=(5, 0.3))
+    assert httpx_transport.timeout == (5, 0.3)
+    nimos_client = client.Client("127.0.0.1", "admin", "admin",
+                                 port=server.port, transport=httpx_transport)
+    assert len(nimos_client.volumes.list()) == 25
+
+    # Calls under a deadline keep the read timeout of the transport
+    server.latency = 1.0
+    started = time.monotonic()
+    with pytest.raises(ConnectionError):
+        with deadline.Deadline(10):
+            nimos_client.volumes.get(id=f"{0:042x}")
+    assert time.monotonic() - started < 0.9
@@ -538,3 +538,18 @@ def test_bulk_set_dedupe(setup_teardown_for_each_test):
                 "capable of hosting dedup volumes")
         else:
             log(ex)
+
+
+@pytest.mark.skipif(SKIPTEST is True,
+                    reason="skipped this test as SKIPTEST variable is true")
+def test_get_many_volumes(setup_teardown_for_each_test):
+    vol1 = create_volume(vol_name1)
+    vol2 = create_volume(vol_name2)
+    ids = [vol2.attrs.get("id"), "nonexistentvolumeid", vol1.attrs.get("id")]
+    resp, missing = nimosclientbase.get_nimos_client().volumes.get_many(
+        ids, fields="name,size")
+    # results follow the order of the requested ids
+    assert resp[0].attrs.get("name") == vol_name2
+    assert resp[1] is None
+    assert resp[2].attrs.get("name") == vol_name1
+    assert missing == ["nonexistentvolumeid"]
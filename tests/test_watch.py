@@ -0,0 +1,147 @@
+# (c) Copyright 2020 Hewlett Packard Enterprise Development LP
+
+import threading
+import time
+import pytest
+from nimbleclient.v1 import watch
+
+'''Offline tests of Collection.watch against the stand-in server'''
+
+
+@pytest.fixture
+def mock_data():
+    return {"volumes": [{"id": f"v{index}", "name": f"vol{index}",
+                         "size": 10, "online": True, "last_modified": 1000}
+                        for index in range(3)]}
+
+
+def test_poll_reports_changed_fields(server, get_client):
+    watcher = watch.Watcher(get_client(server)._client, "volumes",
+                            ["online", "size"])
+    events, first = watcher.poll()
+    assert first and len(events) == 3
+
+    vols = server.data["volumes"]
+    vols[0].update(online=False, last_modified=1001)
+    del vols[1]
+    vols.append({"id": "v9", "name": "vol9", "size": 1, "online": True,
+                 "last_modified": 1002})
+    events, first = watcher.poll()
+    by_type = {event.type: event for event in events}
+    assert not first and len(events) == 3
+    assert by_type[watch.MODIFIED].changed == {
+        "online": (True, False), "last_modified": (1000, 1001)}
+    assert by_type[watch.DELETED].id == "v1"
+    assert by_type[watch.ADDED].attrs["size"] == 1
+    _, _, query, _ = server.requests[-1]
+    assert query["fields"] == "id,last_modified,online,size"
+
+
+def test_subscribers_share_one_loop(server, get_client):
+    volumes = get_client(server).volumes
+    first = volumes.watch(fields="online", interval=0.05, initial=True)
+    second = volumes.watch(fields="online", interval=0.05)
+    assert first.watcher is second.watcher
+    assert {first.get(timeout=5).id for _ in range(3)} == {"v0", "v1", "v2"}
+
+    server.data["volumes"][2].update(online=False, last_modified=1001)
+    for subscription in (first, second):
+        event = subscription.get(timeout=5)
+        assert event.type == watch.MODIFIED and event.id == "v2"
+
+    first.close()
+    second.close()
+    assert not watch.Watcher._registry
+    assert first.get(timeout=0) is None
+
+
+def test_callback_may_close_its_subscription(server, get_client):
+    volumes = get_client(server).volumes
+    received = []
+    closed = threading.Event()
+
+    def callback(event):
+        received.append(event)
+        subscription.close()
+        closed.set()
+
+    subscription = volumes.watch(fields="size", interval=0.05,
+                                 callback=callback, initial=True)
+    assert closed.wait(timeout=5)
+    watcher = subscription.watcher
+    assert not watcher._lock.locked()
+    # Closing the last subscription stops the loop, later events are dropped
+    assert len(received) == 1
+    assert not watch.Watcher._registry
+
+
+
+class RacingWatcher(watch.Watcher):
+    """Subscribes with initial from another thread as the first poll
+    stores its snapshot"""
+
+    late = None
+
+    @property
+    def snapshot(self):
+        return self.__dict__.get("snapshot")
+
+    @snapshot.setter
+    def snapshot(self, value):
+        self.__dict__["snapshot"] = value
+        if value is not None and self.late is None:
+            def subscribe():
+                self.late = self.subscribe(initial=True)
+            racer = threading.Thread(target=subscribe)
+            racer.start()
+            racer.join(timeout=0.2)
+
+
+def test_initial_state_is_delivered_once(server, get_client):
+    watcher = RacingWatcher(get_client(server)._client, "volumes",
+                            ["online"], interval=60)
+    running = watcher.subscribe()
+    try:
+        deadline = time.monotonic() + 5
+        while watcher.late is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        ids = [watcher.late.get(timeout=5).id for _ in range(3)]
+        assert sorted(ids) == ["v0", "v1", "v2"]
+        assert watcher.late.get(timeout=0.2) is None
+    finally:
+        running.close()
+        watcher.late.close()
+
+
+class ClosingRegistry(dict):
+    """Closes a subscription from another thread while shared() looks up
+    its watcher"""
+
+    closing = None
+
+    def get(self, key, default=None):
+        watcher = super().get(key, default)
+        if self.closing is not None:
+            closer = threading.Thread(target=self.closing.close)
+            self.closing = None
+            closer.start()
+            closer.join(timeout=0.2)
+            self.closer = closer
+        return watcher
+
+
+def test_shared_never_returns_a_stopped_watcher(server, get_client,
+                                                monkeypatch):
+    registry = ClosingRegistry()
+    monkeypatch.setattr(watch.Watcher, "_registry", registry)
+    volumes = get_client(server).volumes
+    first = volumes.watch(fields="size", interval=60)
+
+    registry.closing = first
+    second = volumes.watch(fields="size", interval=60)
+    registry.closer.join()
+    assert second.watcher is first.watcher
+    assert list(registry.values()) == [second.watcher]
+    assert not second.watcher._stopped.is_set()
+    second.close()
+    assert not registry